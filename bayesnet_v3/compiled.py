@@ -0,0 +1,182 @@
+import numpy as np
+
+# Compiled exact inference for the crowding network in model.py.
+#
+# The network has six discrete variables (2x4x3x3x2x3 = 432 joint states), so the
+# whole joint distribution fits in one small NumPy tensor: the product of every CPD,
+# broadcast onto one axis per variable. A posterior P(target | evidence) is then an
+# index into that tensor plus a sum over the unobserved axes.
+#
+# For the query we serve on every request, P(Crowding Risk | any partial evidence),
+# compile_table() goes one step further: each evidence axis gets one extra slot holding
+# the sum over that axis ("unobserved"), so the table has shape
+# (2+1)(4+1)(3+1)(3+1)(2+1) x 3 and covers all 720 evidence patterns. A lookup is one
+# tuple index, no arithmetic.
+#
+# Nothing here imports pgmpy: CompiledModel.from_model only reads the CPDs of an
+# already built model (get_cpds / variables / cardinality / state_names / get_values).
+
+TARGET = 'Crowding Risk'
+
+
+class CompiledModel:
+    """Joint distribution of a discrete Bayesian network as a NumPy tensor."""
+
+    def __init__(self, variables, state_names, factors):
+        """
+        variables:   variable names, one tensor axis each (in this order)
+        state_names: variable -> list of state names
+        factors:     (cpd_variables, values) with values shaped by the cards of
+                     cpd_variables, the CPD's own variable first
+        """
+        self.variables = list(variables)
+        self.state_names = {v: list(state_names[v]) for v in self.variables}
+        self.axis = {v: i for i, v in enumerate(self.variables)}
+        self.cards = tuple(len(self.state_names[v]) for v in self.variables)
+        self.state_index = {v: {s: i for i, s in enumerate(self.state_names[v])} for v in self.variables}
+        self.factors = [(list(fv), np.asarray(vals, dtype=np.float64)) for fv, vals in factors]
+
+        joint = np.ones(self.cards)
+        for fv, vals in self.factors:
+            # move the factor's axes into joint order, then broadcast over the rest
+            axes = [self.axis[v] for v in fv]
+            order = np.argsort(axes)
+            shape = [1] * len(self.variables)
+            for i in order:
+                shape[axes[i]] = vals.shape[i]
+            joint = joint * np.transpose(vals, order).reshape(shape)
+        self.joint = joint
+
+    @classmethod
+    def from_model(cls, model):
+        variables = sorted(model.nodes())
+        state_names = {}
+        factors = []
+        for cpd in model.get_cpds():
+            state_names.update({v: cpd.state_names[v] for v in cpd.variables})
+            factors.append((cpd.variables, cpd.get_values().reshape(cpd.cardinality)))
+        return cls(variables, state_names, factors)
+
+    def _index(self, evidence):
+        idx = [slice(None)] * len(self.variables)
+        for var, state in evidence.items():
+            if var not in self.axis:
+                raise ValueError(f"Unknown variable {var!r}")
+            if state not in self.state_index[var]:
+                raise ValueError(f"Unknown state {state!r} for {var!r}, expected one of {self.state_names[var]}")
+            idx[self.axis[var]] = self.state_index[var][state]
+        return idx
+
+    def posterior(self, target=TARGET, evidence=None):
+        """P(target | evidence) as a vector over target's states (vectorized marginalization)."""
+        evidence = evidence or {}
+        if target in evidence:
+            raise ValueError(f"{target!r} cannot be both queried and observed")
+        idx = self._index(evidence)
+        # integer indices drop their axes; target's position among the kept axes:
+        kept = [v for v, i in zip(self.variables, idx) if isinstance(i, slice)]
+        sub = self.joint[tuple(idx)]
+        t = kept.index(target)
+        p = sub.sum(axis=tuple(a for a in range(sub.ndim) if a != t))
+        z = p.sum()
+        if z <= 0.0:
+            raise ValueError(f"Evidence {evidence} has probability zero")
+        return p / z
+
+    def state_probability(self, assignment):
+        """Joint probability of a full assignment (same as model.get_state_probability)."""
+        return float(self.joint[tuple(self._index(assignment))])
+
+
+class PosteriorTable:
+    """P(target | evidence pattern) for every pattern over the other variables."""
+
+    def __init__(self, cm, target=TARGET):
+        self.target = target
+        self.target_states = cm.state_names[target]
+        self.evidence_vars = [v for v in cm.variables if v != target]
+        # state -> index per evidence variable; the unobserved slot is the last index
+        self.slot = {v: dict(cm.state_index[v]) for v in self.evidence_vars}
+        self.unobserved = {v: len(cm.state_names[v]) for v in self.evidence_vars}
+
+        t = cm.axis[target]
+        ext = np.moveaxis(cm.joint, t, -1)
+        for a in range(ext.ndim - 1):
+            ext = np.concatenate([ext, ext.sum(axis=a, keepdims=True)], axis=a)
+        z = ext.sum(axis=-1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.values = np.where(z > 0.0, ext / z, np.nan)
+
+    def __len__(self):
+        return int(np.prod(self.values.shape[:-1]))
+
+    def key(self, evidence):
+        """Tuple index of an evidence dict (missing variables are unobserved)."""
+        out = []
+        for v in self.evidence_vars:
+            state = evidence.get(v)
+            if state is None:
+                out.append(self.unobserved[v])
+            elif state in self.slot[v]:
+                out.append(self.slot[v][state])
+            else:
+                raise ValueError(f"Unknown state {state!r} for {v!r}")
+        for v in evidence:
+            if v not in self.slot:
+                raise ValueError(f"{v!r} is not an evidence variable of this table")
+        return tuple(out)
+
+    def lookup(self, evidence):
+        return self.values[self.key(evidence)]
+
+
+def compile_table(model, target=TARGET):
+    return PosteriorTable(CompiledModel.from_model(model), target)
+
+
+if __name__ == '__main__':
+    import itertools
+    from time import perf_counter
+
+    from model import model
+    from pgmpy.inference import VariableElimination
+
+    t0 = perf_counter()
+    cm = CompiledModel.from_model(model)
+    table = PosteriorTable(cm)
+    t1 = perf_counter()
+    print(f"Compiled joint {cm.joint.shape} + table of {len(table)} evidence patterns in {(t1 - t0) * 1000:.2f} ms")
+
+    # every evidence pattern against pgmpy's variable elimination
+    inference = VariableElimination(model)
+    choices = [[None] + cm.state_names[v] for v in table.evidence_vars]
+    worst = 0.0
+    for combo in itertools.product(*choices):
+        evidence = {v: s for v, s in zip(table.evidence_vars, combo) if s is not None}
+        ve = inference.query(variables=[TARGET], evidence=evidence, show_progress=False)
+        ve_values = np.array([ve.values[ve.state_names[TARGET].index(s)] for s in table.target_states])
+        worst = max(worst, np.abs(table.lookup(evidence) - ve_values).max(),
+                    np.abs(cm.posterior(TARGET, evidence) - ve_values).max())
+    print(f"All {len(table)} patterns match VariableElimination (max abs diff {worst:.2e})")
+
+    evidence = {'Weather': 'Heavy', 'Day Type': 'Weekday', 'Service Status': 'Disrupted'}
+    n = 2000
+    t0 = perf_counter()
+    for _ in range(50):
+        inference.query(variables=[TARGET], evidence=evidence, show_progress=False)
+    ve_us = (perf_counter() - t0) / 50 * 1e6
+    t0 = perf_counter()
+    for _ in range(n):
+        cm.posterior(TARGET, evidence)
+    marg_us = (perf_counter() - t0) / n * 1e6
+    t0 = perf_counter()
+    for _ in range(n):
+        table.lookup(evidence)
+    table_us = (perf_counter() - t0) / n * 1e6
+    print(f"Query latency: VariableElimination {ve_us:9.1f} us | marginalize joint {marg_us:6.1f} us"
+          f" | table lookup {table_us:5.2f} us")
+
+    print("\nGiven a Very Rainy Weekday with Disrupted Service:")
+    print("Crowd")
+    for state, p in zip(table.target_states, table.lookup(evidence)):
+        print(f"    {state}: {p:.4f}")
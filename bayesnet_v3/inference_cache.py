@@ -0,0 +1,208 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from compiled import CompiledModel, TARGET
+
+# Memoizing inference service.
+#
+# The evidence space of the crowding network is tiny (720 partial-evidence patterns for
+# Crowding Risk), so an endpoint answering posterior queries sees the same questions
+# over and over. InferenceService puts a bounded LRU of posterior vectors in front of
+# any engine (VariableElimination by default, or the compiled / junction-tree engines).
+#
+# Keys are canonical: (target, evidence items sorted by variable), with variables and
+# state names validated against the CPDs' state_names and None meaning unobserved, so
+# {'Weather': 'Heavy', 'Day Type': 'Weekday'} and its reordering share one entry and a
+# typo raises instead of caching garbage.
+#
+# Invalidation: every query compares a cheap token (identity of each CPD object and of
+# its values array; changes on add_cpds / remove_cpds / cpd.values = ... / in-place
+# normalize) with the last one. When it moves, the CPD contents are hashed; a different
+# fingerprint clears the cache and rebuilds the engine. Element-wise writes into an
+# existing values array keep the token, so call refresh() after those (or construct
+# with strict=True to hash the contents on every query, ~30 us).
+
+
+def cpd_fingerprint(model):
+    """Content hash of every CPD: variables, state names and values."""
+    h = hashlib.blake2b(digest_size=16)
+    for cpd in sorted(model.get_cpds(), key=lambda c: c.variable):
+        h.update(repr((list(cpd.variables), [list(cpd.state_names[v]) for v in cpd.variables])).encode())
+        h.update(np.ascontiguousarray(cpd.values, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def _token(model):
+    return tuple((id(cpd), id(cpd.values)) for cpd in model.get_cpds())
+
+
+def canonical_evidence(state_names, evidence):
+    """Sorted ((variable, state), ...) of the observed variables; raises on unknown names."""
+    items = []
+    for var, state in (evidence or {}).items():
+        if var not in state_names:
+            raise ValueError(f"Unknown variable {var!r}")
+        if state is None:
+            continue
+        if state not in state_names[var]:
+            raise ValueError(f"Unknown state {state!r} for {var!r}, expected one of {state_names[var]}")
+        items.append((var, state))
+    return tuple(sorted(items))
+
+
+# Engines: model -> query(target, evidence) giving a vector in state_names[target] order
+
+def ve_engine(model):
+    from pgmpy.inference import VariableElimination
+    inference = VariableElimination(model)
+    states = {cpd.variable: list(cpd.state_names[cpd.variable]) for cpd in model.get_cpds()}
+
+    def query(target, evidence):
+        r = inference.query(variables=[target], evidence=evidence, show_progress=False)
+        return np.array([r.values[r.state_names[target].index(s)] for s in states[target]])
+
+    return query
+
+def compiled_engine(model):
+    return CompiledModel.from_model(model).posterior
+
+def junction_tree_engine(model):
+    from junction_tree import build_junction_tree
+    jt = build_junction_tree(model)
+    return lambda target, evidence: jt.posterior(target, evidence)
+
+ENGINES = {'ve': ve_engine, 'compiled': compiled_engine, 'junction_tree': junction_tree_engine}
+
+
+class InferenceService:
+    """LRU-memoized posteriors over a Bayesian network, invalidated when a CPD changes."""
+
+    def __init__(self, model, engine='ve', capacity=1024, strict=False):
+        self.model = model
+        self.engine_factory = ENGINES[engine] if isinstance(engine, str) else engine
+        self.capacity = capacity
+        self.strict = strict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._token = None
+        self.fingerprint = None
+        self._reload()
+
+    def _reload(self):
+        # the old answers are stale whatever happens next; if the factory raises (e.g. a
+        # CPD that does not sum to 1) the next query must retry, not serve them
+        self._cache.clear()
+        self._token = None
+        self.fingerprint = None
+        token = _token(self.model)
+        fingerprint = cpd_fingerprint(self.model)
+        state_names = {}
+        for cpd in self.model.get_cpds():
+            state_names.update({v: list(cpd.state_names[v]) for v in cpd.variables})
+        self._engine = self.engine_factory(self.model)
+        self.state_names = state_names
+        self._token, self.fingerprint = token, fingerprint
+
+    def _check(self):
+        if self.strict or _token(self.model) != self._token:
+            if cpd_fingerprint(self.model) != self.fingerprint:
+                self.invalidations += 1
+                self._reload()
+            else:
+                self._token = _token(self.model)
+
+    def refresh(self):
+        """Re-hash the CPDs now (after editing a values array in place)."""
+        with self._lock:
+            self._token = None
+            self._check()
+
+    def query(self, target=TARGET, evidence=None):
+        """Posterior vector of target (read-only array in state_names[target] order)."""
+        with self._lock:
+            self._check()
+            if target not in self.state_names:
+                raise ValueError(f"Unknown variable {target!r}")
+            key = (target, canonical_evidence(self.state_names, evidence))
+            if any(var == target for var, _ in key[1]):
+                raise ValueError(f"{target!r} cannot be both queried and observed")
+            p = self._cache.get(key)
+            if p is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return p
+
+            self.misses += 1
+            p = np.array(self._engine(target, dict(key[1])), dtype=np.float64)
+            p.flags.writeable = False
+            self._cache[key] = p
+            if len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+            return p
+
+    def query_dict(self, target=TARGET, evidence=None):
+        return dict(zip(self.state_names[target], self.query(target, evidence).tolist()))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions, 'invalidations': self.invalidations,
+                'size': len(self._cache), 'capacity': self.capacity}
+
+
+if __name__ == '__main__':
+    import random
+    from time import perf_counter
+
+    from model import model
+
+    rnd = random.Random(0)
+    service = InferenceService(model)
+    evidence_vars = [v for v in sorted(service.state_names) if v != TARGET]
+
+    def request():
+        # random partial evidence with a random key order, as a client would send it
+        ev = {v: rnd.choice(service.state_names[v]) for v in evidence_vars if rnd.random() < 0.6}
+        keys = list(ev)
+        rnd.shuffle(keys)
+        return {k: ev[k] for k in keys}
+
+    requests = [request() for _ in range(20000)]
+    t0 = perf_counter()
+    for ev in requests:
+        service.query(TARGET, ev)
+    cached_us = (perf_counter() - t0) / len(requests) * 1e6
+
+    plain = ve_engine(model)
+    t0 = perf_counter()
+    for ev in requests[:500]:
+        plain(TARGET, ev)
+    plain_us = (perf_counter() - t0) / 500 * 1e6
+
+    cm = CompiledModel.from_model(model)
+    worst = max(np.abs(service.query(TARGET, ev) - cm.posterior(TARGET, ev)).max() for ev in requests[:500])
+    s = service.stats()
+    print(f"{len(requests)} requests: {cached_us:.1f} us/request cached vs {plain_us:.1f} us uncached VariableElimination"
+          f" | hit rate {s['hit_rate']:.1%} ({s['hits']} hits, {s['misses']} misses, {s['evictions']} evictions)"
+          f" | max abs diff vs joint {worst:.1e}")
+
+    # swap the Service Status CPD values: the next query notices and recomputes
+    evidence = {'Weather': 'Heavy', 'Day Type': 'Weekday'}
+    before = service.query_dict(TARGET, evidence)
+    cpd = model.get_cpds('Service Status')
+    original = cpd.values
+    cpd.values = np.array([0.5, 0.2, 0.3])
+    after = service.query_dict(TARGET, evidence)
+    expect = CompiledModel.from_model(model).posterior(TARGET, evidence)
+    if np.abs(np.array(list(after.values())) - expect).max() > 1e-12:
+        raise RuntimeError("cached posterior survived a CPD change")
+    cpd.values = original
+    print(f"CPD change invalidated the cache (invalidations={service.stats()['invalidations']}):"
+          f" P(High) {before['High']:.4f} -> {after['High']:.4f}")
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from compiled import CompiledModel, TARGET
+
+# NumPy-only serving runtime.
+#
+# Importing model.py pulls in pgmpy (and pandas, networkx, torch, ...), which costs
+# seconds of startup and hundreds of MB per serving process. The model itself is six
+# small CPD tables, so it is exported once to a bundle (.npz: one array per CPD plus a
+# JSON header with the variable order and state names) and served from that with
+# compiled.CompiledModel, which only needs NumPy.
+#
+# pgmpy is imported lazily, and only when a bundle has to be (re)built: export_bundle()
+# with no model, or load_runtime() when the bundle file is missing or stale. Serving
+# processes that find an up-to-date bundle never import it.
+#
+# A bundle exported from model.py records a hash of model.py's bytes. load_runtime
+# compares it with the model.py next to it (hashing needs no pgmpy) and re-exports, or
+# raises with on_stale='raise', when they differ. Without a model.py alongside (a
+# container that ships only the bundle) the bundle is served as is.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUNDLE = os.path.join(HERE, 'crowding_bundle.npz')
+MODEL_SOURCE = os.path.join(HERE, 'model.py')
+BUNDLE_VERSION = 2
+
+
+def source_fingerprint(path=MODEL_SOURCE):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def export_bundle(model=None, path=BUNDLE):
+    """Write the CPDs of a DiscreteBayesianNetwork (default: model.py) to path."""
+    source = None
+    if model is None:
+        source = source_fingerprint()
+        from model import model       # pulls in pgmpy: authoring side only
+    cpds = []
+    arrays = {}
+    for i, cpd in enumerate(model.get_cpds()):
+        cpds.append({'variables': list(cpd.variables),
+                     'state_names': {v: list(cpd.state_names[v]) for v in cpd.variables}})
+        arrays[f'cpd_{i}'] = np.asarray(cpd.get_values(), dtype=np.float64).reshape(cpd.cardinality)
+    header = {'version': BUNDLE_VERSION, 'source': source, 'variables': sorted(model.nodes()), 'cpds': cpds}
+    with open(path, 'wb') as f:
+        np.savez(f, header=np.array(json.dumps(header)), **arrays)
+    return path
+
+
+def read_header(path=BUNDLE):
+    with np.load(path, allow_pickle=False) as data:
+        return json.loads(str(data['header']))
+
+def load_bundle(path=BUNDLE):
+    """CompiledModel from an exported bundle; checks shapes and that every CPD column sums to 1."""
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(str(data['header']))
+        if header.get('version') != BUNDLE_VERSION:
+            raise ValueError(f"{path}: bundle version {header.get('version')}, expected {BUNDLE_VERSION}")
+        arrays = [data[f'cpd_{i}'] for i in range(len(header['cpds']))]
+
+    state_names = {}
+    factors = []
+    for spec, values in zip(header['cpds'], arrays):
+        fv = spec['variables']
+        for v in fv:
+            states = spec['state_names'][v]
+            if state_names.setdefault(v, states) != states:
+                raise ValueError(f"{path}: CPDs disagree on the states of {v!r}")
+        shape = tuple(len(spec['state_names'][v]) for v in fv)
+        if values.shape != shape:
+            raise ValueError(f"{path}: CPD of {fv[0]!r} has shape {values.shape}, expected {shape}")
+        if not np.allclose(values.sum(axis=0), 1.0, atol=0.01):
+            raise ValueError(f"{path}: CPD of {fv[0]!r} does not sum to 1 for every parent assignment")
+        factors.append((fv, values))
+
+    missing = set(header['variables']) - set(state_names)
+    if missing:
+        raise ValueError(f"{path}: no CPD for {sorted(missing)}")
+    return CompiledModel(header['variables'], state_names, factors)
+
+
+def stale_reason(path=BUNDLE):
+    """Why the bundle at path does not match model.py, or None if it is up to date."""
+    header = read_header(path)
+    if header.get('version') != BUNDLE_VERSION:
+        return f"bundle version {header.get('version')}, expected {BUNDLE_VERSION}"
+    if header.get('source') is not None and os.path.exists(MODEL_SOURCE):
+        current = source_fingerprint()
+        if header['source'] != current:
+            return f"exported from model.py {header['source']}, model.py is now {current}"
+    return None
+
+def load_runtime(path=BUNDLE, rebuild=False, on_stale='rebuild'):
+    """
+    Serving entry point: load the bundle, exporting it from model.py first if it is
+    missing or stale. on_stale='raise' refuses a missing or stale bundle instead of
+    re-exporting (for processes that must never import pgmpy).
+    """
+    if on_stale not in ('rebuild', 'raise'):
+        raise ValueError(f"Unknown on_stale {on_stale!r}")
+    if on_stale == 'raise' and not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; run `python runtime.py --export`")
+    if not rebuild and os.path.exists(path):
+        reason = stale_reason(path)
+        if reason is None:
+            return load_bundle(path)
+        if on_stale == 'raise':
+            raise ValueError(f"{path} is stale ({reason}); run `python runtime.py --export`")
+    export_bundle(path=path)
+    return load_bundle(path)
+
+
+def query(cm, evidence, target=TARGET):
+    """{state: probability} of target given evidence."""
+    return dict(zip(cm.state_names[target], cm.posterior(target, evidence).tolist()))
+
+
+if __name__ == '__main__':
+    import sys
+    from time import perf_counter
+
+    if '--export' in sys.argv:
+        print(f"wrote {export_bundle()}")
+        sys.exit(0)
+
+    t0 = perf_counter()
+    cm = load_runtime(on_stale='raise' if '--strict' in sys.argv else 'rebuild')
+    t1 = perf_counter()
+    heavy = sorted(m for m in ('pgmpy', 'pandas', 'networkx', 'torch') if m in sys.modules)
+    print(f"Loaded {os.path.basename(BUNDLE)} in {(t1 - t0) * 1000:.1f} ms"
+          f" | heavy modules imported: {', '.join(heavy) or 'none'}")
+    try:
+        import resource
+        print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    except ImportError:
+        pass
+
+    queries = [
+        ("Given a Very Rainy Weekday with Disrupted Service:",
+         {'Weather': 'Heavy', 'Day Type': 'Weekday', 'Service Status': 'Disrupted'}),
+        ("Given a Clear Weekend with Normal Service:",
+         {'Weather': 'None', 'Day Type': 'Weekend', 'Service Status': 'Normal'}),
+        ("Given a Rainy Day with Normal Service and High Demand:",
+         {'Demand Proxy': 'High', 'Weather': 'Heavy', 'Service Status': 'Normal'}),
+        ("Given a Rainy Weekday with Disrupted Service (Future Mode):",
+         {'Weather': 'Heavy', 'Day Type': 'Weekday', 'Service Status': 'Reduced', 'Network Mode': 'Future'}),
+    ]
+    for title, evidence in queries:
+        print(f"\n{title}")
+        print("Crowd")
+        for state, p in query(cm, evidence).items():
+            print(f"    {state}: {p:.4f}")
+
+    if '--check' in sys.argv:
+        # compare with the pgmpy model (imports pgmpy on purpose)
+        from model import model
+        diff = np.abs(CompiledModel.from_model(model).joint - cm.joint).max()
+        if diff > 1e-12:
+            raise RuntimeError(f"bundle joint differs from model.py (max abs diff {diff})")
+        print(f"\nBundle matches model.py (max abs diff {diff:.1e})")
@@ -0,0 +1,185 @@
+from __future__ import annotations
+from typing import List, Tuple
+from array import array
+import argparse
+import heapq
+
+import numpy as np
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Node, Heuristic, NetworkContext, SUPER_START, SUPER_GOAL
+from csr_graph import CSRGraph, compile_csr, reverse_csr
+
+# ALT (A*, Landmarks, Triangle inequality) heuristic for astar / gbfs.
+#
+# Preprocessing picks k landmark stations by farthest-point selection and stores,
+# for every state node v:
+#   fwd[L, v] = d(L, v)   (Dijkstra from the landmark's line nodes)
+#   bwd[L, v] = d(v, L)   (same, on the reversed graph)
+# For a goal station with line nodes T the triangle inequality gives
+#   d(v, T) >= max_L max( min_t fwd[L, t] - fwd[L, v],  bwd[L, v] - max_t bwd[L, t] )
+# which is admissible and consistent, and far tighter than the straight-line bound
+# scaled by compute_safe_minutes_per_km. The alighting crowd cost is added on top,
+# so the bound is exact on the goal's line nodes.
+
+INF = float("inf")
+
+
+def multi_source_dijkstra(offsets: array, targets: array, costs: array,
+                          sources: List[int], n: int) -> np.ndarray:
+    dist = [INF] * n
+    pq: List[Tuple[float, int]] = []
+    for s in sources:
+        dist[s] = 0.0
+        pq.append((0.0, s))
+    heapq.heapify(pq)
+
+    while pq:
+        d, u = heapq.heappop(pq)
+        if d != dist[u]:
+            continue
+        lo, hi = offsets[u], offsets[u + 1]
+        for v, c in zip(targets[lo:hi], costs[lo:hi]):
+            nd = d + c
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(pq, (nd, v))
+
+    return np.array(dist, dtype=np.float64)
+
+
+class Landmarks:
+    """Forward/backward landmark distance tables over one compiled state graph."""
+
+    def __init__(self, g: CSRGraph, landmark_stations: List[int], fwd: np.ndarray, bwd: np.ndarray) -> None:
+        self.g = g
+        self.landmark_stations = landmark_stations
+        self.fwd = fwd          # shape (k, n_nodes)
+        self.bwd = bwd          # shape (k, n_nodes)
+
+    @property
+    def names(self) -> List[Station]:
+        return [self.g.stations[s] for s in self.landmark_stations]
+
+    def node_bounds(self, goal_sid: int) -> np.ndarray:
+        """Lower bound on d(v, goal line nodes) for every node v, one vectorized pass."""
+        goal_nodes = np.asarray(self.g.nodes_of(goal_sid), dtype=np.int64)
+        fwd_t = self.fwd[:, goal_nodes].min(axis=1, keepdims=True)
+        bwd_t = self.bwd[:, goal_nodes].max(axis=1, keepdims=True)
+        with np.errstate(invalid="ignore"):
+            lb = np.maximum(fwd_t - self.fwd, self.bwd - bwd_t).max(axis=0)
+        # inf - inf (both unreachable from a landmark) carries no information
+        lb[np.isnan(lb)] = 0.0
+        return np.maximum(lb, 0.0)
+
+    def heuristic_for(self, start: Station, goal: Station) -> Heuristic:
+        """Drop-in `heuristic=` for astar/gbfs on attach_query(ctx, start, goal)."""
+        g = self.g
+        t = g.station_id.get(goal)
+        s = g.station_id.get(start)
+        if t is None:
+            return lambda n: 0.0
+
+        hs = (self.node_bounds(t) + g.crowd[t]).tolist()
+        start_h = 0.0
+        if s is not None:
+            start_h = g.crowd[s] + min(hs[u] for u in g.nodes_of(s))
+        node_id = g.node_id
+
+        def h(n: Node) -> float:
+            i = node_id.get(n)
+            if i is not None:
+                return hs[i]
+            return start_h if n == SUPER_START else 0.0
+
+        return h
+
+
+def select_landmarks(g: CSRGraph, k: int) -> List[int]:
+    """Farthest-point selection at station level; unreachable stations count as farthest."""
+    n_st = len(g.stations)
+    node_station = np.frombuffer(g.node_station, dtype=np.int32)
+
+    def station_dist(sid: int) -> np.ndarray:
+        d = multi_source_dijkstra(g.offsets, g.targets, g.costs, list(g.nodes_of(sid)), g.n_nodes)
+        best = np.full(n_st, INF)
+        np.minimum.at(best, node_station, d)
+        return best
+
+    # seed: farthest station from station 0, then repeatedly the station farthest from the set
+    chosen = [int(np.argmax(station_dist(0)))]
+    nearest = station_dist(chosen[0])
+    while len(chosen) < min(k, n_st):
+        nearest[chosen] = -1.0
+        nxt = int(np.argmax(nearest))
+        if nearest[nxt] <= 0.0:
+            break
+        chosen.append(nxt)
+        nearest = np.minimum(nearest, station_dist(nxt))
+    return chosen
+
+
+def build_landmarks(ctx: NetworkContext, k: int = 4) -> Landmarks:
+    g = compile_csr(ctx)
+    r_offsets, r_targets, r_costs = reverse_csr(g)
+    chosen = select_landmarks(g, k)
+
+    fwd = np.empty((len(chosen), g.n_nodes))
+    bwd = np.empty((len(chosen), g.n_nodes))
+    for i, sid in enumerate(chosen):
+        sources = list(g.nodes_of(sid))
+        fwd[i] = multi_source_dijkstra(g.offsets, g.targets, g.costs, sources, g.n_nodes)
+        bwd[i] = multi_source_dijkstra(r_offsets, r_targets, r_costs, sources, g.n_nodes)
+    return Landmarks(g, chosen, fwd, bwd)
+
+
+# Benchmark: straight-line heuristic vs ALT on the same queries
+
+def compare_heuristics(ctx: NetworkContext, title: str, tests: List[Tuple[Station, Station]], k: int) -> None:
+    lm = build_landmarks(ctx, k)
+    print(f"\n=== {title} === landmarks={lm.names}")
+
+    starts, goals = [SUPER_START], {SUPER_GOAL}
+
+    def run(s: Station, t: Station) -> Tuple[int, int, int, int]:
+        qg = mrp.attach_query(ctx, s, t)
+        h_alt = lm.heuristic_for(s, t)
+        _, c_line, e_line = mrp.astar(ctx, qg, starts, goals, t, s)
+        _, c_alt, e_alt = mrp.astar(ctx, qg, starts, goals, t, s, heuristic=h_alt)
+        if abs(c_line - c_alt) > 1e-9:
+            raise RuntimeError(f"ALT changed the optimal cost on {s} -> {t}: {c_line} vs {c_alt}")
+        _, g_line = mrp.gbfs(ctx, qg, starts, goals, t, s)
+        _, g_alt = mrp.gbfs(ctx, qg, starts, goals, t, s, heuristic=h_alt)
+        return e_line, e_alt, g_line, g_alt
+
+    for s, t in tests:
+        e_line, e_alt, g_line, g_alt = run(s, t)
+        print(f"  {s} -> {t}: A* expanded {e_line:4d} -> {e_alt:4d} ({_drop(e_line, e_alt)})"
+              f" | GBFS expanded {g_line:4d} -> {g_alt:4d}")
+
+    # all OD pairs, so the drop is not an artefact of the five hand-picked tests
+    totals = [0, 0]
+    stations = sorted(ctx.state.lines)
+    for s in stations:
+        for t in stations:
+            if s != t:
+                e_line, e_alt, _, _ = run(s, t)
+                totals[0] += e_line
+                totals[1] += e_alt
+    print(f"  all {len(stations) * (len(stations) - 1)} OD pairs: A* expanded"
+          f" {totals[0]} -> {totals[1]} ({_drop(totals[0], totals[1])})")
+
+def _drop(before: int, after: int) -> str:
+    return f"-{100.0 * (before - after) / before:.0f}%" if before else "n/a"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compare straight-line vs ALT heuristics.")
+    ap.add_argument("-k", "--landmarks", type=int, default=4)
+    args = ap.parse_args()
+
+    compare_heuristics(mrp.build_network_context(False), "TODAY MODE", mrp.TESTS_TODAY, args.landmarks)
+    compare_heuristics(mrp.build_network_context(True), "FUTURE MODE", mrp.TESTS_FUTURE, args.landmarks)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from time import perf_counter, perf_counter_ns
+import argparse
+import csv
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Node, NetworkContext, SUPER_START, SUPER_GOAL
+import network_loader
+
+# Routing benchmark harness + synthetic metro networks.
+#
+# Networks: the hand-coded Today/Future graphs, the data-driven full network and
+# synthetic metros of any size. A synthetic metro is a set of lines drawn as jittered
+# random walks; every line after the first starts at an existing station, and a new
+# stop that lands within interchange_km of another line's station becomes that
+# interchange. The generator emits station rows with line codes (AA1, AB7/AC3, ...)
+# plus a resolved spec, so it goes through network_loader exactly like the real data.
+#
+# Engines: anything registered in ENGINES as name -> prepare(ctx) -> query(start, goal),
+# where query returns (node_path or None, expanded). prepare does the one-off work
+# (CSR compile, hierarchy build, landmarks) and is timed separately.
+#
+# Per engine and network: warmup queries, then `repeat` passes over the same seeded
+# OD sample with per-query latencies (p50/p90/p99/mean), mean expanded nodes, and a
+# separate tracemalloc pass for peak memory of prepare and of the queries (kept out of
+# the timed runs, since tracing slows Python down several-fold). Results are written
+# as JSON and/or CSV.
+
+Query = Callable[[Station, Station], Tuple[Optional[List[Node]], int]]
+Prepare = Callable[[NetworkContext], Query]
+
+ENGINES: Dict[str, Prepare] = {}
+DEFAULT_ENGINES = ("BFS", "DFS", "GBFS", "A*", "BiA*", "CSR-A*")
+
+CSV_FIELDS = (
+    "network", "stations", "nodes", "edges", "engine", "queries", "repeat", "found",
+    "prep_ms", "p50_ms", "p90_ms", "p99_ms", "mean_ms", "mean_expanded", "prep_peak_kib", "query_peak_kib",
+)
+
+
+def register_engine(name: str) -> Callable[[Prepare], Prepare]:
+    def deco(prepare: Prepare) -> Prepare:
+        ENGINES[name] = prepare
+        return prepare
+    return deco
+
+
+# Engines
+
+def _core_engine(name: str) -> Prepare:
+    def prepare(ctx: NetworkContext) -> Query:
+        starts, goals = [SUPER_START], {SUPER_GOAL}
+
+        def query(s: Station, t: Station) -> Tuple[Optional[List[Node]], int]:
+            sg = mrp.attach_query(ctx, s, t)
+            p, _, expanded = mrp.run_search(ctx, name, sg, starts, goals, t, s)
+            return p, expanded
+        return query
+    return prepare
+
+for _name in mrp.ALGORITHMS + ("BiDijkstra",):
+    register_engine(_name)(_core_engine(_name))
+
+@register_engine("CSR-A*")
+def _csr_astar(ctx: NetworkContext) -> Query:
+    from csr_graph import compile_csr, csr_astar
+    g = compile_csr(ctx)
+
+    def query(s: Station, t: Station) -> Tuple[Optional[List[Node]], int]:
+        p, _, expanded = csr_astar(g, s, t)
+        return p, expanded
+    return query
+
+@register_engine("ALT")
+def _alt(ctx: NetworkContext) -> Query:
+    from alt_heuristic import build_landmarks
+    lm = build_landmarks(ctx)
+    starts, goals = [SUPER_START], {SUPER_GOAL}
+
+    def query(s: Station, t: Station) -> Tuple[Optional[List[Node]], int]:
+        p, _, expanded = mrp.astar(ctx, mrp.attach_query(ctx, s, t), starts, goals, t, s,
+                                   heuristic=lm.heuristic_for(s, t))
+        return p, expanded
+    return query
+
+@register_engine("CH")
+def _ch(ctx: NetworkContext) -> Query:
+    from contraction_hierarchy import build_contraction_hierarchy
+    ch = build_contraction_hierarchy(ctx)
+
+    def query(s: Station, t: Station) -> Tuple[Optional[List[Node]], int]:
+        p, _, settled = ch.query(s, t)
+        return p, settled
+    return query
+
+
+# Synthetic networks
+
+def _prefix(i: int) -> str:
+    return chr(ord("A") + i // 26) + chr(ord("A") + i % 26)
+
+def synthetic_rows(n_stations: int, n_lines: int, seed: int = 0, spacing_km: float = 1.2,
+                   interchange_km: float = 0.5) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Station rows (code, station_name, latitude, longitude) + resolved loader spec."""
+    if not 1 <= n_lines <= 26 * 26:
+        raise ValueError(f"n_lines must be in 1..676 (two-letter line codes), got {n_lines}")
+    if n_stations < 2 * n_lines:
+        raise ValueError(f"need at least 2 stations per line, got {n_stations} for {n_lines} lines")
+
+    rnd = random.Random(seed)
+    side = spacing_km * math.sqrt(n_stations) * 1.6
+    xy: List[Tuple[float, float]] = []
+    codes: List[List[str]] = []
+    grid: Dict[Tuple[int, int], List[int]] = {}         # spatial hash for interchange snapping
+
+    def cell(x: float, y: float) -> Tuple[int, int]:
+        return int(x // interchange_km), int(y // interchange_km)
+
+    def nearby(x: float, y: float, exclude: set) -> Optional[int]:
+        cx, cy = cell(x, y)
+        best, best_d = None, interchange_km
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for i in grid.get((cx + dx, cy + dy), ()):
+                    d = math.hypot(xy[i][0] - x, xy[i][1] - y)
+                    if d < best_d and i not in exclude:
+                        best, best_d = i, d
+        return best
+
+    def new_station(x: float, y: float) -> int:
+        xy.append((x, y))
+        codes.append([])
+        grid.setdefault(cell(x, y), []).append(len(xy) - 1)
+        return len(xy) - 1
+
+    for k in range(n_lines):
+        prefix = _prefix(k)
+        remaining = n_stations - len(xy)
+        target = max(2, remaining // (n_lines - k))
+        if k == 0:
+            cur = new_station(rnd.uniform(0, side), rnd.uniform(0, side))
+        else:
+            cur = rnd.randrange(len(xy))                # start on the existing network
+        on_line = [cur]
+        heading = rnd.uniform(0, 2 * math.pi)
+        added = 0
+        while added < target or len(on_line) < 2:
+            heading += rnd.gauss(0, 0.25)
+            x = xy[on_line[-1]][0] + spacing_km * math.cos(heading)
+            y = xy[on_line[-1]][1] + spacing_km * math.sin(heading)
+            if not (0 <= x <= side and 0 <= y <= side):
+                heading += math.pi                      # bounce off the edge of the map
+                continue
+            snap = nearby(x, y, set(on_line))
+            if snap is None:
+                snap = new_station(x, y)
+                added += 1
+            on_line.append(snap)
+            if len(on_line) > 4 * target + 8:           # wandering through dense areas: stop
+                break
+        for n, st in enumerate(on_line, 1):
+            codes[st].append(f"{prefix}{n}")
+
+    ref_lat, ref_lon = 1.35, 103.8
+    rows = []
+    for i, ((x, y), cs) in enumerate(zip(xy, codes)):
+        lat = ref_lat + y / 110.574
+        lon = ref_lon + x / (111.320 * math.cos(math.radians(ref_lat)))
+        rows.append({"code": "/".join(cs), "station_name": f"S{i:06d}", "latitude": lat, "longitude": lon})
+    resolved = {
+        "coordinates": [],
+        "lines": {_prefix(k): f"L{k:03d}" for k in range(n_lines)},
+        "timing": {"speed_kmh": 40.0, "dwell_min": 0.5, "min_minutes": 2},
+    }
+    return rows, resolved
+
+def synthetic_context(n_stations: int, n_lines: Optional[int] = None, seed: int = 0,
+                      interchange_km: float = 0.5) -> NetworkContext:
+    """A synthetic metro as a NetworkContext (no crowding; default ~1 line per 25 stations)."""
+    if n_lines is None:
+        n_lines = max(2, min(26 * 26, n_stations // 25))
+    rows, resolved = synthetic_rows(n_stations, n_lines, seed, interchange_km=interchange_km)
+    net = network_loader.build_network_from_rows("synthetic", resolved, rows, f"synthetic-{n_stations}-{seed}")
+    return mrp.build_network_context(False, base=net.base, coords=net.coords)
+
+
+# Measurement
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    k = min(len(sorted_values) - 1, max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+def od_sample(ctx: NetworkContext, n: int, seed: int) -> List[Tuple[Station, Station]]:
+    rnd = random.Random(seed)
+    stations = sorted(ctx.state.lines)
+    return [tuple(rnd.sample(stations, 2)) for _ in range(n)]  # type: ignore[misc]
+
+def bench_engine(name: str, ctx: NetworkContext, pairs: List[Tuple[Station, Station]],
+                 warmup: int, repeat: int) -> Dict[str, Any]:
+    prepare = ENGINES[name]
+
+    t0 = perf_counter()
+    query = prepare(ctx)
+    prep_ms = (perf_counter() - t0) * 1000
+
+    for s, t in pairs[:warmup]:
+        query(s, t)
+
+    latencies: List[float] = []
+    expanded = found = 0
+    for r in range(repeat):
+        for s, t in pairs:
+            t0n = perf_counter_ns()
+            p, exp = query(s, t)
+            latencies.append((perf_counter_ns() - t0n) / 1e6)
+            if r == 0:
+                expanded += exp
+                found += p is not None
+    latencies.sort()
+
+    # memory: a separate traced pass, so tracing overhead never shows up in the latencies
+    tracemalloc.start()
+    traced = prepare(ctx)
+    prep_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    base_now = tracemalloc.get_traced_memory()[0]
+    for s, t in pairs[:max(1, min(len(pairs), 50))]:
+        traced(s, t)
+    query_peak = tracemalloc.get_traced_memory()[1] - base_now
+    tracemalloc.stop()
+
+    return {
+        "engine": name,
+        "queries": len(pairs),
+        "repeat": repeat,
+        "found": found,
+        "prep_ms": round(prep_ms, 3),
+        "p50_ms": round(_percentile(latencies, 50), 4),
+        "p90_ms": round(_percentile(latencies, 90), 4),
+        "p99_ms": round(_percentile(latencies, 99), 4),
+        "mean_ms": round(sum(latencies) / len(latencies), 4),
+        "mean_expanded": round(expanded / len(pairs), 1),
+        "prep_peak_kib": round(prep_peak / 1024, 1),
+        "query_peak_kib": round(query_peak / 1024, 1),
+    }
+
+def network_contexts(real: bool, sizes: Sequence[int], lines: Optional[int], seed: int,
+                     interchange_km: float = 0.5) -> List[Tuple[str, NetworkContext]]:
+    out: List[Tuple[str, NetworkContext]] = []
+    if real:
+        out.append(("today", mrp.build_network_context(False)))
+        out.append(("future", mrp.build_network_context(True)))
+        out.append(("full-today", network_loader.build_loaded_context("today")))
+    for n in sizes:
+        out.append((f"synthetic-{n}", synthetic_context(n, lines, seed, interchange_km)))
+    return out
+
+def run_benchmarks(networks: List[Tuple[str, NetworkContext]], engines: Sequence[str],
+                   queries: int, warmup: int, repeat: int, seed: int) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    header = f"{'network':<18} {'engine':<10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'expanded':>9} {'peak KiB':>9}"
+    print(header)
+    for label, ctx in networks:
+        pairs = od_sample(ctx, queries, seed)
+        info = {"network": label, "stations": len(ctx.state.lines), "nodes": len(ctx.state.adj),
+                "edges": sum(len(es) for es in ctx.state.adj.values())}
+        for name in engines:
+            rec = {**info, **bench_engine(name, ctx, pairs, warmup, repeat)}
+            results.append(rec)
+            print(f"{label:<18} {name:<10} {rec['p50_ms']:>9.3f} {rec['p90_ms']:>9.3f} {rec['p99_ms']:>9.3f}"
+                  f" {rec['mean_expanded']:>9.1f} {rec['query_peak_kib']:>9.1f}")
+    return results
+
+
+def write_json(results: List[Dict[str, Any]], path: str, params: Dict[str, Any]) -> None:
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": params,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+
+def write_csv(results: List[Dict[str, Any]], path: str) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        w.writeheader()
+        for rec in results:
+            w.writerow({k: rec[k] for k in CSV_FIELDS})
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark routing engines on real and synthetic networks.")
+    ap.add_argument("--sizes", type=int, nargs="*", default=[100, 1000, 10000],
+                    help="synthetic network sizes in stations (100 .. 100000)")
+    ap.add_argument("--lines", type=int, default=None, help="synthetic lines (default: stations / 25)")
+    ap.add_argument("--interchange-km", type=float, default=0.5,
+                    help="a new stop this close to another line's station becomes an interchange")
+    ap.add_argument("--no-real", action="store_true", help="skip the hand-coded and data-driven networks")
+    ap.add_argument("--engines", nargs="+", default=list(DEFAULT_ENGINES), choices=sorted(ENGINES))
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--warmup", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write results + run metadata as JSON")
+    ap.add_argument("--csv", help="write results as CSV")
+    args = ap.parse_args()
+
+    networks = network_contexts(not args.no_real, args.sizes, args.lines, args.seed, args.interchange_km)
+    results = run_benchmarks(networks, args.engines, args.queries, args.warmup, args.repeat, args.seed)
+    if args.json:
+        write_json(results, args.json, {k: v for k, v in vars(args).items() if k not in ("json", "csv")})
+        print(f"wrote {args.json}")
+    if args.csv:
+        write_csv(results, args.csv)
+        print(f"wrote {args.csv}")
+
+if __name__ == "__main__":
+    main()
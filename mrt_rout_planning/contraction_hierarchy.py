@@ -0,0 +1,306 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple, Optional
+from time import perf_counter
+import argparse
+import heapq
+import pickle
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Node, NetworkContext, SUPER_START, SUPER_GOAL
+from csr_graph import CSRGraph, compile_csr
+
+# Contraction hierarchy over the (station, line) state graph.
+#
+# Offline: nodes are contracted one at a time in edge-difference order. When v is
+# removed, every in-neighbour u / out-neighbour w pair gets a shortcut u -> w with
+# cost c(u,v) + c(v,w) unless a witness path avoiding v is at least as cheap. Ride
+# minutes, interchange transfer_penalty and crowd_value costs are summed exactly,
+# so shortcut costs equal the original path costs bit for bit.
+#
+# Online: a forward search from the boarding nodes and a backward search from the
+# alighting nodes only ever climb to higher-ranked nodes. Shortcuts are unpacked
+# through their middle node, giving a plain Node path again (with __START__ and
+# __GOAL__), so collapse_station_path / transfer_count / path_cost still apply.
+
+INF = float("inf")
+FORMAT_VERSION = 1
+
+UpGraph = List[List[Tuple[int, float]]]
+
+
+class ContractionHierarchy:
+    def __init__(self, g: CSRGraph, rank: List[int], up_fwd: UpGraph, up_bwd: UpGraph,
+                 middle: Dict[Tuple[int, int], int], shortcuts: int) -> None:
+        self.g = g
+        self.rank = rank
+        self.up_fwd = up_fwd        # u -> [(w, cost)] with rank[w] > rank[u]
+        self.up_bwd = up_bwd        # w -> [(u, cost)] for edges u -> w with rank[u] > rank[w]
+        self.middle = middle        # shortcut (u, w) -> contracted node it bypasses
+        self.shortcuts = shortcuts
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            pickle.dump((FORMAT_VERSION, self), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str) -> "ContractionHierarchy":
+        with open(path, "rb") as f:
+            version, ch = pickle.load(f)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path}: hierarchy format v{version}, expected v{FORMAT_VERSION}")
+        return ch
+
+    # Query
+
+    def _unpack(self, u: int, w: int, out: List[int]) -> None:
+        """Append the original nodes strictly after u up to and including w."""
+        stack = [(u, w)]
+        while stack:
+            a, b = stack.pop()
+            m = self.middle.get((a, b))
+            if m is None:
+                out.append(b)
+            else:
+                stack.append((m, b))
+                stack.append((a, m))
+
+    def query(self, start: Station, goal: Station) -> Tuple[Optional[List[Node]], float, int]:
+        """(node_path, cost, settled) for start -> goal, same shape as astar's result."""
+        g = self.g
+        s = g.station_id.get(start)
+        t = g.station_id.get(goal)
+        if s is None or t is None:
+            return None, INF, 0
+
+        dist_f: Dict[int, float] = {}
+        dist_b: Dict[int, float] = {}
+        par_f: Dict[int, int] = {}
+        par_b: Dict[int, int] = {}
+        pq_f: List[Tuple[float, int]] = []
+        pq_b: List[Tuple[float, int]] = []
+
+        board, alight = g.crowd[s], g.crowd[t]
+        for u in g.nodes_of(s):
+            dist_f[u] = board
+            par_f[u] = -1
+            pq_f.append((board, u))
+        for u in g.nodes_of(t):
+            dist_b[u] = alight
+            par_b[u] = -1
+            pq_b.append((alight, u))
+        heapq.heapify(pq_f)
+        heapq.heapify(pq_b)
+
+        mu = INF
+        meet = -1
+        settled = 0
+        up_fwd, up_bwd = self.up_fwd, self.up_bwd
+
+        while pq_f or pq_b:
+            # each side stops once its smallest key can no longer improve mu
+            if pq_f and pq_f[0][0] >= mu:
+                pq_f = []
+            if pq_b and pq_b[0][0] >= mu:
+                pq_b = []
+            if not pq_f and not pq_b:
+                break
+
+            forward = bool(pq_f) and (not pq_b or pq_f[0][0] <= pq_b[0][0])
+            pq, dist, par, other, up = ((pq_f, dist_f, par_f, dist_b, up_fwd) if forward
+                                        else (pq_b, dist_b, par_b, dist_f, up_bwd))
+            d, u = heapq.heappop(pq)
+            if d != dist[u]:
+                continue
+            settled += 1
+            if u in other and d + other[u] < mu:
+                mu = d + other[u]
+                meet = u
+            for v, c in up[u]:
+                nd = d + c
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    par[v] = u
+                    heapq.heappush(pq, (nd, v))
+
+        if meet < 0:
+            return None, INF, settled
+
+        # climb back to the boarding node, then unpack every hierarchy edge
+        up_chain = [meet]
+        while par_f[up_chain[-1]] >= 0:
+            up_chain.append(par_f[up_chain[-1]])
+        up_chain.reverse()
+        ids = [up_chain[0]]
+        for a, b in zip(up_chain, up_chain[1:]):
+            self._unpack(a, b, ids)
+        u = meet
+        while par_b[u] >= 0:
+            self._unpack(u, par_b[u], ids)
+            u = par_b[u]
+
+        return [SUPER_START] + [g.node(i) for i in ids] + [SUPER_GOAL], mu, settled
+
+
+# Offline builder
+
+def _witness_cost(out_edges: List[Dict[int, float]], source: int, skip: int,
+                  targets: Dict[int, float], limit: float, max_settled: int) -> Dict[int, float]:
+    """Bounded Dijkstra from source avoiding `skip`; returns best known cost to each target."""
+    dist: Dict[int, float] = {source: 0.0}
+    pq: List[Tuple[float, int]] = [(0.0, source)]
+    remaining = set(targets)
+    settled = 0
+    while pq and remaining and settled < max_settled:
+        d, u = heapq.heappop(pq)
+        if d != dist[u]:
+            continue
+        if d > limit:
+            break
+        settled += 1
+        remaining.discard(u)
+        for v, c in out_edges[u].items():
+            if v == skip:
+                continue
+            nd = d + c
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                heapq.heappush(pq, (nd, v))
+    return {w: dist.get(w, INF) for w in targets}
+
+def _needed_shortcuts(out_edges: List[Dict[int, float]], in_edges: List[Dict[int, float]],
+                      v: int, max_settled: int) -> List[Tuple[int, int, float]]:
+    out: List[Tuple[int, int, float]] = []
+    outs = out_edges[v]
+    if not outs:
+        return out
+    max_out = max(outs.values())
+    for u, cu in in_edges[v].items():
+        targets = {w: cu + cw for w, cw in outs.items() if w != u}
+        if not targets:
+            continue
+        witness = _witness_cost(out_edges, u, v, targets, cu + max_out, max_settled)
+        for w, via in targets.items():
+            if witness[w] > via:
+                out.append((u, w, via))
+    return out
+
+def build_contraction_hierarchy(ctx: NetworkContext, max_settled: int = 64) -> ContractionHierarchy:
+    """Contract every node of the mode's state graph."""
+    g = compile_csr(ctx)
+    n = g.n_nodes
+
+    out_edges: List[Dict[int, float]] = [{} for _ in range(n)]
+    in_edges: List[Dict[int, float]] = [{} for _ in range(n)]
+    for u in range(n):
+        lo, hi = g.offsets[u], g.offsets[u + 1]
+        for v, c in zip(g.targets[lo:hi], g.costs[lo:hi]):
+            if u != v and c < out_edges[u].get(v, INF):
+                out_edges[u][v] = c
+                in_edges[v][u] = c
+
+    contracted_nbrs = [0] * n
+
+    def priority(v: int) -> int:
+        added = len(_needed_shortcuts(out_edges, in_edges, v, max_settled))
+        removed = len(out_edges[v]) + len(in_edges[v])
+        return added - removed + contracted_nbrs[v]
+
+    pq = [(priority(v), v) for v in range(n)]
+    heapq.heapify(pq)
+
+    rank = [-1] * n
+    up_fwd: UpGraph = [[] for _ in range(n)]
+    up_bwd: UpGraph = [[] for _ in range(n)]
+    middle: Dict[Tuple[int, int], int] = {}
+    shortcuts = 0
+    order = 0
+
+    while pq:
+        _, v = heapq.heappop(pq)
+        if rank[v] >= 0:
+            continue
+        # lazy update: re-evaluate, and put back if something else is now cheaper
+        p = priority(v)
+        if pq and p > pq[0][0]:
+            heapq.heappush(pq, (p, v))
+            continue
+
+        rank[v] = order
+        order += 1
+        new_edges = _needed_shortcuts(out_edges, in_edges, v, max_settled)
+
+        # remaining neighbours all rank higher than v: these become its upward edges
+        up_fwd[v] = list(out_edges[v].items())
+        up_bwd[v] = list(in_edges[v].items())
+        for w in out_edges[v]:
+            del in_edges[w][v]
+            contracted_nbrs[w] += 1
+        for u in in_edges[v]:
+            del out_edges[u][v]
+            contracted_nbrs[u] += 1
+        out_edges[v] = {}
+        in_edges[v] = {}
+
+        for u, w, c in new_edges:
+            if c < out_edges[u].get(w, INF):
+                out_edges[u][w] = c
+                in_edges[w][u] = c
+                middle[(u, w)] = v
+                shortcuts += 1
+
+    return ContractionHierarchy(g, rank, up_fwd, up_bwd, middle, shortcuts)
+
+
+# Benchmark: CH query vs astar on every OD pair
+
+def benchmark(ctx: NetworkContext, title: str, tests: List[Tuple[Station, Station]],
+              save_path: Optional[str] = None) -> None:
+    t0 = perf_counter()
+    ch = build_contraction_hierarchy(ctx)
+    build_ms = (perf_counter() - t0) * 1000
+    if save_path:
+        ch.save(save_path)
+        ch = ContractionHierarchy.load(save_path)
+    print(f"\n=== {title} === nodes={ch.g.n_nodes} edges={len(ch.g.targets)}"
+          f" shortcuts={ch.shortcuts} build={build_ms:.1f} ms")
+
+    starts, goals = [SUPER_START], {SUPER_GOAL}
+    stations = sorted(ctx.state.lines)
+    ch_time = astar_time = 0.0
+    queries = 0
+    for s in stations:
+        for t in stations:
+            qg = mrp.attach_query(ctx, s, t)
+            t0 = perf_counter()
+            p, cost, _ = ch.query(s, t)
+            t1 = perf_counter()
+            _, acost, _ = mrp.astar(ctx, qg, starts, goals, t, s)
+            t2 = perf_counter()
+            ch_time += t1 - t0
+            astar_time += t2 - t1
+            queries += 1
+            if p is None or cost != acost or mrp.path_cost(qg, p) != cost:
+                raise RuntimeError(f"CH disagrees with A* on {s} -> {t}: {cost} vs {acost}")
+
+    print(f"  {queries} OD pairs verified against A*: mean CH={ch_time / queries * 1000:.3f} ms"
+          f" | mean A*={astar_time / queries * 1000:.3f} ms")
+    for s, t in tests:
+        p, cost, settled = ch.query(s, t)
+        assert p is not None
+        print(f"  {s} -> {t}: settled={settled:3d} | transfers={mrp.transfer_count(p):2d}"
+              f" | cost={cost:7.1f} | {mrp.collapse_station_path(p)}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Build contraction hierarchies and benchmark queries.")
+    ap.add_argument("--save-dir", help="write <mode>.ch here and benchmark the reloaded copy")
+    args = ap.parse_args()
+
+    def target(mode: str) -> Optional[str]:
+        return f"{args.save_dir}/{mode}.ch" if args.save_dir else None
+
+    benchmark(mrp.build_network_context(False), "TODAY MODE", mrp.TESTS_TODAY, target("today"))
+    benchmark(mrp.build_network_context(True), "FUTURE MODE", mrp.TESTS_FUTURE, target("future"))
+
+if __name__ == "__main__":
+    main()
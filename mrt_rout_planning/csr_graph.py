@@ -0,0 +1,478 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Sequence, Tuple, Optional
+from array import array
+from collections import OrderedDict, deque
+from time import perf_counter
+import heapq
+import math
+import sys
+import threading
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Line, Node, NetworkContext, StateGraph, SUPER_START, SUPER_GOAL
+
+# Integer-indexed CSR backend for the (station, line) state graph.
+#
+# Stations and lines are interned to ints; a state node is an int in [0, n_nodes).
+# Adjacency lives in three flat arrays:
+#   targets[offsets[u]:offsets[u+1]]  -> neighbour node ids of u
+#   costs[offsets[u]:offsets[u+1]]    -> matching edge costs (minutes)
+# __START__/__GOAL__ stay virtual: a search seeds every line node of the start
+# station with the boarding cost and stops at the first settled node of the goal
+# station (alighting cost added on exit). Paths are handed back as Node tuples,
+# so collapse_station_path / transfer_count / path_cost work unchanged.
+#
+# The informed searches read two derived caches on the graph: adjacency() (per-node
+# (target, cost) tuples built by compile_csr, so expanding a node allocates nothing;
+# snapshot-loaded graphs skip them and slice the arrays) and h_cache (per goal,
+# a straight-line heuristic buffer filled in only for the stations a query touches and
+# reused by later queries to that goal). Both are dropped when the graph is pickled.
+
+INF = float("inf")
+H_CACHE_ENTRIES = 1 << 20          # heuristic floats kept across goals (8 MiB)
+
+
+class CSRGraph:
+    __slots__ = (
+        "stations", "lines", "station_id", "line_id",
+        "node_station", "node_line", "_node_id",
+        "offsets", "targets", "costs",
+        "station_offsets", "station_nodes",
+        "crowd", "xs", "ys", "has_xy", "scale",
+        "h_cache", "_h_lock", "_adj",
+    )
+    _DERIVED = ("h_cache", "_h_lock", "_adj")  # search caches: rebuilt on demand, never pickled
+
+    def __init__(self) -> None:
+        self.stations: List[Station] = []
+        self.lines: List[Line] = []
+        self.station_id: Dict[Station, int] = {}
+        self.line_id: Dict[Line, int] = {}
+        self.node_station = array("i")
+        self.node_line = array("i")
+        self._node_id: Optional[Dict[Node, int]] = {}     # None: derive on first use
+        self.offsets = array("i")
+        self.targets = array("i")
+        self.costs = array("d")
+        self.station_offsets = array("i")     # per station: slice into station_nodes
+        self.station_nodes = array("i")       # line nodes of each station, grouped
+        self.crowd = array("d")               # boarding / alighting cost per station
+        self.xs = array("d")
+        self.ys = array("d")
+        self.has_xy = array("b")
+        self.scale = 0.0                      # heuristic minutes per km
+        # goal station -> (partly filled heuristic buffer, filler), LRU of H_CACHE_ENTRIES floats
+        self.h_cache: "OrderedDict[int, Tuple[array, Callable[[int], float]]]" = OrderedDict()
+        self._h_lock = threading.Lock()       # guards h_cache's LRU bookkeeping across threads
+        self._adj: Optional[Tuple[List[Tuple[Tuple[int, float], ...]], List[int]]] = None
+
+    def __getstate__(self) -> Dict[str, object]:
+        return {k: getattr(self, k) for k in self.__slots__ if k not in self._DERIVED}
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        self.__init__()     # type: ignore[misc]
+        for k, v in state.items():
+            setattr(self, k, v)
+
+    @property
+    def node_id(self) -> Dict[Node, int]:
+        """(station, line) -> node id; snapshot-loaded graphs build it on first access."""
+        if self._node_id is None:
+            stations, lines = self.stations, self.lines
+            self._node_id = {(stations[s], lines[l]): u
+                             for u, (s, l) in enumerate(zip(self.node_station, self.node_line))}
+        return self._node_id
+
+    @node_id.setter
+    def node_id(self, value: Optional[Dict[Node, int]]) -> None:
+        self._node_id = value
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_station)
+
+    def nodes_of(self, sid: int) -> array:
+        return self.station_nodes[self.station_offsets[sid]:self.station_offsets[sid + 1]]
+
+    def node(self, u: int) -> Node:
+        return (self.stations[self.node_station[u]], self.lines[self.node_line[u]])
+
+    def adjacency(self) -> Tuple[Optional[List[Tuple[Tuple[int, float], ...]]], List[int]]:
+        """
+        Per-node ((target, cost), ...) tuples and node_station as plain lists. The hot
+        loops iterate the tuples instead of slicing targets / costs, which allocates two
+        arrays per expansion. Only compile_csr builds them (build_adjacency): for
+        snapshot-loaded and unpickled graphs the tuples are None and the searches slice
+        the CSR arrays, rather than spending O(edges) on the first query.
+        """
+        if self._adj is None:
+            self._adj = (None, self.node_station.tolist())
+        return self._adj
+
+    def build_adjacency(self) -> None:
+        """Build the per-node (target, cost) tuples read by adjacency()."""
+        offsets, targets, costs = self.offsets.tolist(), self.targets.tolist(), self.costs.tolist()
+        edges = [tuple(zip(targets[offsets[u]:offsets[u + 1]], costs[offsets[u]:offsets[u + 1]]))
+                 for u in range(self.n_nodes)]
+        self._adj = (edges, self.node_station.tolist())
+
+    def nbytes(self) -> int:
+        arrays = (self.node_station, self.node_line, self.offsets, self.targets, self.costs,
+                  self.station_offsets, self.station_nodes, self.crowd, self.xs, self.ys, self.has_xy)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+
+def compile_csr(ctx: NetworkContext) -> CSRGraph:
+    """Freeze a mode's state graph, crowding, coordinates and heuristic scale into CSR arrays."""
+    shared = ctx.state
+    coords_xy = ctx.coords_xy
+
+    g = CSRGraph()
+    g.scale = float(ctx.heuristic_scale)
+
+    for st in sorted(shared.lines):
+        g.station_id[st] = len(g.stations)
+        g.stations.append(st)
+        for ln in sorted(shared.lines[st]):
+            if ln not in g.line_id:
+                g.line_id[ln] = -1
+    for ln in sorted(g.line_id):
+        g.line_id[ln] = len(g.lines)
+        g.lines.append(ln)
+
+    # nodes grouped by station so station_nodes is a plain range per station
+    g.station_offsets.append(0)
+    for st in g.stations:
+        sid = g.station_id[st]
+        for ln in sorted(shared.lines[st]):
+            u = len(g.node_station)
+            g.node_id[(st, ln)] = u
+            g.node_station.append(sid)
+            g.node_line.append(g.line_id[ln])
+            g.station_nodes.append(u)
+        g.station_offsets.append(len(g.station_nodes))
+
+    g.offsets.append(0)
+    for u in range(g.n_nodes):
+        for v, c in shared.adj.get(g.node(u), []):
+            g.targets.append(g.node_id[v])
+            g.costs.append(c)
+        g.offsets.append(len(g.targets))
+
+    for st in g.stations:
+        g.crowd.append(float(mrp.crowd_value(ctx, st)))
+        if st in coords_xy:
+            x, y = coords_xy[st]
+            g.xs.append(x)
+            g.ys.append(y)
+            g.has_xy.append(1)
+        else:
+            g.xs.append(0.0)
+            g.ys.append(0.0)
+            g.has_xy.append(0)
+
+    g.build_adjacency()
+    return g
+
+
+# Helpers
+
+def _endpoints(g: CSRGraph, start: Station, goal: Station) -> Tuple[Optional[int], Optional[int]]:
+    return g.station_id.get(start), g.station_id.get(goal)
+
+def _node_path(g: CSRGraph, parent: Sequence[int], u: int) -> List[Node]:
+    ids: List[int] = []
+    while u >= 0:
+        ids.append(u)
+        u = parent[u]
+    ids.reverse()
+    return [SUPER_START] + [g.node(i) for i in ids] + [SUPER_GOAL]
+
+def station_heuristic(g: CSRGraph, goal_sid: int) -> Tuple[array, Callable[[int], float]]:
+    """
+    Straight-line lower bound (minutes) to goal_sid, filled in lazily: a -1 buffer over
+    stations and h_of(sid), which computes and stores one entry. A query only pays for
+    the stations it touches, and the buffer is kept per goal (g.h_cache), so later
+    queries to the same goal reuse what earlier ones filled in. The LRU bookkeeping is
+    locked; concurrent h_of calls only ever store the same value, so filling is not.
+    """
+    with g._h_lock:
+        cached = g.h_cache.get(goal_sid)
+        if cached is not None:
+            g.h_cache.move_to_end(goal_sid)
+            return cached
+
+    hs = array("d", [-1.0]) * len(g.stations)
+    xs, ys, has_xy = g.xs, g.ys, g.has_xy
+    goal_ok = has_xy[goal_sid]
+    gx, gy = xs[goal_sid], ys[goal_sid]
+    scale = g.scale
+    hypot = math.hypot
+
+    def h_of(sid: int) -> float:
+        h = scale * hypot(xs[sid] - gx, ys[sid] - gy) if goal_ok and has_xy[sid] else 0.0
+        hs[sid] = h
+        return h
+
+    with g._h_lock:
+        # another thread may have built this goal meanwhile: keep the first buffer
+        cached = g.h_cache.setdefault(goal_sid, (hs, h_of))
+        g.h_cache.move_to_end(goal_sid)
+        if len(g.h_cache) * len(hs) > H_CACHE_ENTRIES and len(g.h_cache) > 1:
+            g.h_cache.popitem(last=False)
+    return cached
+
+
+# Search Algorithms (CSR variants)
+# Same contracts as bfs/dfs/gbfs/astar, but keyed by station names.
+# expanded counts settled (station, line) nodes; the virtual super nodes are not counted.
+
+def csr_bfs(g: CSRGraph, start: Station, goal: Station) -> Tuple[Optional[List[Node]], int]:
+    s, t = _endpoints(g, start, goal)
+    if s is None or t is None:
+        return None, 0
+
+    parent = array("i", [-2]) * g.n_nodes       # -2 = undiscovered, -1 = root
+    q = deque()
+    for u in g.nodes_of(s):
+        parent[u] = -1
+        q.append(u)
+
+    offsets, targets, node_station = g.offsets, g.targets, g.node_station
+    expanded = 0
+    while q:
+        u = q.popleft()
+        expanded += 1
+        if node_station[u] == t:
+            return _node_path(g, parent, u), expanded
+
+        for v in targets[offsets[u]:offsets[u + 1]]:
+            if parent[v] == -2:
+                parent[v] = u
+                q.append(v)
+
+    return None, expanded
+
+def csr_dfs(g: CSRGraph, start: Station, goal: Station) -> Tuple[Optional[List[Node]], int]:
+    s, t = _endpoints(g, start, goal)
+    if s is None or t is None:
+        return None, 0
+
+    parent = array("i", [-2]) * g.n_nodes
+    stack: List[int] = []
+    for u in reversed(g.nodes_of(s)):
+        parent[u] = -1
+        stack.append(u)
+
+    offsets, targets, node_station = g.offsets, g.targets, g.node_station
+    expanded = 0
+    while stack:
+        u = stack.pop()
+        expanded += 1
+        if node_station[u] == t:
+            return _node_path(g, parent, u), expanded
+
+        for v in reversed(targets[offsets[u]:offsets[u + 1]]):
+            if parent[v] == -2:
+                parent[v] = u
+                stack.append(v)
+
+    return None, expanded
+
+def csr_gbfs(g: CSRGraph, start: Station, goal: Station) -> Tuple[Optional[List[Node]], int]:
+    s, t = _endpoints(g, start, goal)
+    if s is None or t is None:
+        return None, 0
+
+    hs, h_of = station_heuristic(g, t)
+    edges, node_station = g.adjacency()
+    offsets, targets, costs = g.offsets, g.targets, g.costs
+    n = g.n_nodes
+    parent = [-2] * n
+    visited = bytearray(n)
+
+    h_start = h_of(s)
+    pq: List[Tuple[float, int]] = []
+    for u in g.nodes_of(s):
+        parent[u] = -1
+        pq.append((h_start, u))
+    heapq.heapify(pq)
+
+    expanded = 0
+    while pq:
+        _, u = heapq.heappop(pq)
+        if visited[u]:
+            continue
+        visited[u] = 1
+        expanded += 1
+        if node_station[u] == t:
+            return _node_path(g, parent, u), expanded
+
+        for v, _ in (edges[u] if edges is not None
+                     else zip(targets[offsets[u]:offsets[u + 1]], costs[offsets[u]:offsets[u + 1]])):
+            if visited[v]:
+                continue
+            if parent[v] == -2:
+                parent[v] = u
+            sv = node_station[v]
+            h = hs[sv]
+            if h < 0.0:
+                h = h_of(sv)
+            heapq.heappush(pq, (h, v))
+
+    return None, expanded
+
+def csr_astar(g: CSRGraph, start: Station, goal: Station) -> Tuple[Optional[List[Node]], float, int]:
+    s, t = _endpoints(g, start, goal)
+    if s is None or t is None:
+        return None, INF, 0
+
+    hs, h_of = station_heuristic(g, t)
+    edges, node_station = g.adjacency()
+    offsets, targets, costs = g.offsets, g.targets, g.costs
+    n = g.n_nodes
+    best_g = [INF] * n
+    parent = [-2] * n
+
+    board = g.crowd[s]
+    h_start = h_of(s)
+    pq: List[Tuple[float, float, int]] = []
+    for u in g.nodes_of(s):
+        best_g[u] = board
+        parent[u] = -1
+        heapq.heappush(pq, (board + h_start, board, u))
+
+    expanded = 0
+    while pq:
+        _f, gcur, u = heapq.heappop(pq)
+        if gcur != best_g[u]:
+            continue
+
+        expanded += 1
+        if node_station[u] == t:
+            # every goal line node pays the same alighting cost, so the first one settled wins
+            return _node_path(g, parent, u), gcur + g.crowd[t], expanded
+
+        for v, c in (edges[u] if edges is not None
+                     else zip(targets[offsets[u]:offsets[u + 1]], costs[offsets[u]:offsets[u + 1]])):
+            new_g = gcur + c
+            if new_g < best_g[v]:
+                best_g[v] = new_g
+                parent[v] = u
+                sv = node_station[v]
+                h = hs[sv]
+                if h < 0.0:
+                    h = h_of(sv)
+                heapq.heappush(pq, (new_g + h, new_g, v))
+
+    return None, INF, expanded
+
+
+def reverse_csr(g: CSRGraph) -> Tuple[array, array, array]:
+    """(offsets, targets, costs) of the transposed graph: an edge u -> v becomes v -> u."""
+    n = g.n_nodes
+    counts = [0] * (n + 1)
+    for v in g.targets:
+        counts[v + 1] += 1
+    for i in range(n):
+        counts[i + 1] += counts[i]
+
+    offsets = array("i", counts)
+    fill = counts[:-1]
+    targets = array("i", [0]) * len(g.targets)
+    costs = array("d", [0.0]) * len(g.costs)
+    for u in range(n):
+        lo, hi = g.offsets[u], g.offsets[u + 1]
+        for v, c in zip(g.targets[lo:hi], g.costs[lo:hi]):
+            i = fill[v]
+            targets[i] = u
+            costs[i] = c
+            fill[v] = i + 1
+    return offsets, targets, costs
+
+def csr_one_to_all(g: CSRGraph, start_sid: int) -> Tuple[array, array, array]:
+    """
+    Dijkstra from __START__ at start_sid to every node (boarding cost included, alighting not).
+    Returns (dist, parent, order): parent is -1 at the roots and -2 when unreachable;
+    order lists settled nodes by increasing dist.
+    """
+    offsets, targets, costs = g.offsets, g.targets, g.costs
+    n = g.n_nodes
+    dist = array("d", [INF]) * n
+    parent = array("i", [-2]) * n
+    order = array("i")
+
+    board = g.crowd[start_sid]
+    pq: List[Tuple[float, int]] = []
+    for u in g.nodes_of(start_sid):
+        dist[u] = board
+        parent[u] = -1
+        pq.append((board, u))
+    heapq.heapify(pq)
+
+    while pq:
+        d, u = heapq.heappop(pq)
+        if d != dist[u]:
+            continue
+        order.append(u)
+        lo, hi = offsets[u], offsets[u + 1]
+        for v, c in zip(targets[lo:hi], costs[lo:hi]):
+            nd = d + c
+            if nd < dist[v]:
+                dist[v] = nd
+                parent[v] = u
+                heapq.heappush(pq, (nd, v))
+
+    return dist, parent, order
+
+
+# Comparison runner: dict backend vs CSR backend on the same suites
+
+def _dict_bytes(shared: StateGraph) -> int:
+    total = sys.getsizeof(shared.adj)
+    for u, edges in shared.adj.items():
+        total += sys.getsizeof(u) + sys.getsizeof(edges)
+        for e in edges:
+            total += sys.getsizeof(e) + sys.getsizeof(e[0])
+    return total
+
+def _mean_ms(fn, *args, repeat: int = 200) -> float:
+    t0 = perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (perf_counter() - t0) * 1000 / repeat
+
+def compare_backends(ctx: NetworkContext, title: str, tests: List[Tuple[Station, Station]]) -> None:
+    shared = ctx.state
+    csr = compile_csr(ctx)
+    print(f"\n=== {title} ===")
+    print(f"  nodes={csr.n_nodes} edges={len(csr.targets)}"
+          f" | dict adjacency ~{_dict_bytes(shared) / 1024:.1f} KiB | CSR arrays {csr.nbytes() / 1024:.1f} KiB")
+
+    for s, t in tests:
+        qg = mrp.attach_query(ctx, s, t)
+        starts, goals = [SUPER_START], {SUPER_GOAL}
+        _, dcost, _ = mrp.astar(ctx, qg, starts, goals, t, s)
+        p, ccost, _ = csr_astar(csr, s, t)
+        if p is None or abs(dcost - ccost) > 1e-9 or abs(mrp.path_cost(qg, p) - ccost) > 1e-9:
+            raise RuntimeError(f"CSR A* disagrees with dict A* on {s} -> {t}: {dcost} vs {ccost}")
+
+        print(f"\n{s} -> {t}  (cost={ccost:.1f})")
+        pairs = (
+            ("BFS ", lambda: mrp.bfs(qg, starts, goals), lambda: csr_bfs(csr, s, t)),
+            ("DFS ", lambda: mrp.dfs(qg, starts, goals), lambda: csr_dfs(csr, s, t)),
+            ("GBFS", lambda: mrp.gbfs(ctx, qg, starts, goals, t, s), lambda: csr_gbfs(csr, s, t)),
+            ("A*  ", lambda: mrp.astar(ctx, qg, starts, goals, t, s), lambda: csr_astar(csr, s, t)),
+        )
+        for label, dict_fn, csr_fn in pairs:
+            d_ms = _mean_ms(dict_fn)
+            c_ms = _mean_ms(csr_fn)
+            print(f"  {label}: dict={d_ms:7.3f} ms | csr={c_ms:7.3f} ms | speedup={d_ms / c_ms:5.2f}x")
+
+
+def main() -> None:
+    compare_backends(mrp.build_network_context(False), "TODAY MODE", mrp.TESTS_TODAY)
+    compare_backends(mrp.build_network_context(True), "FUTURE MODE", mrp.TESTS_FUTURE)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+from __future__ import annotations
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+import argparse
+import csv
+import heapq
+import os
+import random
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Line
+from csr_graph import CSRGraph, compile_csr, csr_one_to_all
+
+# Disruption what-if sweep: close every station and every line segment in turn and
+# measure the impact on all OD costs.
+#
+# The baseline is one one-to-all tree per origin (csr_one_to_all). Walking each OD
+# path once gives an inverted index  element -> {origin: [destinations]}  of the OD
+# pairs whose baseline path uses a station (passing through or changing lines there)
+# or a segment (a ride edge a <-> b on one line). Closing an element can only change
+# those pairs, so a scenario runs one Dijkstra per affected origin on the graph with
+# the element blocked, and stops as soon as that origin's affected destinations are
+# settled; every other OD keeps its baseline cost. Pairs that start or end at a
+# closed station are not counted: they cannot be served by any route.
+#
+# Scenarios are fanned out over a ProcessPoolExecutor whose initializer receives the
+# compiled graph and the baseline once per worker (as in batch_routing); tasks carry
+# only the element. Results are ranked into a criticality table per element kind:
+# most disconnected OD pairs first, then the largest total added cost.
+
+MODES = ("today", "future")
+INF = float("inf")
+
+Segment = Tuple[Station, Station, Line]        # (a, b, line) with a < b
+Element = Tuple[str, object]                   # ("station", Station) | ("segment", Segment)
+
+
+class Baseline:
+    """Baseline OD costs plus which OD pairs each station / segment carries."""
+
+    def __init__(self, g: CSRGraph) -> None:
+        n_st = len(g.stations)
+        self.cost: List[List[float]] = []
+        self.by_station: Dict[int, Dict[int, List[int]]] = {}
+        self.by_segment: Dict[Tuple[int, int, int], Dict[int, List[int]]] = {}
+
+        node_station, node_line = g.node_station, g.node_line
+        for s in range(n_st):
+            dist, parent, order = csr_one_to_all(g, s)
+            exit_node = [-1] * n_st
+            for u in order:                      # first settled line node = cheapest
+                t = node_station[u]
+                if exit_node[t] < 0:
+                    exit_node[t] = u
+            self.cost.append([dist[u] + g.crowd[t] if u >= 0 else INF for t, u in enumerate(exit_node)])
+
+            for t, u in enumerate(exit_node):
+                if u < 0 or t == s:
+                    continue
+                stations: Set[int] = set()
+                while u >= 0:
+                    p = parent[u]
+                    su = node_station[u]
+                    stations.add(su)
+                    if p >= 0 and node_station[p] != su:
+                        a, b = sorted((node_station[p], su))
+                        self.by_segment.setdefault((a, b, node_line[u]), {}).setdefault(s, []).append(t)
+                    u = p
+                for x in stations - {s, t}:
+                    self.by_station.setdefault(x, {}).setdefault(s, []).append(t)
+
+    def affected(self, g: CSRGraph, element: Element) -> Dict[int, List[int]]:
+        kind, key = element
+        if kind == "station":
+            return self.by_station.get(g.station_id[key], {})
+        a, b, line = key
+        ia, ib = sorted((g.station_id[a], g.station_id[b]))
+        return self.by_segment.get((ia, ib, g.line_id[line]), {})
+
+
+def segments(g: CSRGraph) -> List[Segment]:
+    """Every ride segment of the state graph, once per direction-free (a, b, line)."""
+    out: Set[Segment] = set()
+    for u in range(g.n_nodes):
+        for v in g.targets[g.offsets[u]:g.offsets[u + 1]]:
+            if g.node_station[u] != g.node_station[v]:
+                a, b = sorted((g.stations[g.node_station[u]], g.stations[g.node_station[v]]))
+                out.add((a, b, g.lines[g.node_line[u]]))
+    return sorted(out)
+
+def scenarios(g: CSRGraph) -> List[Element]:
+    return [("station", st) for st in g.stations] + [("segment", seg) for seg in segments(g)]
+
+
+def blocked_costs(g: CSRGraph, s: int, element: Element, wanted: Optional[Set[int]] = None) -> Dict[int, float]:
+    """
+    Station costs from origin s with element closed (Dijkstra from s's line nodes).
+    Stops once every station in wanted is settled; wanted=None settles everything.
+    """
+    kind, key = element
+    dead, cut_a, cut_b = -1, -1, -1
+    if kind == "station":
+        dead = g.station_id[key]
+    else:
+        a, b, line = key
+        cut_a, cut_b = g.node_id[(a, line)], g.node_id[(b, line)]
+
+    offsets, targets, costs, node_station, crowd = g.offsets, g.targets, g.costs, g.node_station, g.crowd
+    dist = array("d", [INF]) * g.n_nodes
+    pq: List[Tuple[float, int]] = []
+    for u in g.nodes_of(s):
+        dist[u] = crowd[s]
+        pq.append((crowd[s], u))
+    heapq.heapify(pq)
+
+    remaining = set(range(len(g.stations))) if wanted is None else set(wanted)
+    out: Dict[int, float] = {}
+    while pq and remaining:
+        d, u = heapq.heappop(pq)
+        if d != dist[u]:
+            continue
+        t = node_station[u]
+        if t in remaining:
+            remaining.discard(t)
+            out[t] = d + crowd[t]
+        lo, hi = offsets[u], offsets[u + 1]
+        for v, c in zip(targets[lo:hi], costs[lo:hi]):
+            if node_station[v] == dead or (u == cut_a and v == cut_b) or (u == cut_b and v == cut_a):
+                continue
+            nd = d + c
+            if nd < dist[v]:
+                dist[v] = nd
+                heapq.heappush(pq, (nd, v))
+    for t in remaining:
+        out[t] = INF
+    return out
+
+
+class Impact(NamedTuple):
+    mode: str
+    kind: str
+    element: str
+    affected: int               # OD pairs whose baseline path used the element
+    disconnected: int           # of those, no longer reachable at all
+    total_delta: float          # summed extra minutes over the still-reachable ones
+    max_delta: float
+    worst: str                  # OD pair with max_delta
+    searches: int               # origins re-searched
+
+def element_name(element: Element) -> str:
+    kind, key = element
+    return key if kind == "station" else f"{key[0]} - {key[1]} ({key[2]})"   # type: ignore[index]
+
+def evaluate(g: CSRGraph, base: Baseline, mode: str, element: Element) -> Impact:
+    affected = base.affected(g, element)
+    n = disconnected = 0
+    total = worst_delta = 0.0
+    worst = ""
+    for s, dests in affected.items():
+        new = blocked_costs(g, s, element, set(dests))
+        for t in dests:
+            n += 1
+            c = new[t]
+            if c == INF:
+                disconnected += 1
+                continue
+            delta = c - base.cost[s][t]
+            total += delta
+            if delta > worst_delta:
+                worst_delta = delta
+                worst = f"{g.stations[s]} -> {g.stations[t]}"
+    return Impact(mode, element[0], element_name(element), n, disconnected, total, worst_delta, worst, len(affected))
+
+
+_WORKER: Dict[str, Tuple[CSRGraph, Baseline]] = {}
+
+def _init_worker(state: Dict[str, Tuple[CSRGraph, Baseline]]) -> None:
+    global _WORKER
+    _WORKER = state
+
+def _evaluate_in_worker(task: Tuple[str, Element]) -> Impact:
+    mode, element = task
+    g, base = _WORKER[mode]
+    return evaluate(g, base, mode, element)
+
+
+def sweep(state: Dict[str, Tuple[CSRGraph, Baseline]], workers: Optional[int] = None,
+          chunksize: int = 8) -> List[Impact]:
+    """Every station and segment scenario of every mode in state; results in task order."""
+    tasks = [(mode, e) for mode, (g, _) in state.items() for e in scenarios(g)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return [evaluate(state[m][0], state[m][1], m, e) for m, e in tasks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(state,)) as pool:
+        return list(pool.map(_evaluate_in_worker, tasks, chunksize=chunksize))
+
+def rank(impacts: List[Impact]) -> List[Impact]:
+    return sorted(impacts, key=lambda r: (-r.disconnected, -r.total_delta, r.element))
+
+
+# Check: incremental scenario results vs a full blocked all-pairs recompute
+
+def verify(g: CSRGraph, base: Baseline, elements: List[Element]) -> None:
+    n_st = len(g.stations)
+    for element in elements:
+        aff = base.affected(g, element)
+        dead = g.station_id[element[1]] if element[0] == "station" else -1
+        for s in range(n_st):
+            if s == dead:
+                continue
+            full = blocked_costs(g, s, element)
+            touched = set(aff.get(s, ()))
+            early = blocked_costs(g, s, element, touched) if touched else {}
+            for t in range(n_st):
+                if t == dead or t == s:
+                    continue
+                expect = early[t] if t in touched else base.cost[s][t]
+                if full[t] != expect:
+                    raise RuntimeError(f"{element_name(element)}: {g.stations[s]} -> {g.stations[t]}"
+                                       f" costs {full[t]} on a full recompute, sweep has {expect}")
+
+
+def write_csv(impacts: List[Impact], path: str) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(Impact._fields)
+        for r in impacts:
+            w.writerow(r)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Close every station / segment in turn and rank criticality.")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--verify", type=int, default=20, help="scenarios per mode checked against a full recompute")
+    ap.add_argument("--csv", help="write the full ranked table")
+    args = ap.parse_args()
+
+    t0 = perf_counter()
+    state: Dict[str, Tuple[CSRGraph, Baseline]] = {}
+    for mode in MODES:
+        g = compile_csr(mrp.build_network_context(mode == "future"))
+        state[mode] = (g, Baseline(g))
+    t1 = perf_counter()
+
+    rnd = random.Random(0)
+    for mode, (g, base) in state.items():
+        all_sc = scenarios(g)
+        verify(g, base, rnd.sample(all_sc, min(args.verify, len(all_sc))))
+    t2 = perf_counter()
+
+    serial = sweep(state, workers=1)
+    t3 = perf_counter()
+    impacts = sweep(state, workers=args.workers)
+    t4 = perf_counter()
+    if impacts != serial:
+        raise RuntimeError("parallel sweep differs from the serial run")
+
+    pairs = {m: len(g.stations) * (len(g.stations) - 1) for m, (g, _) in state.items()}
+    recomputed = sum(r.affected for r in impacts)
+    print(f"{len(impacts)} scenarios | baseline={t1 - t0:.2f} s | verified in {t2 - t1:.2f} s"
+          f" | sweep serial={t3 - t2:.2f} s, pool={t4 - t3:.2f} s (workers={args.workers or os.cpu_count()})"
+          f" | OD pairs recomputed: {recomputed} of {sum(pairs[r.mode] for r in impacts)}")
+
+    ranked = rank(impacts)
+    for mode in MODES:
+        for kind in ("station", "segment"):
+            rows = [r for r in ranked if r.mode == mode and r.kind == kind][:args.top]
+            print(f"\n=== {mode.upper()} MODE: most critical {kind}s ===")
+            for i, r in enumerate(rows, 1):
+                print(f"  {i:2d}. {r.element:<40} affected={r.affected:5d} | disconnected={r.disconnected:5d}"
+                      f" | +{r.total_delta:8.1f} min total | worst +{r.max_delta:5.1f} ({r.worst})")
+    if args.csv:
+        write_csv(ranked, args.csv)
+        print(f"\nwrote {args.csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from time import perf_counter
+import heapq
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Line, Node, NetworkContext, SUPER_START, SUPER_GOAL
+
+# Live re-routing on station closures, segment closures and crowding changes.
+#
+# DynamicRouter keeps its own mutable copy of the mode's state graph (the
+# NetworkContext stays immutable) plus one shortest-path tree per tracked origin.
+# A change is turned into edge-weight deltas (removal = weight inf) and each tree
+# is repaired in place:
+#   - tree edges that got more expensive: the subtree below them is invalidated and
+#     re-seeded from its still-valid in-neighbours;
+#   - edges that got cheaper: their head is re-seeded if it now improves;
+# then one Dijkstra pass settles only the nodes that actually move. Tree distances
+# exclude the boarding crowd cost, so a crowding change at the origin or destination
+# only re-prices that OD pair instead of touching the tree.
+# Only tracked OD pairs whose origin tree moved at the destination (or whose
+# endpoints had their crowding changed) are re-evaluated and reported.
+
+INF = float("inf")
+
+ODPair = Tuple[Station, Station]
+Changes = Dict[ODPair, Tuple[float, float]]     # (origin, dest) -> (old_cost, new_cost)
+
+
+class SPTree:
+    """Shortest-path tree from every line node of one origin station (distances exclude boarding)."""
+    __slots__ = ("origin", "dist", "parent", "children")
+
+    def __init__(self, origin: Station) -> None:
+        self.origin = origin
+        self.dist: Dict[Node, float] = {}
+        self.parent: Dict[Node, Optional[Node]] = {}
+        self.children: Dict[Node, Set[Node]] = {}
+
+    def set_parent(self, v: Node, p: Optional[Node]) -> None:
+        old = self.parent.get(v)
+        if old is not None:
+            self.children[old].discard(v)
+        self.parent[v] = p
+        if p is not None:
+            self.children.setdefault(p, set()).add(v)
+
+
+class DynamicRouter:
+    def __init__(self, ctx: NetworkContext) -> None:
+        self.ctx = ctx
+        self.lines = ctx.state.lines
+        self.crowding: Dict[Station, int] = dict(ctx.crowding)
+        self.closed_stations: Set[Station] = set()
+        self.closed_segments: Set[Tuple[Station, Station, Line]] = set()
+
+        self.out: Dict[Node, Dict[Node, float]] = {}
+        self.inn: Dict[Node, Dict[Node, float]] = {}
+        for u, edges in ctx.state.adj.items():
+            for v, c in edges:
+                self.out.setdefault(u, {})[v] = c
+                self.inn.setdefault(v, {})[u] = c
+
+        self.trees: Dict[Station, SPTree] = {}
+        self.tracked: Dict[ODPair, float] = {}
+        self.last_settled = 0           # nodes re-settled by the most recent repair
+
+    # Cost model (live)
+
+    def _crowd(self, st: Station) -> float:
+        return float(self.crowding.get(st, 0))
+
+    def _edge_cost(self, u: Node, v: Node) -> float:
+        """Current weight of a baseline state edge under the live closures / crowding."""
+        (su, lu), (sv, _) = u, v
+        if su in self.closed_stations or sv in self.closed_stations:
+            return INF
+        if su == sv:
+            return float(mrp.transfer_penalty(self.ctx, su)) + self._crowd(su)
+        a, b = (su, sv) if su <= sv else (sv, su)
+        if (a, b, lu) in self.closed_segments:
+            return INF
+        # ride edge: baseline minutes from the immutable context graph
+        for w, c in self.ctx.state.adj[u]:
+            if w == v:
+                return c
+        return INF
+
+    def cost(self, origin: Station, dest: Station) -> float:
+        return self._od_cost(self._tree(origin), dest)
+
+    def route(self, origin: Station, dest: Station) -> Tuple[Optional[List[Node]], float]:
+        """(node_path with __START__/__GOAL__, cost) from the live tree."""
+        tree = self._tree(origin)
+        best = self._best_goal_node(tree, dest)
+        if best is None:
+            return None, INF
+        path: List[Node] = []
+        cur: Optional[Node] = best
+        while cur is not None:
+            path.append(cur)
+            cur = tree.parent[cur]
+        path.reverse()
+        return [SUPER_START] + path + [SUPER_GOAL], self._od_cost(tree, dest)
+
+    def _best_goal_node(self, tree: SPTree, dest: Station) -> Optional[Node]:
+        if dest in self.closed_stations:
+            return None
+        best: Optional[Node] = None
+        for ln in sorted(self.lines.get(dest, ())):
+            n = (dest, ln)
+            if tree.dist.get(n, INF) < (tree.dist[best] if best is not None else INF):
+                best = n
+        return best
+
+    def _od_cost(self, tree: SPTree, dest: Station) -> float:
+        if tree.origin in self.closed_stations:
+            return INF
+        best = self._best_goal_node(tree, dest)
+        if best is None:
+            return INF
+        return self._crowd(tree.origin) + tree.dist[best] + self._crowd(dest)
+
+    # Trees
+
+    def _tree(self, origin: Station) -> SPTree:
+        tree = self.trees.get(origin)
+        if tree is None:
+            tree = self._build_tree(origin)
+            self.trees[origin] = tree
+        return tree
+
+    def _build_tree(self, origin: Station) -> SPTree:
+        tree = SPTree(origin)
+        pq: List[Tuple[float, Node]] = []
+        if origin not in self.closed_stations:
+            for ln in sorted(self.lines.get(origin, ())):
+                n = (origin, ln)
+                tree.dist[n] = 0.0
+                tree.set_parent(n, None)
+                pq.append((0.0, n))
+        self._settle(tree, pq)
+        return tree
+
+    def _settle(self, tree: SPTree, pq: List[Tuple[float, Node]],
+                old_dist: Optional[Dict[Node, float]] = None) -> int:
+        """Dijkstra from the seeded heap; records the first-seen distance of every node it moves."""
+        heapq.heapify(pq)
+        dist = tree.dist
+        settled = 0
+        while pq:
+            d, u = heapq.heappop(pq)
+            if d != dist.get(u, INF):
+                continue
+            settled += 1
+            for v, c in self.out.get(u, {}).items():
+                nd = d + c
+                if nd < dist.get(v, INF):
+                    if old_dist is not None:
+                        old_dist.setdefault(v, dist.get(v, INF))
+                    dist[v] = nd
+                    tree.set_parent(v, u)
+                    heapq.heappush(pq, (nd, v))
+        return settled
+
+    def _repair(self, tree: SPTree, deltas: List[Tuple[Node, Node, float, float]]) -> Set[Node]:
+        """Repair one tree after the graph already holds the new weights; returns moved nodes."""
+        dist, parent = tree.dist, tree.parent
+        before: Dict[Node, float] = {}
+        pq: List[Tuple[float, Node]] = []
+
+        # 1) tree edges that got worse: invalidate the whole subtree below them
+        invalid: Set[Node] = set()
+        for u, v, old, new in deltas:
+            if new > old and parent.get(v) == u and v not in invalid:
+                stack = [v]
+                while stack:
+                    w = stack.pop()
+                    if w in invalid:
+                        continue
+                    invalid.add(w)
+                    stack.extend(tree.children.get(w, ()))
+        for w in invalid:
+            before[w] = dist.pop(w)
+            tree.set_parent(w, None)
+            del parent[w]
+        for w in invalid:
+            best, via = INF, None
+            for x, c in self.inn.get(w, {}).items():
+                if x in dist and dist[x] + c < best:
+                    best, via = dist[x] + c, x
+            if via is not None:
+                dist[w] = best
+                tree.set_parent(w, via)
+                pq.append((best, w))
+
+        # 2) edges that got cheaper: re-seed their head
+        for u, v, old, new in deltas:
+            if new < old and u in dist and dist[u] + new < dist.get(v, INF):
+                before.setdefault(v, dist.get(v, INF))
+                dist[v] = dist[u] + new
+                tree.set_parent(v, u)
+                pq.append((dist[v], v))
+
+        # 3) one Dijkstra pass over the nodes that can still move (unreached ones stay inf)
+        self.last_settled += self._settle(tree, pq, before)
+        return {n for n, d in before.items() if dist.get(n, INF) != d}
+
+    # Tracking
+
+    def track(self, pairs: Iterable[ODPair]) -> None:
+        for o, d in pairs:
+            self.tracked[(o, d)] = self.cost(o, d)
+
+    # Deltas
+
+    def _apply(self, edges: Iterable[Tuple[Node, Node]], repriced: Set[Station]) -> Changes:
+        deltas: List[Tuple[Node, Node, float, float]] = []
+        for u, v in edges:
+            old = self.out[u][v]
+            new = self._edge_cost(u, v)
+            if new != old:
+                self.out[u][v] = new
+                self.inn[v][u] = new
+                deltas.append((u, v, old, new))
+
+        self.last_settled = 0
+        moved: Dict[Station, Set[Station]] = {}
+        if deltas:
+            for origin, tree in self.trees.items():
+                moved[origin] = {st for st, _ in self._repair(tree, deltas)}
+
+        changes: Changes = {}
+        for (o, d), old_cost in self.tracked.items():
+            if d in moved.get(o, ()) or o in repriced or d in repriced:
+                new_cost = self.cost(o, d)
+                if new_cost != old_cost:
+                    self.tracked[(o, d)] = new_cost
+                    changes[(o, d)] = (old_cost, new_cost)
+        return changes
+
+    def _station_edges(self, st: Station) -> List[Tuple[Node, Node]]:
+        edges: List[Tuple[Node, Node]] = []
+        for ln in self.lines.get(st, ()):
+            n = (st, ln)
+            edges.extend((n, v) for v in self.out.get(n, {}))
+            edges.extend((u, n) for u in self.inn.get(n, {}))
+        return edges
+
+    def close_station(self, st: Station) -> Changes:
+        self.closed_stations.add(st)
+        return self._apply(self._station_edges(st), {st})
+
+    def reopen_station(self, st: Station) -> Changes:
+        self.closed_stations.discard(st)
+        return self._apply(self._station_edges(st), {st})
+
+    def _segment_edges(self, a: Station, b: Station, line: Line) -> List[Tuple[Node, Node]]:
+        u, v = (a, line), (b, line)
+        if v not in self.out.get(u, {}):
+            raise ValueError(f"No {line} segment between {a} and {b}")
+        return [(u, v), (v, u)]
+
+    def close_segment(self, a: Station, b: Station, line: Line) -> Changes:
+        edges = self._segment_edges(a, b, line)
+        self.closed_segments.add((min(a, b), max(a, b), line))
+        return self._apply(edges, set())
+
+    def reopen_segment(self, a: Station, b: Station, line: Line) -> Changes:
+        edges = self._segment_edges(a, b, line)
+        self.closed_segments.discard((min(a, b), max(a, b), line))
+        return self._apply(edges, set())
+
+    def set_crowding(self, st: Station, value: int) -> Changes:
+        """Transfer edges at st are re-weighted; boarding/alighting at st re-prices its OD pairs."""
+        self.crowding[st] = value
+        edges = [(u, v) for u, v in self._station_edges(st) if u[0] == v[0]]
+        return self._apply(edges, {st})
+
+
+# Demo: live changes on the Today network, verified against a from-scratch rebuild
+
+def _from_scratch(router: DynamicRouter) -> Dict[ODPair, float]:
+    fresh = DynamicRouter(router.ctx)
+    fresh.crowding = dict(router.crowding)
+    fresh.closed_stations = set(router.closed_stations)
+    fresh.closed_segments = set(router.closed_segments)
+    for u in fresh.out:
+        for v in fresh.out[u]:
+            c = fresh._edge_cost(u, v)
+            fresh.out[u][v] = c
+            fresh.inn[v][u] = c
+    return {od: fresh.cost(*od) for od in router.tracked}
+
+def main() -> None:
+    ctx = mrp.build_network_context(False)
+    router = DynamicRouter(ctx)
+    stations = sorted(ctx.state.lines)
+    router.track((s, t) for s in stations for t in stations if s != t)
+    print(f"Tracking {len(router.tracked)} OD pairs over {len(router.trees)} origin trees")
+
+    scenario = [
+        ("close station Expo", lambda: router.close_station("Expo")),
+        ("close EWL Tanah Merah - Bedok", lambda: router.close_segment("Tanah Merah", "Bedok", "EWL")),
+        ("City Hall crowding -> 6", lambda: router.set_crowding("City Hall", 6)),
+        ("reopen station Expo", lambda: router.reopen_station("Expo")),
+        ("reopen EWL Tanah Merah - Bedok", lambda: router.reopen_segment("Tanah Merah", "Bedok", "EWL")),
+    ]
+    for label, change in scenario:
+        t0 = perf_counter()
+        changes = change()
+        dt = perf_counter() - t0
+        t0 = perf_counter()
+        expected = _from_scratch(router)
+        full = perf_counter() - t0
+        if expected != router.tracked:
+            bad = [od for od in expected if expected[od] != router.tracked[od]]
+            raise RuntimeError(f"{label}: incremental result differs from rebuild on {bad[:5]}")
+        print(f"\n{label}: {len(changes)} OD pairs changed | re-settled={router.last_settled} nodes"
+              f" | incremental={dt * 1000:.2f} ms | full rebuild={full * 1000:.2f} ms")
+        for (o, d), (old, new) in sorted(changes.items())[:3]:
+            print(f"  {o} -> {d}: {old:.1f} -> {new:.1f}")
+
+if __name__ == "__main__":
+    main()
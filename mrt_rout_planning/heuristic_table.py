@@ -0,0 +1,152 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple
+from collections import OrderedDict
+from time import perf_counter
+import argparse
+
+import numpy as np
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Node, Heuristic, NetworkContext, SUPER_START, SUPER_GOAL
+
+# Per-goal straight-line heuristic tables.
+#
+# h_node -> h_station does two coordinate lookups and a math.hypot on every heap push,
+# and repeats the same station once per line node. For a goal station the whole
+# heuristic is one vector:
+#   table[i] = heuristic_scale * |xy[i] - xy[goal]|     (0 where either side has no coords)
+# computed in a single NumPy pass over a StationIndex (station id -> projected xy).
+# HeuristicCache keeps the most recently used tables in an LRU keyed by (mode, goal),
+# so repeat queries to popular destinations skip heuristic computation entirely; the
+# per-query closure is a single dict lookup per call.
+
+
+class StationIndex:
+    """Station ids + projected coordinates of one context (NaN where a station has none)."""
+
+    def __init__(self, ctx: NetworkContext) -> None:
+        self.ctx = ctx
+        self.stations: List[Station] = sorted(ctx.state.lines)
+        self.station_id: Dict[Station, int] = {st: i for i, st in enumerate(self.stations)}
+        xy = np.full((len(self.stations), 2), np.nan)
+        for i, st in enumerate(self.stations):
+            if st in ctx.coords_xy:
+                xy[i] = ctx.coords_xy[st]
+        self.xy = xy
+
+    def goal_table(self, goal: Station) -> np.ndarray:
+        """Straight-line lower bound (minutes) from every station id to goal."""
+        t = self.station_id.get(goal)
+        if t is None or np.isnan(self.xy[t, 0]):
+            return np.zeros(len(self.stations))
+        d = self.xy - self.xy[t]
+        h = self.ctx.heuristic_scale * np.hypot(d[:, 0], d[:, 1])
+        h[np.isnan(h)] = 0.0
+        return h
+
+
+class GoalTable:
+    __slots__ = ("goal", "values", "by_station")
+
+    def __init__(self, goal: Station, values: np.ndarray, stations: List[Station]) -> None:
+        self.goal = goal
+        self.values = values                   # indexed by StationIndex id
+        by_station = dict(zip(stations, values.tolist()))
+        by_station[SUPER_GOAL[0]] = 0.0
+        self.by_station = by_station           # plain floats for the per-node closure
+
+
+class HeuristicCache:
+    """LRU of GoalTables keyed by (mode, goal); one StationIndex per mode."""
+
+    def __init__(self, capacity: int = 64) -> None:
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._indexes: Dict[str, StationIndex] = {}
+        self._tables: "OrderedDict[Tuple[str, Station], GoalTable]" = OrderedDict()
+
+    def index(self, ctx: NetworkContext) -> StationIndex:
+        idx = self._indexes.get(ctx.mode)
+        if idx is None or idx.ctx is not ctx:
+            # a different context under the same mode name: its tables are not ours
+            idx = self._indexes[ctx.mode] = StationIndex(ctx)
+            for key in [k for k in self._tables if k[0] == ctx.mode]:
+                del self._tables[key]
+        return idx
+
+    def table(self, ctx: NetworkContext, goal: Station) -> GoalTable:
+        idx = self.index(ctx)
+        key = (ctx.mode, goal)
+        tab = self._tables.get(key)
+        if tab is not None:
+            self.hits += 1
+            self._tables.move_to_end(key)
+            return tab
+
+        self.misses += 1
+        tab = GoalTable(goal, idx.goal_table(goal), idx.stations)
+        self._tables[key] = tab
+        if len(self._tables) > self.capacity:
+            self._tables.popitem(last=False)
+        return tab
+
+    def heuristic(self, ctx: NetworkContext, start: Station, goal: Station) -> Heuristic:
+        """Drop-in `heuristic=` for astar/gbfs on attach_query(ctx, start, goal)."""
+        get = self.table(ctx, goal).by_station.get
+        h_start = get(start, 0.0)
+
+        def h(n: Node) -> float:
+            # every station and __GOAL__ are in the table; only __START__ falls through
+            return get(n[0], h_start)
+
+        return h
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+
+# Benchmark: h_node per push vs cached goal tables on every OD pair
+
+def compare(ctx: NetworkContext, title: str, cache: HeuristicCache, repeat: int) -> None:
+    print(f"\n=== {title} ===")
+    stations = sorted(ctx.state.lines)
+    pairs = [(s, t) for s in stations for t in stations if s != t]
+    queries = [(s, t, mrp.attach_query(ctx, s, t)) for s, t in pairs]
+    starts, goals = [SUPER_START], {SUPER_GOAL}
+
+    # same bound up to float rounding, so the optimal costs must agree exactly
+    for s, t, qg in queries:
+        _, c_ref, _ = mrp.astar(ctx, qg, starts, goals, t, s)
+        _, c_tab, _ = mrp.astar(ctx, qg, starts, goals, t, s, heuristic=cache.heuristic(ctx, s, t))
+        if abs(c_ref - c_tab) > 1e-9:
+            raise RuntimeError(f"table heuristic changed the optimal cost on {s} -> {t}: {c_ref} vs {c_tab}")
+
+    def run(use_table: bool) -> float:
+        t0 = perf_counter()
+        for _ in range(repeat):
+            for s, t, qg in queries:
+                h = cache.heuristic(ctx, s, t) if use_table else None
+                mrp.astar(ctx, qg, starts, goals, t, s, heuristic=h)
+        return (perf_counter() - t0) / (repeat * len(queries)) * 1e6
+
+    hits, misses = cache.hits, cache.misses
+    base_us = run(False)
+    table_us = run(True)
+    print(f"  {len(pairs)} OD pairs x{repeat}: A* h_node={base_us:7.1f} us/query"
+          f" | cached table={table_us:7.1f} us/query ({base_us / table_us:.2f}x)"
+          f" | cache hits={cache.hits - hits} misses={cache.misses - misses} size={len(cache)}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Per-goal NumPy heuristic tables with an LRU cache.")
+    ap.add_argument("--capacity", type=int, default=256, help="tables kept across both modes")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    cache = HeuristicCache(args.capacity)
+    compare(mrp.build_network_context(False), "TODAY MODE", cache, args.repeat)
+    compare(mrp.build_network_context(True), "FUTURE MODE", cache, args.repeat)
+
+if __name__ == "__main__":
+    main()
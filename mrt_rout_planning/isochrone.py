@@ -0,0 +1,187 @@
+from __future__ import annotations
+from typing import Dict, List, NamedTuple, Tuple
+from time import perf_counter
+import argparse
+import heapq
+
+import numpy as np
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Node, NetworkContext, SUPER_START, SUPER_GOAL
+
+# Isochrones: "what can I reach within N minutes from station X".
+#
+# isochrone() is a Dijkstra from __START__ on build_state_graph's query graph (boarding
+# crowd cost included) that never pushes a label above the budget, reduced to the best
+# cost per station: dist(line node) + crowd_value(station) for alighting, the same cost
+# astar reports for that OD pair.
+#
+# isochrone_matrix() does it for every origin at once and returns a dense station x
+# station cost matrix (inf = unreachable or over budget):
+#   "minplus"   Floyd-Warshall on the (station, line) node matrix, each pivot one
+#               vectorized min-plus update D = min(D, D[:, k] + D[k, :]); O(n^3) flops
+#               but no Python per edge, so it wins on the MRT-sized graphs
+#   "dijkstra"  one budgeted isochrone() per origin; scales to large synthetic graphs
+#               and profits from small budgets
+#   "auto"      minplus up to MINPLUS_MAX_NODES state nodes, dijkstra above
+
+MINPLUS_MAX_NODES = 600          # measured crossover on synthetic metros is ~700 nodes
+INF = float("inf")
+
+
+class Isochrone(NamedTuple):
+    origin: Station
+    budget: float
+    cost: Dict[Station, float]     # reachable station -> best cost (<= budget)
+    settled: int                   # state nodes settled by the search
+
+    def within(self, minutes: float) -> List[Station]:
+        return sorted((st for st, c in self.cost.items() if c <= minutes), key=lambda st: (self.cost[st], st))
+
+
+def isochrone(ctx: NetworkContext, origin: Station, budget: float = INF) -> Isochrone:
+    qg, starts, _ = mrp.build_state_graph(ctx, start=origin, goal=origin)
+    dist: Dict[Node, float] = {}
+    best: Dict[Node, float] = {s: 0.0 for s in starts}
+    pq: List[Tuple[float, Node]] = [(0.0, s) for s in starts]
+    cost: Dict[Station, float] = {}
+
+    while pq:
+        d, u = heapq.heappop(pq)
+        if u in dist:
+            continue
+        dist[u] = d
+
+        st = u[0]
+        if u != SUPER_START and u != SUPER_GOAL:
+            c = d + mrp.crowd_value(ctx, st)
+            if c <= budget and c < cost.get(st, INF):
+                cost[st] = c
+
+        for v, w in qg.get(u, []):
+            nd = d + w
+            if v == SUPER_GOAL or nd > budget:
+                continue
+            if nd < best.get(v, INF):
+                best[v] = nd
+                heapq.heappush(pq, (nd, v))
+
+    return Isochrone(origin, budget, cost, len(dist) - len(starts))
+
+
+# Batch form
+
+def node_matrix(ctx: NetworkContext) -> Tuple[List[Node], np.ndarray]:
+    """State nodes sorted by (station, line) and their one-hop cost matrix (0 diagonal)."""
+    adj = ctx.state.adj
+    nodes = sorted({u for u in adj} | {v for edges in adj.values() for v, _ in edges})
+    idx = {u: i for i, u in enumerate(nodes)}
+    d = np.full((len(nodes), len(nodes)), np.inf)
+    for u, edges in adj.items():
+        i = idx[u]
+        for v, c in edges:
+            j = idx[v]
+            d[i, j] = min(d[i, j], c)
+    np.fill_diagonal(d, 0.0)
+    return nodes, d
+
+def _minplus_closure(d: np.ndarray) -> np.ndarray:
+    for k in range(d.shape[0]):
+        np.minimum(d, d[:, k, None] + d[None, k, :], out=d)
+    return d
+
+def _matrix_minplus(ctx: NetworkContext, stations: List[Station]) -> np.ndarray:
+    nodes, d = node_matrix(ctx)
+    _minplus_closure(d)
+
+    # nodes are grouped by station, so each station is one contiguous block of rows/cols
+    first: List[int] = []
+    for i, (st, _) in enumerate(nodes):
+        if i == 0 or nodes[i - 1][0] != st:
+            first.append(i)
+    order = [nodes[i][0] for i in first]
+    by_station = np.minimum.reduceat(np.minimum.reduceat(d, first, axis=0), first, axis=1)
+
+    crowd = np.array([mrp.crowd_value(ctx, st) for st in order], dtype=np.float64)
+    by_station += crowd[:, None] + crowd[None, :]      # board at s, alight at t
+    pos = {st: i for i, st in enumerate(order)}
+    sel = [pos[st] for st in stations]
+    return by_station[np.ix_(sel, sel)]
+
+def _matrix_dijkstra(ctx: NetworkContext, stations: List[Station], budget: float) -> np.ndarray:
+    pos = {st: i for i, st in enumerate(stations)}
+    out = np.full((len(stations), len(stations)), np.inf)
+    for i, s in enumerate(stations):
+        iso = isochrone(ctx, s, budget)
+        for st, c in iso.cost.items():
+            out[i, pos[st]] = c
+    return out
+
+def isochrone_matrix(ctx: NetworkContext, budget: float = INF,
+                     method: str = "auto") -> Tuple[List[Station], np.ndarray]:
+    """(stations, cost) with cost[i, j] the best i -> j cost, inf where unreachable or over budget."""
+    stations = sorted(ctx.state.lines)
+    if method == "auto":
+        n_nodes = sum(len(lines) for lines in ctx.state.lines.values())
+        method = "minplus" if n_nodes <= MINPLUS_MAX_NODES else "dijkstra"
+    if method == "minplus":
+        m = _matrix_minplus(ctx, stations)
+    elif method == "dijkstra":
+        m = _matrix_dijkstra(ctx, stations, budget)
+    else:
+        raise ValueError(f"Unknown method: {method}")
+    m[m > budget] = np.inf
+    return stations, m
+
+
+# Runner: one isochrone per test origin + both batch methods, cross-checked
+
+def run_suite(ctx: NetworkContext, title: str, origins: List[Station], budget: float) -> None:
+    print(f"\n=== {title} === budget={budget:g} min")
+    for s in origins:
+        t0 = perf_counter()
+        iso = isochrone(ctx, s, budget)
+        dt = perf_counter() - t0
+        reach = iso.within(budget)
+        print(f"  {s}: {len(reach):3d} stations | settled={iso.settled:4d} | {dt*1000:6.2f} ms"
+              f" | farthest: {', '.join(f'{st} ({iso.cost[st]:.0f})' for st in reach[-3:])}")
+
+    times: Dict[str, float] = {}
+    mats: Dict[str, np.ndarray] = {}
+    for method in ("minplus", "dijkstra"):
+        t0 = perf_counter()
+        stations, mats[method] = isochrone_matrix(ctx, budget, method)
+        times[method] = perf_counter() - t0
+    if not np.array_equal(np.isinf(mats["minplus"]), np.isinf(mats["dijkstra"])) \
+            or not np.allclose(mats["minplus"], mats["dijkstra"], rtol=0.0, atol=1e-9):
+        raise RuntimeError("min-plus and Dijkstra isochrone matrices disagree")
+
+    # spot-check the matrix against astar on the test origins
+    m = mats["minplus"]
+    pos = {st: i for i, st in enumerate(stations)}
+    for s in origins:
+        for t in stations:
+            _, acost, _ = mrp.astar(ctx, mrp.attach_query(ctx, s, t), [SUPER_START], {SUPER_GOAL}, t, s)
+            got, expect = m[pos[s], pos[t]], (acost if acost <= budget else INF)
+            if got != expect and abs(got - expect) > 1e-9:
+                raise RuntimeError(f"isochrone disagrees with A* on {s} -> {t}: {got} vs {acost}")
+
+    reach = np.isfinite(m).sum(axis=1)
+    top = np.argsort(-reach, kind="stable")[:3]
+    print(f"  all {len(stations)} origins: minplus={times['minplus']*1000:7.1f} ms"
+          f" | dijkstra={times['dijkstra']*1000:7.1f} ms | mean reachable={reach.mean():.1f}"
+          f" | best connected: {', '.join(f'{stations[i]} ({reach[i]})' for i in top)}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Budgeted isochrones and the batch reachability matrix.")
+    ap.add_argument("--budget", type=float, default=30.0, help="minutes")
+    ap.add_argument("--origin", action="append", help="origin station (repeatable; default: test origins)")
+    args = ap.parse_args()
+
+    for future, title, tests in ((False, "TODAY MODE", mrp.TESTS_TODAY), (True, "FUTURE MODE", mrp.TESTS_FUTURE)):
+        origins = args.origin or sorted({s for s, _ in tests})
+        run_suite(mrp.build_network_context(future), title, origins, args.budget)
+
+if __name__ == "__main__":
+    main()
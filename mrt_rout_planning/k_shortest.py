@@ -0,0 +1,226 @@
+from __future__ import annotations
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from time import perf_counter
+import argparse
+import heapq
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Node, NetworkContext, QueryGraph, ReverseQueryGraph, SUPER_START, SUPER_GOAL
+
+# Top-k alternative routes (Yen's k shortest loopless paths) on the state graph.
+#
+# One reverse Dijkstra from __GOAL__ gives d(v, goal) and the next hop of the
+# shortest-path tree for every node. That tree is shared by all spur searches:
+#   - if the tree path from the spur node avoids every removed edge / root station,
+#     it is the spur path as is (no search at all);
+#   - otherwise A* runs with d(v, goal) as heuristic, which is exact on the full graph
+#     and still admissible once edges are removed, so it expands almost nothing.
+# Routes are loopless at station level (a station is never re-entered after leaving
+# it) and de-duplicated on collapse_station_path, so line-label variants of the
+# same station sequence count once.
+
+INF = float("inf")
+
+
+class Route(NamedTuple):
+    path: List[Node]                # with __START__ / __GOAL__, like astar's result
+    cost: float
+    stations: Tuple[Station, ...]
+    transfers: int
+
+
+def tree_to_goal(rq: ReverseQueryGraph) -> Tuple[Dict[Node, float], Dict[Node, Node]]:
+    """Dijkstra from __GOAL__ on the reversed query graph: (d(v, goal), next hop towards goal)."""
+    dist: Dict[Node, float] = {SUPER_GOAL: 0.0}
+    nxt: Dict[Node, Node] = {}
+    pq: List[Tuple[float, Node]] = [(0.0, SUPER_GOAL)]
+    while pq:
+        d, u = heapq.heappop(pq)
+        if d != dist[u]:
+            continue
+        for v, c in rq.get(u, []) or []:
+            nd = d + c
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                nxt[v] = u
+                heapq.heappush(pq, (nd, v))
+    return dist, nxt
+
+
+class _Spur:
+    """One spur search context: which edges/nodes the deviation may not use."""
+    __slots__ = ("spur", "blocked", "root_nodes", "root_stations")
+
+    def __init__(self, spur: Node, blocked: Set[Node], root: List[Node]) -> None:
+        self.spur = spur
+        self.blocked = blocked                              # heads of removed edges out of spur
+        self.root_nodes = set(root)
+        self.root_stations = {n[0] for n in root}
+
+    def allowed(self, u: Node, v: Node) -> bool:
+        if u == self.spur and v in self.blocked:
+            return False
+        if v in self.root_nodes:
+            return False
+        # re-entering a station of the root from elsewhere would loop at station level
+        return not (v[0] in self.root_stations and v[0] != u[0])
+
+
+def _spur_path(graph: QueryGraph, to_goal: Dict[Node, float], nxt: Dict[Node, Node],
+               rules: _Spur) -> Tuple[Optional[List[Node]], float]:
+    # shared tree first: valid unless it runs into something the deviation must avoid
+    spur = rules.spur
+    path = [spur]
+    u = spur
+    while u != SUPER_GOAL and u in nxt and rules.allowed(u, nxt[u]):
+        u = nxt[u]
+        path.append(u)
+    if u == SUPER_GOAL:
+        return path, to_goal[spur]
+
+    # A* on the restricted graph with the exact full-graph distance as heuristic
+    g: Dict[Node, float] = {spur: 0.0}
+    parent: Dict[Node, Node] = {}
+    pq: List[Tuple[float, float, Node]] = [(to_goal.get(spur, INF), 0.0, spur)]
+    closed: Set[Node] = set()
+    while pq:
+        _, gu, u = heapq.heappop(pq)
+        if u in closed:
+            continue
+        if u == SUPER_GOAL:
+            out = [u]
+            while out[-1] != spur:
+                out.append(parent[out[-1]])
+            out.reverse()
+            return out, gu
+        closed.add(u)
+        for v, c in graph.get(u, []) or []:
+            if v in closed or not rules.allowed(u, v):
+                continue
+            h = to_goal.get(v, INF)
+            if h == INF:
+                continue
+            nd = gu + c
+            if nd < g.get(v, INF):
+                g[v] = nd
+                parent[v] = u
+                heapq.heappush(pq, (nd + h, nd, v))
+    return None, INF
+
+
+def _edge_cost(graph: QueryGraph, u: Node, v: Node) -> float:
+    for w, c in graph.get(u, []) or []:
+        if w == v:
+            return c
+    raise ValueError(f"No edge {u} -> {v}")
+
+def _prefix_costs(graph: QueryGraph, path: List[Node]) -> List[float]:
+    out = [0.0]
+    for u, v in zip(path, path[1:]):
+        out.append(out[-1] + _edge_cost(graph, u, v))
+    return out
+
+def _station_simple(path: List[Node]) -> bool:
+    stations = mrp.collapse_station_path(path)
+    return len(stations) == len(set(stations))
+
+
+def k_shortest_routes(ctx: NetworkContext, start: Station, goal: Station, k: int = 5,
+                      max_paths: Optional[int] = None) -> Tuple[List[Route], int]:
+    """
+    Up to k cheapest station-distinct routes start -> goal, cheapest first.
+    Returns (routes, spur_searches). max_paths caps the node-level paths Yen may
+    accept while skipping line-label duplicates (default 8 * k).
+    """
+    graph = mrp.attach_query(ctx, start, goal)
+    to_goal, nxt = tree_to_goal(ReverseQueryGraph(graph))
+    if to_goal.get(SUPER_START, INF) == INF:
+        return [], 0
+    if max_paths is None:
+        max_paths = 8 * k
+
+    first = [SUPER_START]
+    while first[-1] != SUPER_GOAL:
+        first.append(nxt[first[-1]])
+
+    accepted: List[List[Node]] = []                 # node-level A of Yen's algorithm
+    accepted_costs: List[List[float]] = []
+    routes: List[Route] = []
+    seen_stations: Set[Tuple[Station, ...]] = set()
+    seen_paths: Set[Tuple[Node, ...]] = {tuple(first)}
+    candidates: List[Tuple[float, int, List[Node]]] = [(to_goal[SUPER_START], 0, first)]
+    tie = 1
+    spurs = 0
+
+    while candidates and len(routes) < k and len(accepted) < max_paths:
+        cost, _, path = heapq.heappop(candidates)
+        accepted.append(path)
+        prefix = _prefix_costs(graph, path)
+        accepted_costs.append(prefix)
+
+        stations = tuple(mrp.collapse_station_path(path))
+        if stations not in seen_stations:
+            seen_stations.add(stations)
+            routes.append(Route(path, cost, stations, mrp.transfer_count(path)))
+            if len(routes) == k:
+                break
+
+        # deviations at every node of the new path except __GOAL__
+        for i in range(len(path) - 1):
+            root = path[:i + 1]
+            blocked = {p[i + 1] for p in accepted if len(p) > i + 1 and p[:i + 1] == root}
+            spurs += 1
+            spur_path, spur_cost = _spur_path(graph, to_goal, nxt, _Spur(path[i], blocked, root))
+            if spur_path is None:
+                continue
+            full = root[:-1] + spur_path
+            key = tuple(full)
+            if key in seen_paths or not _station_simple(full):
+                continue
+            seen_paths.add(key)
+            heapq.heappush(candidates, (prefix[i] + spur_cost, tie, full))
+            tie += 1
+
+    return routes, spurs
+
+
+# Report: alternatives for the test suites + latency over every OD pair
+
+def run_suite(ctx: NetworkContext, title: str, tests: List[Tuple[Station, Station]], k: int) -> None:
+    print(f"\n=== {title} === k={k}")
+    for s, t in tests:
+        t0 = perf_counter()
+        routes, spurs = k_shortest_routes(ctx, s, t, k)
+        dt = perf_counter() - t0
+        print(f"\n{s} -> {t}: {len(routes)} routes | spur searches={spurs} | {dt * 1000:.2f} ms")
+        for i, r in enumerate(routes, 1):
+            print(f"  #{i} cost={r.cost:6.1f} | transfers={r.transfers:2d} | {list(r.stations)}")
+
+    stations = sorted(ctx.state.lines)
+    times: List[float] = []
+    for s in stations:
+        for t in stations:
+            if s == t:
+                continue
+            t0 = perf_counter()
+            routes, _ = k_shortest_routes(ctx, s, t, k)
+            times.append(perf_counter() - t0)
+            qg = mrp.attach_query(ctx, s, t)
+            _, best, _ = mrp.astar(ctx, qg, [SUPER_START], {SUPER_GOAL}, t, s)
+            if not routes or abs(routes[0].cost - best) > 1e-9:
+                raise RuntimeError(f"k-shortest #1 disagrees with A* on {s} -> {t}")
+    times.sort()
+    print(f"\n  all {len(times)} OD pairs: mean={sum(times) / len(times) * 1000:.2f} ms"
+          f" | p95={times[int(0.95 * (len(times) - 1))] * 1000:.2f} ms | max={times[-1] * 1000:.2f} ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Top-k alternative routes (Yen) per OD pair.")
+    ap.add_argument("-k", type=int, default=5)
+    args = ap.parse_args()
+
+    run_suite(mrp.build_network_context(False), "TODAY MODE", mrp.TESTS_TODAY, args.k)
+    run_suite(mrp.build_network_context(True), "FUTURE MODE", mrp.TESTS_FUTURE, args.k)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 from __future__ import annotations
-from typing import Dict, List, Tuple, Optional, Set
+from typing import Callable, Dict, List, Mapping, NamedTuple, Tuple, Optional, Sequence, Set, Union
+from dataclasses import dataclass, field
+from types import MappingProxyType
 import math
 import heapq
 from collections import deque
-from time import perf_counter
+from time import perf_counter, process_time
 import json
 
 # Types
@@ -12,10 +14,13 @@ Line = str
 
 BaseEdge = Tuple[Station, int, Line]     # (neighbor, baseline_minutes, line)
 BaseGraph = Dict[Station, List[BaseEdge]]
+BaseGraphView = Mapping[Station, Sequence[BaseEdge]]   # read-only form held by NetworkContext
 
 Node = Tuple[Station, Line]              # (station, line)
 Edge = Tuple[Node, float] # (neighbor_node, edge_cost_minutes_or_transfer)
 Graph = Dict[Node, List[Edge]]
+AnyGraph = Union[Graph, "QueryGraph"]    # searches only need .get(u, default)
+Heuristic = Callable[[Node], float]      # optional override for gbfs/astar (default: h_node)
 
 
 # Cost Model
@@ -47,13 +52,11 @@ CROWDING_FUTURE: Dict[Station, int] = {
     "Changi Terminal 5": 3,
 }
 
-IS_FUTURE_MODE = False
+def crowd_value(ctx: NetworkContext, station: Station) -> int:
+    return ctx.crowding.get(station, 0)
 
-def crowd_value(station: Station) -> int:
-    return (CROWDING_FUTURE if IS_FUTURE_MODE else CROWDING_TODAY).get(station, 0)
-
-def transfer_penalty(station: Station) -> int:
-    if IS_FUTURE_MODE and station in MAJOR_INTERCHANGES_FUTURE:
+def transfer_penalty(ctx: NetworkContext, station: Station) -> int:
+    if ctx.is_future and station in MAJOR_INTERCHANGES_FUTURE:
         return 6
     return TRANSFER_PENALTY_MIN
 
@@ -212,7 +215,7 @@ def build_future_base_graph() -> BaseGraph:
 
 # Expand BaseGraph -> StateGraph (station,line) + transfers
 
-def stations_and_lines(base: BaseGraph) -> Dict[Station, Set[Line]]:
+def stations_and_lines(base: BaseGraphView) -> Dict[Station, Set[Line]]:
     sl: Dict[Station, Set[Line]] = {}
     for u, edges in base.items():
         sl.setdefault(u, set())
@@ -222,7 +225,82 @@ def stations_and_lines(base: BaseGraph) -> Dict[Station, Set[Line]]:
             sl[v].add(line)
     return sl
 
-def build_state_graph(base: BaseGraph, *, start: Station, goal: Station) -> Tuple[Graph, Set[Node], Set[Node]]:
+SUPER_START: Node = ("__START__", "__START__")
+SUPER_GOAL: Node = ("__GOAL__", "__GOAL__")
+
+
+class StateGraph:
+    """
+    Query-independent (station, line) graph: ride edges + interchange transfer edges.
+    Built once per network mode and shared read-only by every query.
+    """
+    __slots__ = ("adj", "lines", "_reverse")
+
+    def __init__(self, adj: Graph, lines: Dict[Station, Set[Line]]) -> None:
+        self.adj = adj
+        self.lines = lines
+        self._reverse: Optional[Graph] = None
+
+    def reverse_adj(self) -> Graph:
+        """Transposed adjacency (v -> u for every u -> v), built on first use and kept."""
+        if self._reverse is None:
+            rev: Graph = {}
+            for u, edges in self.adj.items():
+                for v, c in edges:
+                    rev.setdefault(v, []).append((u, c))
+            self._reverse = rev
+        return self._reverse
+
+
+class QueryGraph:
+    """
+    Read-only view of a StateGraph with __START__/__GOAL__ attached virtually.
+
+    Only the boarding/alighting edges belong to the query; every ride and
+    transfer edge list is the shared one (never copied or mutated).
+    Exposes the same .get(u, default) lookup the search functions use on a dict Graph.
+    """
+    __slots__ = ("shared", "start_edges", "goal_edges")
+
+    def __init__(self, shared: StateGraph, start_edges: List[Edge], goal_edges: Dict[Node, float]) -> None:
+        self.shared = shared
+        self.start_edges = start_edges
+        self.goal_edges = goal_edges
+
+    def get(self, u: Node, default: Optional[List[Edge]] = None) -> Optional[List[Edge]]:
+        if u == SUPER_START:
+            return self.start_edges
+        edges = self.shared.adj.get(u, default)
+        alight = self.goal_edges.get(u)
+        if alight is None:
+            return edges
+        return list(edges or ()) + [(SUPER_GOAL, alight)]
+
+
+class ReverseQueryGraph:
+    """
+    A QueryGraph with every edge flipped, for searches that grow back from __GOAL__:
+    __GOAL__ -> (goal, line) at the alighting cost, (start, line) -> __START__ at the boarding cost.
+    """
+    __slots__ = ("rev", "goal_edges", "start_edges")
+
+    def __init__(self, qg: QueryGraph) -> None:
+        self.rev = qg.shared.reverse_adj()
+        self.goal_edges: List[Edge] = sorted(qg.goal_edges.items())
+        self.start_edges: Dict[Node, float] = {v: c for v, c in qg.start_edges}
+
+    def get(self, u: Node, default: Optional[List[Edge]] = None) -> Optional[List[Edge]]:
+        if u == SUPER_GOAL:
+            return self.goal_edges
+        edges = self.rev.get(u, default)
+        board = self.start_edges.get(u)
+        if board is None:
+            return edges
+        return list(edges or ()) + [(SUPER_START, board)]
+
+
+def build_shared_state_graph(ctx: NetworkContext) -> StateGraph:
+    base = ctx.base
     sl = stations_and_lines(base)
     interchanges = {st for st, lines in sl.items() if len(lines) >= 2}
     # Debug: check unexpected interchanges
@@ -250,41 +328,35 @@ def build_state_graph(base: BaseGraph, *, start: Station, goal: Station) -> Tupl
                     continue
                 a = (st, l1)
                 b = (st, l2)
-                cost = float(transfer_penalty(st) + crowd_value(st))
+                cost = float(transfer_penalty(ctx, st) + crowd_value(ctx, st))
                 tmp.setdefault(a, {})
                 if b not in tmp[a] or cost < tmp[a][b]:
                     tmp[a][b] = cost
 
-    # 3) super nodes: pay crowd only when boarding + alighting
-    SUPER_START: Node = ("__START__", "__START__")
-    SUPER_GOAL: Node  = ("__GOAL__", "__GOAL__")
+    g: Graph = {u: [(v, c) for v, c in nbrs.items()] for u, nbrs in tmp.items()}
+    return StateGraph(g, sl)
+
+def attach_query(ctx: NetworkContext, start: Station, goal: Station) -> QueryGraph:
+    """Super nodes: pay crowd only when boarding + alighting."""
+    shared = ctx.state
 
     # boarding: SUPER_START -> (start, each line)
-    for line_name in sl.get(start, set()):
-        a = SUPER_START
-        b = (start, line_name)
-        cost = float(crowd_value(start))
-        tmp.setdefault(a, {})
-        if b not in tmp[a] or cost < tmp[a][b]:
-            tmp[a][b] = cost
+    board = float(crowd_value(ctx, start))
+    start_edges: List[Edge] = [((start, ln), board) for ln in sorted(shared.lines.get(start, ()))]
 
     # alighting: (goal, each line) -> SUPER_GOAL
-    for line_name in sl.get(goal, set()):
-        a = (goal, line_name)
-        b = SUPER_GOAL
-        cost = float(crowd_value(goal))
-        tmp.setdefault(a, {})
-        if b not in tmp[a] or cost < tmp[a][b]:
-            tmp[a][b] = cost
+    alight = float(crowd_value(ctx, goal))
+    goal_edges: Dict[Node, float] = {(goal, ln): alight for ln in shared.lines.get(goal, ())}
 
-    g: Graph = {u: [(v, c) for v, c in nbrs.items()] for u, nbrs in tmp.items()}
-    return g, {SUPER_START}, {SUPER_GOAL}
+    return QueryGraph(shared, start_edges, goal_edges)
 
+def build_state_graph(ctx: NetworkContext, *, start: Station, goal: Station) -> Tuple[QueryGraph, Set[Node], Set[Node]]:
+    """Convenience wrapper returning the (graph, starts, goals) triple the searches take."""
+    qg = attach_query(ctx, start, goal)
+    return qg, {SUPER_START}, {SUPER_GOAL}
 
-# Coordinates + Heuristic (time-based)
 
-COORDS_XY: Dict[Station, Tuple[float, float]] = {}
-HEURISTIC_SCALE_MIN_PER_KM = 0.0
+# Coordinates + Heuristic (time-based)
 
 import os
 
@@ -325,7 +397,7 @@ def build_xy_coords(coords_latlon: Dict[Station, Tuple[float, float]]) -> Dict[S
         return {}
     ref_lat = sum(lat for lat, _ in coords_latlon.values()) / len(coords_latlon)
     return {st: latlon_to_xy_km(lat, lon, ref_lat) for st, (lat, lon) in coords_latlon.items()}
-def check_missing_coords(base: BaseGraph, coords_xy: Dict[Station, Tuple[float, float]]) -> None:
+def check_missing_coords(base: BaseGraphView, coords_xy: Mapping[Station, Tuple[float, float]]) -> None:
     """Debug helper: prints stations that exist in the graph but have no coordinates."""
     stations = set(base.keys())
     for u, edges in base.items():
@@ -338,7 +410,8 @@ def check_missing_coords(base: BaseGraph, coords_xy: Dict[Station, Tuple[float,
     else:
         print("Missing COORDS: none ")
 
-def compute_safe_minutes_per_km(base: BaseGraph, safety: float = 0.9) -> float:
+def compute_safe_minutes_per_km(base: BaseGraphView, coords_xy: Mapping[Station, Tuple[float, float]],
+                                safety: float = 0.9) -> float:
     """
     Convert distance (km) -> time (min) using ONLY your graph data:
 
@@ -350,9 +423,9 @@ def compute_safe_minutes_per_km(base: BaseGraph, safety: float = 0.9) -> float:
     ratios: List[float] = []
     for u, edges in base.items():
         for v, mins, _ in edges:
-            if u in COORDS_XY and v in COORDS_XY:
-                ux, uy = COORDS_XY[u]
-                vx, vy = COORDS_XY[v]
+            if u in coords_xy and v in coords_xy:
+                ux, uy = coords_xy[u]
+                vx, vy = coords_xy[v]
                 d = math.hypot(ux - vx, uy - vy)
                 if d > 1e-6:
                     ratios.append(mins / d)
@@ -361,23 +434,74 @@ def compute_safe_minutes_per_km(base: BaseGraph, safety: float = 0.9) -> float:
         return 0.0
     return safety * min(ratios)
 
-def h_station(a: Station, b: Station) -> float:
+def h_station(ctx: NetworkContext, a: Station, b: Station) -> float:
     """Heuristic in minutes (straight-line lower bound)."""
-    if a not in COORDS_XY or b not in COORDS_XY:
+    coords = ctx.coords_xy
+    if a not in coords or b not in coords:
         return 0.0
-    ax, ay = COORDS_XY[a]
-    bx, by = COORDS_XY[b]
+    ax, ay = coords[a]
+    bx, by = coords[b]
     d_km = math.hypot(ax - bx, ay - by)
-    return HEURISTIC_SCALE_MIN_PER_KM * d_km
+    return ctx.heuristic_scale * d_km
 
 
-def h_node(n: Node, goal_station: Station, start_station: Station) -> float:
+def h_node(ctx: NetworkContext, n: Node, goal_station: Station, start_station: Station) -> float:
     st, _ = n
     if st == "__START__":
-        return h_station(start_station, goal_station)
+        return h_station(ctx, start_station, goal_station)
     if st == "__GOAL__":
         return 0.0
-    return h_station(st, goal_station)
+    return h_station(ctx, st, goal_station)
+
+
+# Network Context (one per mode)
+
+@dataclass(frozen=True)
+class NetworkContext:
+    """
+    Everything a query reads for one network mode: base + state graph, coordinates,
+    crowding table and heuristic scale. Immutable once built (base, coords_xy and
+    crowding are read-only views over private copies; the edge lists of base are
+    tuples), so Today and Future contexts can be served side by side from worker threads.
+    """
+    mode: str
+    is_future: bool
+    base: BaseGraphView
+    coords_xy: Mapping[Station, Tuple[float, float]]
+    crowding: Mapping[Station, int]
+    heuristic_scale: float
+    state: StateGraph = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        state = build_shared_state_graph(self)
+        state.reverse_adj()     # build eagerly: nothing is filled in lazily after construction
+        object.__setattr__(self, "state", state)
+
+def build_network_context(future: bool, base: Optional[BaseGraph] = None,
+                          coords: Optional[Dict[Station, Tuple[float, float]]] = None) -> NetworkContext:
+    """
+    Build the Today or Future context. base / coords (lat, lon) default to the
+    hand-coded graph builders + coordinate files; network_loader passes its own.
+    """
+    if coords is None:
+        coords = load_coords_from_json("mrt_today_coordinates.json")
+        if future:
+            # IMPORTANT: future graph contains today stations too,
+            # so I  merged coords: today + future (future overrides duplicates)
+            coords.update(load_coords_from_json("mrt_future_coordinates.json"))
+
+    if base is None:
+        base = build_future_base_graph() if future else build_today_base_graph()
+
+    coords_xy = build_xy_coords(coords)
+    return NetworkContext(
+        mode="future" if future else "today",
+        is_future=future,
+        base=MappingProxyType({st: tuple(edges) for st, edges in base.items()}),
+        coords_xy=MappingProxyType(coords_xy),
+        crowding=MappingProxyType(dict(CROWDING_FUTURE if future else CROWDING_TODAY)),
+        heuristic_scale=compute_safe_minutes_per_km(base, coords_xy),
+    )
 
 # Path utilities
 
@@ -400,7 +524,7 @@ def collapse_station_path(node_path: List[Node]) -> List[Station]:
     return out
 
 
-def path_cost(graph: Graph, node_path: List[Node]) -> float:
+def path_cost(graph: AnyGraph, node_path: List[Node]) -> float:
     """Sum of edge costs along node_path (graph already includes crowding + penalties)."""
     if not node_path:
         return float("inf")
@@ -430,55 +554,134 @@ def hop_count_nodes(node_path: List[Node]) -> int:
 
 
 
+# Search instrumentation
+#
+# Every search takes an optional `stats`. With stats=None (the default) the loops only
+# bump a few local ints - no callbacks, no clock reads. When a SearchStats is passed the
+# search adds its counters and wall / CPU time to it before returning, so one object can
+# collect a single query or aggregate a whole suite (`total += per_query` also works).
+
+class SearchStats:
+    __slots__ = ("searches", "expanded", "pushes", "stale_pops", "peak_frontier",
+                 "h_evals", "relaxed", "wall_s", "cpu_s")
+
+    def __init__(self) -> None:
+        self.searches = 0
+        self.expanded = 0          # nodes popped and expanded
+        self.pushes = 0            # frontier insertions (starts included)
+        self.stale_pops = 0        # pops skipped as outdated / already visited
+        self.peak_frontier = 0     # largest frontier seen (max, not summed, when aggregating)
+        self.h_evals = 0           # heuristic / potential evaluations
+        self.relaxed = 0           # out-edges scanned from expanded nodes
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+
+    def record(self, clock: Tuple[float, float], expanded: int, pushes: int, stale_pops: int,
+               peak_frontier: int, h_evals: int, relaxed: int) -> None:
+        self.wall_s += perf_counter() - clock[0]
+        self.cpu_s += process_time() - clock[1]
+        self.searches += 1
+        self.expanded += expanded
+        self.pushes += pushes
+        self.stale_pops += stale_pops
+        self.peak_frontier = max(self.peak_frontier, peak_frontier)
+        self.h_evals += h_evals
+        self.relaxed += relaxed
+
+    def __iadd__(self, other: "SearchStats") -> "SearchStats":
+        for name in self.__slots__:
+            if name == "peak_frontier":
+                self.peak_frontier = max(self.peak_frontier, other.peak_frontier)
+            else:
+                setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return "SearchStats(" + ", ".join(f"{k}={v}" for k, v in self.as_dict().items()) + ")"
+
+def start_clock() -> Tuple[float, float]:
+    return perf_counter(), process_time()
+
+
 # Search Algorithms
 
-def bfs(graph: Graph, starts: List[Node], goals: Set[Node]) -> Tuple[Optional[List[Node]], int]:
+def bfs(graph: AnyGraph, starts: List[Node], goals: Set[Node],
+        stats: Optional[SearchStats] = None) -> Tuple[Optional[List[Node]], int]:
+    clock = start_clock() if stats is not None else None
     q = deque(starts)
     parent: Dict[Node, Optional[Node]] = {s: None for s in starts}
     visited = set(starts)
     expanded = 0
+    peak = len(q)
+    relaxed = 0
+    path: Optional[List[Node]] = None
 
     while q:
         u = q.popleft()
         expanded += 1
         if u in goals:
-            return reconstruct(parent, u), expanded
+            path = reconstruct(parent, u)
+            break
 
-        for v, _ in graph.get(u, []):
+        edges = graph.get(u, [])
+        relaxed += len(edges)
+        for v, _ in edges:
             if v not in visited:
                 visited.add(v)
                 parent[v] = u
                 q.append(v)
+        if len(q) > peak:
+            peak = len(q)
 
-    return None, expanded
+    if stats is not None:
+        stats.record(clock, expanded, expanded + len(q), 0, peak, 0, relaxed)
+    return path, expanded
 
-def dfs(graph: Graph, starts: List[Node], goals: Set[Node]) -> Tuple[Optional[List[Node]], int]:
+def dfs(graph: AnyGraph, starts: List[Node], goals: Set[Node],
+        stats: Optional[SearchStats] = None) -> Tuple[Optional[List[Node]], int]:
+    clock = start_clock() if stats is not None else None
     stack = list(starts)
     parent: Dict[Node, Optional[Node]] = {s: None for s in starts}
     discovered: Set[Node] = set(starts)
     expanded = 0
+    peak = len(stack)
+    relaxed = 0
+    path: Optional[List[Node]] = None
 
     while stack:
         u = stack.pop()
         expanded += 1
 
         if u in goals:
-            return reconstruct(parent, u), expanded
+            path = reconstruct(parent, u)
+            break
 
-        for v, _ in reversed(graph.get(u, [])):
+        edges = graph.get(u, [])
+        relaxed += len(edges)
+        for v, _ in reversed(edges):
             if v not in discovered:
                 discovered.add(v)
                 parent[v] = u
                 stack.append(v)
+        if len(stack) > peak:
+            peak = len(stack)
 
-    return None, expanded
+    if stats is not None:
+        stats.record(clock, expanded, expanded + len(stack), 0, peak, 0, relaxed)
+    return path, expanded
 
 
-def gbfs(graph: Graph, starts: List[Node], goals: Set[Node],
-         goal_station: Station, start_station: Station) -> Tuple[Optional[List[Node]], int]:
+def gbfs(ctx: NetworkContext, graph: AnyGraph, starts: List[Node], goals: Set[Node],
+         goal_station: Station, start_station: Station,
+         heuristic: Optional[Heuristic] = None,
+         stats: Optional[SearchStats] = None) -> Tuple[Optional[List[Node]], int]:
+    clock = start_clock() if stats is not None else None
 
-    def key(n: Node) -> float:
-        return h_node(n, goal_station, start_station)
+    key: Heuristic = heuristic if heuristic is not None else (
+        lambda n: h_node(ctx, n, goal_station, start_station))
 
 
 
@@ -488,31 +691,46 @@ def gbfs(graph: Graph, starts: List[Node], goals: Set[Node],
     parent: Dict[Node, Optional[Node]] = {s: None for s in starts}
     visited: Set[Node] = set()
     expanded = 0
+    peak = len(pq)
+    stale = relaxed = 0
+    path: Optional[List[Node]] = None
 
     while pq:
         _, u = heapq.heappop(pq)
         if u in visited:
+            stale += 1
             continue
         visited.add(u)
         expanded += 1
 
         if u in goals:
-            return reconstruct(parent, u), expanded
+            path = reconstruct(parent, u)
+            break
 
-        for v, _ in graph.get(u, []):
+        edges = graph.get(u, [])
+        relaxed += len(edges)
+        for v, _ in edges:
             if v in visited:
                 continue
             if v not in parent:
                 parent[v] = u
             heapq.heappush(pq, (key(v), v))
+        if len(pq) > peak:
+            peak = len(pq)
 
-    return None, expanded
+    if stats is not None:
+        pushes = expanded + stale + len(pq)      # every push is popped or still queued
+        stats.record(clock, expanded, pushes, stale, peak, pushes, relaxed)
+    return path, expanded
 
-def astar(graph: Graph, starts: List[Node], goals: Set[Node],
-          goal_station: Station, start_station: Station) -> Tuple[Optional[List[Node]], float, int]:
+def astar(ctx: NetworkContext, graph: AnyGraph, starts: List[Node], goals: Set[Node],
+          goal_station: Station, start_station: Station,
+          heuristic: Optional[Heuristic] = None,
+          stats: Optional[SearchStats] = None) -> Tuple[Optional[List[Node]], float, int]:
+    clock = start_clock() if stats is not None else None
 
-    def h(n: Node) -> float:
-        return h_node(n, goal_station, start_station)
+    h: Heuristic = heuristic if heuristic is not None else (
+        lambda n: h_node(ctx, n, goal_station, start_station))
 
 
 
@@ -526,24 +744,142 @@ def astar(graph: Graph, starts: List[Node], goals: Set[Node],
         heapq.heappush(pq, (h(s), 0.0, s))
 
     expanded = 0
+    peak = len(pq)
+    stale = relaxed = 0
+    path: Optional[List[Node]] = None
+    cost = float("inf")
 
     while pq:
         _f, gcur, u = heapq.heappop(pq)
         if gcur != best_g.get(u, float("inf")):
+            stale += 1
             continue
 
         expanded += 1
         if u in goals:
-            return reconstruct(parent, u), gcur, expanded
+            path, cost = reconstruct(parent, u), gcur
+            break
 
-        for v, edge_cost in graph.get(u, []):
+        edges = graph.get(u, [])
+        relaxed += len(edges)
+        for v, edge_cost in edges:
             new_g = gcur + edge_cost
             if new_g < best_g.get(v, float("inf")):
                 best_g[v] = new_g
                 parent[v] = u
                 heapq.heappush(pq, (new_g + h(v), new_g, v))
+        if len(pq) > peak:
+            peak = len(pq)
+
+    if stats is not None:
+        pushes = expanded + stale + len(pq)      # every push is popped or still queued
+        stats.record(clock, expanded, pushes, stale, peak, pushes, relaxed)
+    return path, cost, expanded
+
+def bidirectional_astar(ctx: NetworkContext, graph: QueryGraph, starts: List[Node], goals: Set[Node],
+                        goal_station: Station, start_station: Station,
+                        use_potentials: bool = True,
+                        stats: Optional[SearchStats] = None) -> Tuple[Optional[List[Node]], float, int]:
+    """
+    Bidirectional A*: one frontier from `starts`, one from `goals` on the reversed graph.
 
-    return None, float("inf"), expanded
+    Uses the average potential p(v) = (h_goal(v) - h_start(v)) / 2 (forward key g + p,
+    reverse key g - p). Both sides then see the same non-negative reduced edge costs, so
+    the search can stop as soon as top_forward + top_reverse >= best meeting cost.
+    use_potentials=False gives plain bidirectional Dijkstra.
+    """
+    clock = start_clock() if stats is not None else None
+    rgraph = ReverseQueryGraph(graph)
+
+    def p(n: Node) -> float:
+        if not use_potentials:
+            return 0.0
+        st, _ = n
+        if st == "__START__":
+            h_start = 0.0
+        elif st == "__GOAL__":
+            h_start = h_station(ctx, start_station, goal_station)
+        else:
+            h_start = h_station(ctx, start_station, st)
+        return 0.5 * (h_node(ctx, n, goal_station, start_station) - h_start)
+
+    best_f: Dict[Node, float] = {}
+    best_r: Dict[Node, float] = {}
+    parent_f: Dict[Node, Optional[Node]] = {}
+    parent_r: Dict[Node, Optional[Node]] = {}   # next node towards the goal
+    pq_f: List[Tuple[float, float, Node]] = []
+    pq_r: List[Tuple[float, float, Node]] = []
+
+    for s in starts:
+        best_f[s] = 0.0
+        parent_f[s] = None
+        heapq.heappush(pq_f, (p(s), 0.0, s))
+    for t in goals:
+        best_r[t] = 0.0
+        parent_r[t] = None
+        heapq.heappush(pq_r, (-p(t), 0.0, t))
+
+    mu = float("inf")
+    meet: Optional[Tuple[Node, Node]] = None     # edge (a, b) joining the two trees
+    expanded = 0
+    peak = len(pq_f) + len(pq_r)
+    stale = relaxed = 0
+
+    while pq_f and pq_r:
+        # drop stale heap tops so the stopping test sees real keys
+        while pq_f and pq_f[0][1] != best_f.get(pq_f[0][2]):
+            heapq.heappop(pq_f)
+            stale += 1
+        while pq_r and pq_r[0][1] != best_r.get(pq_r[0][2]):
+            heapq.heappop(pq_r)
+            stale += 1
+        if not pq_f or not pq_r or pq_f[0][0] + pq_r[0][0] >= mu:
+            break
+
+        if pq_f[0][0] <= pq_r[0][0]:
+            _k, gcur, u = heapq.heappop(pq_f)
+            expanded += 1
+            edges = graph.get(u, [])
+            relaxed += len(edges)
+            for v, edge_cost in edges:
+                new_g = gcur + edge_cost
+                if new_g < best_f.get(v, float("inf")):
+                    best_f[v] = new_g
+                    parent_f[v] = u
+                    heapq.heappush(pq_f, (new_g + p(v), new_g, v))
+                if v in best_r and new_g + best_r[v] < mu:
+                    mu = new_g + best_r[v]
+                    meet = (u, v)
+        else:
+            _k, gcur, u = heapq.heappop(pq_r)
+            expanded += 1
+            edges = rgraph.get(u, [])
+            relaxed += len(edges)
+            for v, edge_cost in edges:
+                new_g = gcur + edge_cost
+                if new_g < best_r.get(v, float("inf")):
+                    best_r[v] = new_g
+                    parent_r[v] = u
+                    heapq.heappush(pq_r, (new_g - p(v), new_g, v))
+                if v in best_f and new_g + best_f[v] < mu:
+                    mu = new_g + best_f[v]
+                    meet = (v, u)
+        if len(pq_f) + len(pq_r) > peak:
+            peak = len(pq_f) + len(pq_r)
+
+    path: Optional[List[Node]] = None
+    if meet is not None:
+        a, b = meet
+        path = reconstruct(parent_f, a)
+        cur: Optional[Node] = b
+        while cur is not None:
+            path.append(cur)
+            cur = parent_r[cur]
+
+    if stats is not None:
+        pushes = expanded + stale + len(pq_f) + len(pq_r)
+        stats.record(clock, expanded, pushes, stale, peak, pushes if use_potentials else 0, relaxed)
+    return path, mu, expanded
 
 #Transfer Count
 
@@ -570,109 +906,118 @@ def run_algorithm(fn, *args):
     t1 = perf_counter()
     return out, (t1 - t0)
 
-def run_one(base: BaseGraph, start_station: Station, goal_station: Station) -> None:
-    sg, start_nodes_set, goal_nodes = build_state_graph(base, start=start_station, goal=goal_station)
-
-    if not start_nodes_set or not goal_nodes:
-        print("  NO PATH (start/goal lines missing)")
-        return
-
-    starts = sorted(list(start_nodes_set))
-
-    
-
-   
-    # BFS
-   
-    (p, expanded), dt = run_algorithm(bfs, sg, starts, goal_nodes)
-    if p:
-        stations = collapse_station_path(p)
-        validate_station_path(stations, start_station, goal_station)
-
-        station_hops = hop_count_stations(stations)
-        state_hops = hop_count_nodes(p)
-        transfers = transfer_count(p)
-        cost = path_cost(sg, p)
-
-        print(
-            f"  BFS : expanded={expanded:4d} | time={dt*1000:8.3f} ms"
-            f" | station_hops={station_hops:3d} | state_hops={state_hops:3d}"
-            f" | transfers={transfers:2d} | cost={cost:7.1f} | {stations}"
-        )
-    else:
-        print(f"  BFS : expanded={expanded:4d} | time={dt*1000:8.3f} ms | NO PATH")
-
-   
-    # DFS
-
-    (p, expanded), dt = run_algorithm(dfs, sg, starts, goal_nodes)
-    if p:
-        stations = collapse_station_path(p)
-        validate_station_path(stations, start_station, goal_station)
-
-        station_hops = hop_count_stations(stations)
-        state_hops = hop_count_nodes(p)
-        transfers = transfer_count(p)
-        cost = path_cost(sg, p)
-
-        print(
-            f"  DFS : expanded={expanded:4d} | time={dt*1000:8.3f} ms"
-            f" | station_hops={station_hops:3d} | state_hops={state_hops:3d}"
-            f" | transfers={transfers:2d} | cost={cost:7.1f} | {stations}"
-        )
-    else:
-        print(f"  DFS : expanded={expanded:4d} | time={dt*1000:8.3f} ms | NO PATH")
-
-  
-    # GBFS
-    
-    (p, expanded), dt = run_algorithm(gbfs, sg, starts, goal_nodes, goal_station, start_station)
-    if p:
-        stations = collapse_station_path(p)
-        validate_station_path(stations, start_station, goal_station)
-
-        station_hops = hop_count_stations(stations)
-        state_hops = hop_count_nodes(p)
-        transfers = transfer_count(p)
-        cost = path_cost(sg, p)
-
-        print(
-            f"  GBFS: expanded={expanded:4d} | time={dt*1000:8.3f} ms"
-            f" | station_hops={station_hops:3d} | state_hops={state_hops:3d}"
-            f" | transfers={transfers:2d} | cost={cost:7.1f} | {stations}"
-        )
-    else:
-        print(f"  GBFS: expanded={expanded:4d} | time={dt*1000:8.3f} ms | NO PATH")
-
-   
-    # A*
-   
-    (p, acost, expanded), dt = run_algorithm(astar, sg, starts, goal_nodes, goal_station, start_station)
-    if p:
-        stations = collapse_station_path(p)
-        validate_station_path(stations, start_station, goal_station)
-
-        station_hops = hop_count_stations(stations)
-        state_hops = hop_count_nodes(p)
-        transfers = transfer_count(p)
-        posthoc = path_cost(sg, p)
-
-        print(
-            f"  A*  : expanded={expanded:4d} | time={dt*1000:8.3f} ms"
-            f" | station_hops={station_hops:3d} | state_hops={state_hops:3d}"
-            f" | transfers={transfers:2d} | cost={acost:7.1f} | posthoc={posthoc:7.1f} | {stations}"
-        )
-    else:
-        print(f"  A*  : expanded={expanded:4d} | time={dt*1000:8.3f} ms | NO PATH")
+SearchResult = Tuple[Optional[List[Node]], Optional[float], int]   # (path, cost or None, expanded)
+
+ALGORITHMS = ("BFS", "DFS", "GBFS", "A*", "BiA*")
+
+def run_search(ctx: NetworkContext, name: str, sg: QueryGraph, starts: List[Node], goals: Set[Node],
+               goal_station: Station, start_station: Station,
+               stats: Optional[SearchStats] = None) -> SearchResult:
+    """Dispatch one search by name; cost is None for the algorithms that do not track it."""
+    if name == "BFS":
+        p, expanded = bfs(sg, starts, goals, stats=stats)
+        return p, None, expanded
+    if name == "DFS":
+        p, expanded = dfs(sg, starts, goals, stats=stats)
+        return p, None, expanded
+    if name == "GBFS":
+        p, expanded = gbfs(ctx, sg, starts, goals, goal_station, start_station, stats=stats)
+        return p, None, expanded
+    if name == "A*":
+        return astar(ctx, sg, starts, goals, goal_station, start_station, stats=stats)
+    if name == "BiA*":
+        return bidirectional_astar(ctx, sg, starts, goals, goal_station, start_station, stats=stats)
+    if name == "BiDijkstra":
+        return bidirectional_astar(ctx, sg, starts, goals, goal_station, start_station,
+                                   use_potentials=False, stats=stats)
+    raise ValueError(f"Unknown algorithm: {name}")
+
+
+class QueryMetrics(NamedTuple):
+    start: Station
+    goal: Station
+    algorithm: str
+    stats: SearchStats
+    stations: Optional[List[Station]]    # None: no path
+    station_hops: int
+    state_hops: int
+    transfers: int
+    cost: Optional[float]                # as reported by the search (None if it does not track cost)
+    posthoc: Optional[float]             # path_cost of the returned path
+
+    def as_dict(self) -> Dict[str, object]:
+        out = {k: getattr(self, k) for k in self._fields if k != "stats"}
+        out.update(self.stats.as_dict())
+        return out
+
+MetricsObserver = Callable[[QueryMetrics], None]
+
+def format_metrics(m: QueryMetrics) -> str:
+    st = m.stats
+    label = f"{m.algorithm:<4}"
+    counters = (f"expanded={st.expanded:4d} | pushes={st.pushes:4d} | stale={st.stale_pops:3d}"
+                f" | peak={st.peak_frontier:3d} | h={st.h_evals:4d} | relaxed={st.relaxed:4d}"
+                f" | time={st.wall_s*1000:8.3f} ms (cpu {st.cpu_s*1000:7.3f})")
+    if m.stations is None:
+        return f"  {label}: {counters} | NO PATH"
+
+    # cost-tracking searches also print the post-hoc sum as a consistency check
+    cost_txt = f"cost={m.posthoc:7.1f}" if m.cost is None else f"cost={m.cost:7.1f} | posthoc={m.posthoc:7.1f}"
+    return (f"  {label}: {counters}"
+            f" | station_hops={m.station_hops:3d} | state_hops={m.state_hops:3d}"
+            f" | transfers={m.transfers:2d} | {cost_txt} | {m.stations}")
+
+def run_one(ctx: NetworkContext, start_station: Station, goal_station: Station,
+            algorithms: Sequence[str] = ALGORITHMS,
+            observer: Optional[MetricsObserver] = None) -> List[QueryMetrics]:
+    """Run every algorithm on one query; each result is handed to observer as it completes."""
+    sg = attach_query(ctx, start_station, goal_station)
+
+    if not sg.start_edges or not sg.goal_edges:
+        return []
+
+    starts = [SUPER_START]
+    goal_nodes = {SUPER_GOAL}
+    out: List[QueryMetrics] = []
+
+    for name in algorithms:
+        stats = SearchStats()
+        p, acost, _ = run_search(ctx, name, sg, starts, goal_nodes, goal_station, start_station, stats=stats)
+        if not p:
+            m = QueryMetrics(start_station, goal_station, name, stats, None, 0, 0, 0, None, None)
+        else:
+            stations = collapse_station_path(p)
+            validate_station_path(stations, start_station, goal_station)
+            m = QueryMetrics(start_station, goal_station, name, stats, stations,
+                             hop_count_stations(stations), hop_count_nodes(p), transfer_count(p),
+                             acost, path_cost(sg, p))
+        out.append(m)
+        if observer is not None:
+            observer(m)
+    return out
 
 
+def run_suite(ctx: NetworkContext, title: str, tests: List[Tuple[Station, Station]],
+              algorithms: Sequence[str] = ALGORITHMS) -> Dict[str, SearchStats]:
+    """Print every query's metrics and return the counters aggregated per algorithm."""
+    print(f"\n=== {title} ===")
+    totals: Dict[str, SearchStats] = {name: SearchStats() for name in algorithms}
 
+    def observe(m: QueryMetrics) -> None:
+        totals[m.algorithm] += m.stats
+        print(format_metrics(m))
 
-def run_suite(base: BaseGraph, title: str, tests: List[Tuple[Station, Station]]) -> None:
-    print(f"\n=== {title} ===")
     for s, g in tests:
         print(f"\n{s} -> {g}")
-        run_one(base, s, g)
+        if not run_one(ctx, s, g, algorithms, observer=observe):
+            print("  NO PATH (start/goal lines missing)")
+
+    print(f"\n--- {title} totals ---")
+    for name, st in totals.items():
+        print(f"  {name:<4}: searches={st.searches} | expanded={st.expanded:5d} | pushes={st.pushes:5d}"
+              f" | stale={st.stale_pops:4d} | peak={st.peak_frontier:3d} | h={st.h_evals:5d}"
+              f" | relaxed={st.relaxed:5d} | time={st.wall_s*1000:8.3f} ms (cpu {st.cpu_s*1000:7.3f})")
+    return totals
 
 # Tests (>=5 per mode)
 
@@ -697,37 +1042,14 @@ TESTS_FUTURE = [
 # Main
 
 def main() -> None:
-    global IS_FUTURE_MODE, COORDS_XY, HEURISTIC_SCALE_MIN_PER_KM
-
-    
     # TODAY MODE
-    
-    IS_FUTURE_MODE = False
-    today_base = build_today_base_graph()
-
-    coords_today = load_coords_from_json("mrt_today_coordinates.json")
-    COORDS_XY = build_xy_coords(coords_today)
+    today = build_network_context(False)
+    run_suite(today, "TODAY MODE", TESTS_TODAY)
 
-    HEURISTIC_SCALE_MIN_PER_KM = compute_safe_minutes_per_km(today_base)
-    run_suite(today_base, "TODAY MODE", TESTS_TODAY)
-
-    
     # FUTURE MODE
-    # IMPORTANT: future graph contains today stations too,
-    # so I  merged coords: today + future (future overrides duplicates)
-    
-    IS_FUTURE_MODE = True
-    future_base = build_future_base_graph()
-
-    coords_future_only = load_coords_from_json("mrt_future_coordinates.json")
-    coords_future_all = dict(coords_today)
-    coords_future_all.update(coords_future_only)
-
-    COORDS_XY = build_xy_coords(coords_future_all)
-    check_missing_coords(future_base, COORDS_XY)
-
-    HEURISTIC_SCALE_MIN_PER_KM = compute_safe_minutes_per_km(future_base)
-    run_suite(future_base, "FUTURE MODE", TESTS_FUTURE)
+    future = build_network_context(True)
+    check_missing_coords(future.base, future.coords_xy)
+    run_suite(future, "FUTURE MODE", TESTS_FUTURE)
 
 if __name__ == "__main__":
     main()
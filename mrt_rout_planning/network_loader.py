@@ -0,0 +1,342 @@
+from __future__ import annotations
+from typing import Any, Dict, List, NamedTuple, Sequence, Set, Tuple
+from time import perf_counter
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Line, BaseGraph, NetworkContext, SUPER_START, SUPER_GOAL
+
+# Data-driven network loader.
+#
+# Instead of hand-written add_undirected_edge calls, the base graph is derived from
+# the station codes already in the coordinate files (NS1, EW4, TE31/DT37, ...) plus
+# a small declarative spec (network_spec.json):
+#   lines           code prefix -> line label (CG -> EWL, CE -> CCL, ...)
+#   branches        prefix whose first station hangs off another code (CG1 next to EW4)
+#   extra_codes     codes for stations the data lists without one (Keppel, Cantonment)
+#   recode          per-mode code renames (future: CG1 -> TE34 for the TEL conversion)
+#   extra_segments  links the code order cannot express
+#   exclude         stations present in the data but not in service in this mode
+#   timing          segment minutes from the straight-line distance
+# Stations with the same prefix are adjacent in code order (gaps such as NS6 are
+# skipped over). Every problem found is collected and raised together as one
+# NetworkSpecError. The result is written as a compiled JSON artifact named after a
+# fingerprint of the spec and the coordinate files, so unchanged data is not
+# re-derived, and can be handed to build_network_context like the hand-coded graph.
+
+SPEC_VERSION = 1
+ARTIFACT_VERSION = 1
+BASE_DIR = os.path.dirname(__file__)
+DEFAULT_SPEC = os.path.join(BASE_DIR, "network_spec.json")
+DEFAULT_OUT_DIR = os.path.join(BASE_DIR, ".compiled")
+
+CODE_RE = re.compile(r"^([A-Z]{2})(\d+)$")
+
+
+class NetworkSpecError(ValueError):
+    def __init__(self, problems: List[str]) -> None:
+        super().__init__(f"{len(problems)} problem(s) in network data:\n  " + "\n  ".join(problems))
+        self.problems = problems
+
+
+class LoadedNetwork(NamedTuple):
+    mode: str
+    base: BaseGraph
+    coords: Dict[Station, Tuple[float, float]]      # (lat, lon), same shape as load_coords_from_json
+    fingerprint: str
+
+
+# Spec
+
+def load_spec(path: str = DEFAULT_SPEC) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    if spec.get("version") != SPEC_VERSION:
+        raise NetworkSpecError([f"{path}: spec version {spec.get('version')}, expected {SPEC_VERSION}"])
+    return spec
+
+def resolve_mode(spec: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    """Top-level settings with the mode's overrides applied (mode keys replace, not merge)."""
+    modes = spec.get("modes", {})
+    if mode not in modes:
+        raise NetworkSpecError([f"unknown mode {mode!r}, spec defines {sorted(modes)}"])
+    merged = {k: v for k, v in spec.items() if k != "modes"}
+    merged.update(modes[mode])
+    return merged
+
+def fingerprint(resolved: Dict[str, Any], data_dir: str) -> str:
+    h = hashlib.sha256()
+    h.update(f"v{ARTIFACT_VERSION}|".encode())
+    h.update(json.dumps(resolved, sort_keys=True).encode())
+    for name in resolved["coordinates"]:
+        with open(os.path.join(data_dir, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+# Building
+
+def read_rows(resolved: Dict[str, Any], data_dir: str) -> List[Dict[str, Any]]:
+    """Station rows of every coordinate file, in file order (later files override earlier ones)."""
+    rows: List[Dict[str, Any]] = []
+    for name in resolved["coordinates"]:
+        with open(os.path.join(data_dir, name), "r", encoding="utf-8") as f:
+            rows.extend(json.load(f))
+    return rows
+
+def _read_stations(resolved: Dict[str, Any], rows: List[Dict[str, Any]], problems: List[str]
+                   ) -> Tuple[Dict[Station, Tuple[float, float]], Dict[Station, List[str]]]:
+    aliases: Dict[str, str] = resolved.get("station_aliases", {})
+    coords: Dict[Station, Tuple[float, float]] = {}
+    codes: Dict[Station, List[str]] = {}
+    for r in rows:
+        st = r["station_name"].strip()
+        st = aliases.get(st, st)
+        coords[st] = (float(r["latitude"]), float(r["longitude"]))
+        raw = (r.get("code") or "").strip()
+        for code in filter(None, raw.split("/")):
+            if code not in codes.setdefault(st, []):
+                codes[st].append(code)
+        codes.setdefault(st, [])
+
+    for st, extra in resolved.get("extra_codes", {}).items():
+        if st not in coords:
+            problems.append(f"extra_codes: {st!r} has no coordinates")
+            continue
+        codes[st].extend(c for c in extra if c not in codes[st])
+
+    recode: Dict[str, str] = resolved.get("recode", {})
+    for st in codes:
+        codes[st] = [recode.get(c, c) for c in codes[st]]
+
+    for st in resolved.get("exclude", []):
+        if st not in coords:
+            problems.append(f"exclude: unknown station {st!r}")
+        coords.pop(st, None)
+        codes.pop(st, None)
+
+    for st, cs in codes.items():
+        if not cs:
+            problems.append(f"{st!r} has no station code (add it to extra_codes or exclude)")
+    return coords, codes
+
+def _segment_minutes(a: Tuple[float, float], b: Tuple[float, float], timing: Dict[str, float]) -> int:
+    d = math.hypot(a[0] - b[0], a[1] - b[1])
+    minutes = d / timing["speed_kmh"] * 60.0 + timing["dwell_min"]
+    return max(int(timing["min_minutes"]), int(round(minutes)))
+
+def build_network(mode: str, spec_path: str = DEFAULT_SPEC) -> LoadedNetwork:
+    """Derive and validate the base graph for one mode; raises NetworkSpecError with every problem."""
+    resolved = resolve_mode(load_spec(spec_path), mode)
+    data_dir = os.path.dirname(os.path.abspath(spec_path))
+    return build_network_from_rows(mode, resolved, read_rows(resolved, data_dir),
+                                   fingerprint(resolved, data_dir))
+
+def build_network_from_rows(mode: str, resolved: Dict[str, Any], rows: List[Dict[str, Any]],
+                            fp: str) -> LoadedNetwork:
+    """Same as build_network for station rows already in memory (e.g. a synthetic network)."""
+    problems: List[str] = []
+    coords, codes = _read_stations(resolved, rows, problems)
+    line_of: Dict[str, Line] = resolved["lines"]
+
+    # prefix -> number -> station
+    by_prefix: Dict[str, Dict[int, Station]] = {}
+    station_of_code: Dict[str, Station] = {}
+    for st in sorted(codes):
+        for code in codes[st]:
+            m = CODE_RE.match(code)
+            if m is None:
+                problems.append(f"{st!r}: malformed station code {code!r}")
+                continue
+            prefix, num = m.group(1), int(m.group(2))
+            if prefix not in line_of:
+                problems.append(f"{st!r}: code {code!r} has no line for prefix {prefix!r}")
+                continue
+            other = station_of_code.get(code)
+            if other is not None and other != st:
+                problems.append(f"code {code!r} used by both {other!r} and {st!r}")
+                continue
+            station_of_code[code] = st
+            by_prefix.setdefault(prefix, {})[num] = st
+
+    segments: List[Tuple[Station, Station, Line]] = []
+    for prefix in sorted(by_prefix):
+        order = [by_prefix[prefix][n] for n in sorted(by_prefix[prefix])]
+        segments.extend((a, b, line_of[prefix]) for a, b in zip(order, order[1:]))
+
+    for prefix, anchor in sorted(resolved.get("branches", {}).items()):
+        if prefix not in by_prefix:
+            continue            # branch not in service in this mode (e.g. CG after the TEL conversion)
+        if anchor not in station_of_code:
+            problems.append(f"branches: {prefix} attaches to unknown code {anchor!r}")
+            continue
+        first = by_prefix[prefix][min(by_prefix[prefix])]
+        segments.append((station_of_code[anchor], first, line_of[prefix]))
+
+    for a, b, line in resolved.get("extra_segments", []):
+        missing = [st for st in (a, b) if st not in coords]
+        if missing:
+            problems.append(f"extra_segments: unknown station(s) {missing} in {a!r} - {b!r}")
+            continue
+        segments.append((a, b, line))
+
+    xy = mrp.build_xy_coords(coords)
+    timing = resolved["timing"]
+    base: BaseGraph = {}
+    seen: Set[Tuple[Station, Station, Line]] = set()
+    for a, b, line in segments:
+        if a == b:
+            problems.append(f"{line}: segment from {a!r} to itself")
+            continue
+        key = (min(a, b), max(a, b), line)
+        if key in seen:
+            continue
+        seen.add(key)
+        mrp.add_undirected_edge(base, a, b, _segment_minutes(xy[a], xy[b], timing), line)
+
+    for st in sorted(coords):
+        if st not in base:
+            problems.append(f"{st!r} has coordinates but no line segment")
+    problems.extend(_connectivity_problems(base))
+
+    if problems:
+        raise NetworkSpecError(problems)
+    return LoadedNetwork(mode, base, {st: coords[st] for st in sorted(base)}, fp)
+
+def _connectivity_problems(base: BaseGraph) -> List[str]:
+    components: List[List[Station]] = []
+    seen: Set[Station] = set()
+    for root in sorted(base):
+        if root in seen:
+            continue
+        comp, stack = [], [root]
+        seen.add(root)
+        while stack:
+            u = stack.pop()
+            comp.append(u)
+            for v, _, _ in base[u]:
+                if v not in seen:
+                    seen.add(v)
+                    stack.append(v)
+        components.append(sorted(comp))
+    if len(components) <= 1:
+        return []
+    components.sort(key=len, reverse=True)
+    return [f"network is split: {len(comp)} station(s) {comp[:4]} not connected to the main network"
+            for comp in components[1:]]
+
+
+# Compiled artifact
+
+def artifact_path(mode: str, fp: str, out_dir: str = DEFAULT_OUT_DIR) -> str:
+    return os.path.join(out_dir, f"{mode}-{fp}.network.json")
+
+def save_network(net: LoadedNetwork, out_dir: str = DEFAULT_OUT_DIR) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    edges = sorted((u, v, m, line) for u, es in net.base.items() for v, m, line in es if u < v)
+    path = artifact_path(net.mode, net.fingerprint, out_dir)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": ARTIFACT_VERSION, "mode": net.mode, "fingerprint": net.fingerprint,
+                   "coords": net.coords, "edges": edges}, f, indent=0)
+    return path
+
+def load_compiled_network(path: str) -> LoadedNetwork:
+    with open(path, "r", encoding="utf-8") as f:
+        art = json.load(f)
+    if art.get("version") != ARTIFACT_VERSION:
+        raise ValueError(f"{path}: artifact v{art.get('version')}, expected v{ARTIFACT_VERSION}")
+    base: BaseGraph = {}
+    for a, b, minutes, line in art["edges"]:
+        mrp.add_undirected_edge(base, a, b, minutes, line)
+    coords = {st: (lat, lon) for st, (lat, lon) in art["coords"].items()}
+    return LoadedNetwork(art["mode"], base, coords, art["fingerprint"])
+
+def load_network(mode: str, spec_path: str = DEFAULT_SPEC, out_dir: str = DEFAULT_OUT_DIR,
+                 rebuild: bool = False) -> Tuple[LoadedNetwork, bool]:
+    """(network, loaded_from_artifact): reuse the compiled artifact while the source data is unchanged."""
+    resolved = resolve_mode(load_spec(spec_path), mode)
+    fp = fingerprint(resolved, os.path.dirname(os.path.abspath(spec_path)))
+    path = artifact_path(mode, fp, out_dir)
+    if not rebuild and os.path.exists(path):
+        return load_compiled_network(path), True
+    net = build_network(mode, spec_path)
+    save_network(net, out_dir)
+    return net, False
+
+def build_loaded_context(mode: str, spec_path: str = DEFAULT_SPEC,
+                         out_dir: str = DEFAULT_OUT_DIR) -> NetworkContext:
+    net, _ = load_network(mode, spec_path, out_dir)
+    return mrp.build_network_context(mode == "future", base=net.base, coords=net.coords)
+
+
+# Report: coverage of the hand-coded graph + how each algorithm scales with size
+
+def _segments(base: BaseGraph) -> Set[Tuple[Station, Station, Line]]:
+    return {(u, v, line) for u, es in base.items() for v, _, line in es if u < v}
+
+def scaling_report(contexts: Sequence[Tuple[str, NetworkContext]], pairs: int, seed: int = 7) -> None:
+    print(f"\n{'network':<18} {'stations':>8} {'nodes':>6}  " +
+          "  ".join(f"{name + ' ms':>9} {'exp':>6}" for name in mrp.ALGORITHMS))
+    for label, ctx in contexts:
+        rnd = random.Random(seed)
+        stations = sorted(ctx.state.lines)
+        sample = [tuple(rnd.sample(stations, 2)) for _ in range(pairs)]
+        times = {name: 0.0 for name in mrp.ALGORITHMS}
+        expanded = {name: 0 for name in mrp.ALGORITHMS}
+        for s, t in sample:
+            sg = mrp.attach_query(ctx, s, t)
+            costs = []
+            for name in mrp.ALGORITHMS:
+                (p, cost, exp), dt = mrp.run_algorithm(mrp.run_search, ctx, name, sg, [SUPER_START],
+                                                       {SUPER_GOAL}, t, s)
+                times[name] += dt
+                expanded[name] += exp
+                if cost is not None:
+                    costs.append(cost)
+            if max(costs) - min(costs) > 1e-9:
+                raise RuntimeError(f"{label}: optimal searches disagree on {s} -> {t}: {costs}")
+        print(f"{label:<18} {len(stations):>8} {len(ctx.state.adj):>6}  " +
+              "  ".join(f"{times[n] / pairs * 1000:>9.3f} {expanded[n] / pairs:>6.0f}" for n in mrp.ALGORITHMS))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Build, validate and compile networks from station-code data.")
+    ap.add_argument("--spec", default=DEFAULT_SPEC)
+    ap.add_argument("--out-dir", default=DEFAULT_OUT_DIR)
+    ap.add_argument("--mode", choices=("today", "future", "both"), default="both")
+    ap.add_argument("--rebuild", action="store_true", help="ignore any compiled artifact")
+    ap.add_argument("--pairs", type=int, default=200, help="random OD pairs per network for the scaling table")
+    args = ap.parse_args()
+
+    modes = ("today", "future") if args.mode == "both" else (args.mode,)
+    contexts: List[Tuple[str, NetworkContext]] = []
+    for mode in modes:
+        t0 = perf_counter()
+        net, cached = load_network(mode, args.spec, args.out_dir, args.rebuild)
+        dt = perf_counter() - t0
+        segs = _segments(net.base)
+        lines = sorted({line for _, _, line in segs})
+        print(f"\n=== {mode.upper()} === {len(net.base)} stations, {len(segs)} segments, lines={lines}"
+              f" | {'artifact loaded' if cached else 'built + compiled'} in {dt * 1000:.1f} ms"
+              f" -> {artifact_path(mode, net.fingerprint, args.out_dir)}")
+
+        hand = mrp.build_network_context(mode == "future")
+        missing_st = sorted(set(hand.base) - set(net.base))
+        hand_links = {(u, v) for u, v, _ in _segments(hand.base)}
+        loaded_links = {(u, v) for u, v, _ in segs}
+        print(f"  hand-coded graph: {len(hand.base)} stations ({len(missing_st)} missing here {missing_st[:5]}),"
+              f" {len(hand_links - loaded_links)} of {len(hand_links)} links not in the data-driven graph")
+
+        contexts.append((f"{mode} hand-coded", hand))
+        contexts.append((f"{mode} full", mrp.build_network_context(mode == "future", base=net.base,
+                                                                 coords=net.coords)))
+    scaling_report(contexts, args.pairs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple, Optional
+from collections import OrderedDict
+from time import perf_counter
+import argparse
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Node, NetworkContext, SUPER_START, SUPER_GOAL
+from csr_graph import CSRGraph, compile_csr, csr_one_to_all
+
+# All-pairs station -> station travel costs with a persistent on-disk cache.
+#
+# One-to-all Dijkstra from every station over the CSR state graph, stored as:
+#   cost[s, t]       float64  best cost incl. boarding at s and alighting at t (inf = unreachable)
+#   transfers[s, t]  int16    line changes on that route
+#   exit_node[s, t]  int32    goal line node the route alights from (-1 = unreachable)
+#   pred[s, u]       int32    predecessor of state node u in the tree rooted at s (-1 root, -2 unreached)
+# A lookup is then a walk up pred[s] from exit_node[s, t]: O(path length). The walk
+# runs over plain lists (node names built at load, the pred / exit_node / cost /
+# transfers rows of s converted on the first lookup from s and kept in a small LRU of
+# ROW_CACHE_ORIGINS origins), never over memmap scalars.
+#
+# Each matrix is a .npy file memory-mapped on load. The cache directory name
+# carries a fingerprint of every costed edge of ctx.state plus the per-station
+# crowding, so editing build_today_base_graph/build_future_base_graph, the crowding
+# tables or transfer_penalty lands in a new directory and the stale one is never read.
+# The fingerprint reads the context's state graph directly (one pass over its edges);
+# the CSR graph is only compiled on a cache miss.
+
+FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".od_cache")
+ROW_CACHE_ORIGINS = 64             # origins whose rows are kept as lists
+
+
+def network_fingerprint(ctx: NetworkContext) -> str:
+    h = hashlib.sha256()
+    h.update(f"v{FORMAT_VERSION}|{ctx.mode}".encode())
+    adj = ctx.state.adj
+    for u in sorted(adj):
+        h.update(f"|{u[0]}\0{u[1]}".encode())
+        for (vst, vln), c in sorted(adj[u]):
+            h.update(f">{vst}\0{vln}".encode())
+            h.update(struct.pack("<d", c))
+    for st in sorted(ctx.state.lines):
+        h.update(f"#{st}".encode())
+        h.update(struct.pack("<d", mrp.crowd_value(ctx, st)))
+    return h.hexdigest()[:16]
+
+
+class ODMatrix:
+    """Precomputed station x station routing tables (arrays may be np.memmap views)."""
+
+    def __init__(self, stations: List[Station], lines: List[str],
+                 node_station: np.ndarray, node_line: np.ndarray,
+                 cost: np.ndarray, transfers: np.ndarray,
+                 exit_node: np.ndarray, pred: np.ndarray) -> None:
+        self.stations = stations
+        self.lines = lines
+        self.station_id: Dict[Station, int] = {st: i for i, st in enumerate(stations)}
+        self.node_station = node_station
+        self.node_line = node_line
+        self.cost = cost
+        self.transfers = transfers
+        self.exit_node = exit_node
+        self.pred = pred
+        self._nodes: List[Node] = [(stations[s], lines[l])
+                                   for s, l in zip(node_station.tolist(), node_line.tolist())]
+        self._rows: "OrderedDict[int, Tuple[List[int], List[int], List[float], List[int]]]" = OrderedDict()
+
+    def node(self, u: int) -> Node:
+        return self._nodes[u]
+
+    def rows(self, s: int) -> Tuple[List[int], List[int], List[float], List[int]]:
+        """(pred, exit_node, cost, transfers) rows of origin s as lists, LRU of ROW_CACHE_ORIGINS origins."""
+        r = self._rows.get(s)
+        if r is not None:
+            self._rows.move_to_end(s)
+            return r
+        r = self._rows[s] = (self.pred[s].tolist(), self.exit_node[s].tolist(),
+                             self.cost[s].tolist(), self.transfers[s].tolist())
+        if len(self._rows) > ROW_CACHE_ORIGINS:
+            self._rows.popitem(last=False)
+        return r
+
+    def lookup(self, start: Station, goal: Station) -> Tuple[Optional[List[Node]], float, int]:
+        """(node_path, cost, transfers) for start -> goal, same Node path shape as astar."""
+        s = self.station_id.get(start)
+        t = self.station_id.get(goal)
+        if s is None or t is None:
+            return None, float("inf"), 0
+        tree, exits, cost, transfers = self.rows(s)
+        u = exits[t]
+        if u < 0:
+            return None, float("inf"), 0
+
+        nodes = self._nodes
+        path: List[Node] = [SUPER_GOAL]
+        while u >= 0:
+            path.append(nodes[u])
+            u = tree[u]
+        path.append(SUPER_START)
+        path.reverse()
+        return path, cost[t], transfers[t]
+
+
+def build_od_matrix(g: CSRGraph) -> ODMatrix:
+    n_st, n = len(g.stations), g.n_nodes
+    node_station = np.frombuffer(g.node_station, dtype=np.int32).copy()
+    node_line = np.frombuffer(g.node_line, dtype=np.int32).copy()
+
+    cost = np.full((n_st, n_st), np.inf, dtype=np.float64)
+    transfers = np.zeros((n_st, n_st), dtype=np.int16)
+    exit_node = np.full((n_st, n_st), -1, dtype=np.int32)
+    pred = np.empty((n_st, n), dtype=np.int32)
+    alight = np.frombuffer(g.crowd, dtype=np.float64)
+
+    for s in range(n_st):
+        dist, parent, order = csr_one_to_all(g, s)
+        pred[s] = np.frombuffer(parent, dtype=np.int32)
+
+        # line changes along the tree, filled in settle order so the parent is always done
+        xfer = np.zeros(n, dtype=np.int16)
+        for u in order:
+            p = parent[u]
+            if p >= 0:
+                xfer[u] = xfer[p] + (node_station[u] == node_station[p] and node_line[u] != node_line[p])
+
+        # best line node per destination station (ties: lowest node id, matching settle order)
+        d = np.frombuffer(dist, dtype=np.float64)
+        best = np.full(n_st, np.inf)
+        np.minimum.at(best, node_station, d)
+        for u in order:
+            t = node_station[u]
+            if exit_node[s, t] < 0 and d[u] == best[t]:
+                exit_node[s, t] = u
+        reached = exit_node[s] >= 0
+        cost[s, reached] = best[reached] + alight[reached]
+        transfers[s, reached] = xfer[exit_node[s, reached]]
+
+    return ODMatrix(list(g.stations), list(g.lines), node_station, node_line,
+                    cost, transfers, exit_node, pred)
+
+
+_ARRAYS = ("node_station", "node_line", "cost", "transfers", "exit_node", "pred")
+
+def save_od_matrix(od: ODMatrix, path: str) -> None:
+    os.makedirs(path, exist_ok=True)
+    for name in _ARRAYS:
+        np.save(os.path.join(path, f"{name}.npy"), getattr(od, name))
+    # meta.json is written last: its presence marks the directory as complete
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": FORMAT_VERSION, "stations": od.stations, "lines": od.lines}, f)
+
+def load_od_matrix(path: str) -> Optional[ODMatrix]:
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != FORMAT_VERSION:
+        return None
+    # plain ndarray views of the maps: same pages, without np.memmap's per-slice overhead
+    arrays = {name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")) for name in _ARRAYS}
+    return ODMatrix(meta["stations"], meta["lines"], **arrays)
+
+def load_or_build(ctx: NetworkContext, cache_dir: str = DEFAULT_CACHE_DIR,
+                  rebuild: bool = False) -> Tuple[ODMatrix, bool]:
+    """Return (matrix, loaded_from_cache) for the context's mode."""
+    path = os.path.join(cache_dir, f"{ctx.mode}-{network_fingerprint(ctx)}")
+    if not rebuild:
+        od = load_od_matrix(path)
+        if od is not None:
+            return od, True
+    save_od_matrix(build_od_matrix(compile_csr(ctx)), path)
+    od = load_od_matrix(path)
+    assert od is not None
+    return od, False
+
+
+def run_lookup_suite(ctx: NetworkContext, tests: List[Tuple[Station, Station]],
+                     cache_dir: str, rebuild: bool) -> None:
+    t0 = perf_counter()
+    od, cached = load_or_build(ctx, cache_dir, rebuild)
+    dt = perf_counter() - t0
+    n_st = len(od.stations)
+    print(f"\n=== {ctx.mode.upper()} MODE === {n_st}x{n_st} matrix"
+          f" {'loaded (mmap)' if cached else 'built'} in {dt*1000:.1f} ms")
+
+    for s, t in tests:
+        t0 = perf_counter()
+        p, cost, transfers = od.lookup(s, t)
+        dt = perf_counter() - t0
+        if p is None:
+            print(f"  {s} -> {t}: NO PATH")
+            continue
+        qg = mrp.attach_query(ctx, s, t)
+        _, acost, _ = mrp.astar(ctx, qg, [SUPER_START], {SUPER_GOAL}, t, s)
+        if abs(acost - cost) > 1e-9 or mrp.transfer_count(p) != transfers:
+            raise RuntimeError(f"OD matrix disagrees with A* on {s} -> {t}: {cost} vs {acost}")
+        stations = mrp.collapse_station_path(p)
+        print(f"  {s} -> {t}: lookup={dt*1e6:6.1f} us | transfers={transfers:2d}"
+              f" | cost={cost:7.1f} | {stations}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Precompute / query the all-pairs OD matrix.")
+    ap.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    ap.add_argument("--rebuild", action="store_true", help="ignore any cached matrix")
+    args = ap.parse_args()
+
+    run_lookup_suite(mrp.build_network_context(False), mrp.TESTS_TODAY, args.cache_dir, args.rebuild)
+    run_lookup_suite(mrp.build_network_context(True), mrp.TESTS_FUTURE, args.cache_dir, args.rebuild)
+
+if __name__ == "__main__":
+    main()
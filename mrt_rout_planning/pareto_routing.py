@@ -0,0 +1,215 @@
+from __future__ import annotations
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from time import perf_counter
+import argparse
+import heapq
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Node, NetworkContext, QueryGraph, ReverseQueryGraph, SUPER_START, SUPER_GOAL
+
+# Multi-criteria (Pareto) routing over the state graph.
+#
+# astar minimises one scalar: ride minutes + transfer_penalty + crowd_value. Here the
+# three parts are kept apart on every label:
+#   time       ride minutes + transfer_penalty
+#   transfers  line changes
+#   crowd      crowd_value at boarding, alighting and every interchange
+# so time + crowd is exactly astar's cost and the scalar optimum is always on the front.
+#
+# Label-setting search: labels are popped in lexicographic order of (component + lower
+# bound), each node keeps a bag of mutually non-dominated labels, and a label is dropped
+# as soon as it, extended by the per-criterion lower bounds to the goal, is dominated by
+# a route already found (target pruning). Lower bounds come from three reverse
+# Dijkstras from __GOAL__, one per criterion. Bags are capped at max_labels; a new label
+# first evicts the labels it dominates, and if the bag is still full it replaces the
+# label with the highest scalar cost (or is dropped if it is itself the worst), so the
+# front may be incomplete but a bag never keeps a dominated label.
+
+INF = float("inf")
+
+Costs = Tuple[float, int, float]            # (time, transfers, crowd)
+
+
+class ParetoRoute(NamedTuple):
+    path: List[Node]
+    time: float
+    transfers: int
+    crowd: float
+
+    @property
+    def cost(self) -> float:
+        """The scalar astar cost of this route."""
+        return self.time + self.crowd
+
+
+class _Label:
+    __slots__ = ("node", "time", "transfers", "crowd", "parent", "dead")
+
+    def __init__(self, node: Node, time: float, transfers: int, crowd: float,
+                 parent: Optional["_Label"]) -> None:
+        self.node = node
+        self.time = time
+        self.transfers = transfers
+        self.crowd = crowd
+        self.parent = parent
+        self.dead = False
+
+    def dominated_by(self, time: float, transfers: int, crowd: float) -> bool:
+        return time <= self.time and transfers <= self.transfers and crowd <= self.crowd
+
+
+def _rank(label: _Label) -> Tuple[float, int, float]:
+    """Which label a full bag gives up first: highest astar cost, then most transfers."""
+    return (label.time + label.crowd, label.transfers, label.time)
+
+
+def edge_components(ctx: NetworkContext, u: Node, v: Node, cost: float) -> Costs:
+    """Split one query-graph edge u -> v into (time, transfers, crowd)."""
+    if u == SUPER_START or v == SUPER_GOAL:
+        return 0.0, 0, cost                         # boarding / alighting crowd
+    if u[0] == v[0]:
+        return float(mrp.transfer_penalty(ctx, u[0])), 1, float(mrp.crowd_value(ctx, u[0]))
+    return cost, 0, 0.0
+
+
+def lower_bounds(ctx: NetworkContext, graph: QueryGraph) -> Dict[Node, Costs]:
+    """Independent per-criterion distances to __GOAL__ (each one a valid lower bound)."""
+    rq = ReverseQueryGraph(graph)
+    per: List[Dict[Node, float]] = []
+    for k in range(3):
+        dist: Dict[Node, float] = {SUPER_GOAL: 0.0}
+        pq: List[Tuple[float, Node]] = [(0.0, SUPER_GOAL)]
+        while pq:
+            d, v = heapq.heappop(pq)
+            if d != dist[v]:
+                continue
+            for u, c in rq.get(v, []) or []:
+                nd = d + edge_components(ctx, u, v, c)[k]
+                if nd < dist.get(u, INF):
+                    dist[u] = nd
+                    heapq.heappush(pq, (nd, u))
+        per.append(dist)
+    t, x, c = per
+    return {n: (t[n], int(x[n]), c[n]) for n in t}
+
+
+def pareto_routes(ctx: NetworkContext, start: Station, goal: Station,
+                  max_labels: int = 16) -> Tuple[List[ParetoRoute], int]:
+    """Pareto front of start -> goal routes, sorted by time; also returns labels settled."""
+    graph = mrp.attach_query(ctx, start, goal)
+    lb = lower_bounds(ctx, graph)
+    if SUPER_START not in lb:
+        return [], 0
+
+    bags: Dict[Node, List[_Label]] = {}
+    target: List[_Label] = []
+    pq: List[Tuple[Costs, int, _Label]] = []
+    tie = 0
+
+    def pruned_by_target(time: float, transfers: int, crowd: float, node: Node) -> bool:
+        bt, bx, bc = lb[node]
+        return any(t.time <= time + bt and t.transfers <= transfers + bx and t.crowd <= crowd + bc
+                   for t in target)
+
+    def push(node: Node, time: float, transfers: int, crowd: float, parent: Optional[_Label]) -> None:
+        nonlocal tie
+        if node not in lb or pruned_by_target(time, transfers, crowd, node):
+            return
+        bag = bags.setdefault(node, [])
+        for other in bag:
+            if other.time <= time and other.transfers <= transfers and other.crowd <= crowd:
+                return
+        keep = [other for other in bag if not other.dominated_by(time, transfers, crowd)]
+        if len(keep) >= max_labels:
+            # full and nothing dominated (bags never exceed the cap): the scalar-worst goes
+            worst = max(keep, key=_rank)
+            if _rank(worst) <= (time + crowd, transfers, time):
+                return
+            keep.remove(worst)
+            worst.dead = True
+        for other in bag:
+            if other.dominated_by(time, transfers, crowd):
+                other.dead = True
+        label = _Label(node, time, transfers, crowd, parent)
+        keep.append(label)
+        bags[node] = keep
+        bt, bx, bc = lb[node]
+        heapq.heappush(pq, ((time + bt, transfers + bx, crowd + bc), tie, label))
+        tie += 1
+
+    push(SUPER_START, 0.0, 0, 0.0, None)
+    settled = 0
+    while pq:
+        _, _, label = heapq.heappop(pq)
+        if label.dead:
+            continue
+        u = label.node
+        if u == SUPER_GOAL:
+            target.append(label)
+            continue
+        if pruned_by_target(label.time, label.transfers, label.crowd, u):
+            continue
+        settled += 1
+        for v, c in graph.get(u, []) or []:
+            dt, dx, dc = edge_components(ctx, u, v, c)
+            push(v, label.time + dt, label.transfers + dx, label.crowd + dc, label)
+
+    routes: List[ParetoRoute] = []
+    for label in target:
+        if label.dead:
+            continue
+        path: List[Node] = []
+        cur: Optional[_Label] = label
+        while cur is not None:
+            path.append(cur.node)
+            cur = cur.parent
+        path.reverse()
+        routes.append(ParetoRoute(path, label.time, label.transfers, label.crowd))
+    routes.sort(key=lambda r: (r.time, r.transfers, r.crowd))
+    return routes, settled
+
+
+# Report: fronts for the test suites + interactive latency over every OD pair
+
+def run_suite(ctx: NetworkContext, title: str, tests: List[Tuple[Station, Station]], max_labels: int) -> None:
+    print(f"\n=== {title} === max_labels={max_labels}")
+    for s, t in tests:
+        t0 = perf_counter()
+        front, settled = pareto_routes(ctx, s, t, max_labels)
+        dt = perf_counter() - t0
+        print(f"\n{s} -> {t}: {len(front)} Pareto routes | settled={settled} | {dt * 1000:.2f} ms")
+        for r in front:
+            print(f"  time={r.time:5.1f} | transfers={r.transfers:2d} | crowd={r.crowd:4.1f}"
+                  f" | cost={r.cost:5.1f} | {mrp.collapse_station_path(r.path)}")
+
+    stations = sorted(ctx.state.lines)
+    times: List[float] = []
+    sizes = 0
+    for s in stations:
+        for t in stations:
+            if s == t:
+                continue
+            t0 = perf_counter()
+            front, _ = pareto_routes(ctx, s, t, max_labels)
+            times.append(perf_counter() - t0)
+            sizes += len(front)
+            qg = mrp.attach_query(ctx, s, t)
+            _, best, _ = mrp.astar(ctx, qg, [SUPER_START], {SUPER_GOAL}, t, s)
+            if not front or abs(min(r.cost for r in front) - best) > 1e-9:
+                raise RuntimeError(f"Pareto front misses the A* optimum on {s} -> {t}")
+    times.sort()
+    print(f"\n  all {len(times)} OD pairs: mean front={sizes / len(times):.2f}"
+          f" | mean={sum(times) / len(times) * 1000:.2f} ms"
+          f" | p95={times[int(0.95 * (len(times) - 1))] * 1000:.2f} ms | max={times[-1] * 1000:.2f} ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Pareto routes over (time, transfers, crowd).")
+    ap.add_argument("--max-labels", type=int, default=16, help="bag size cap per state node")
+    args = ap.parse_args()
+
+    run_suite(mrp.build_network_context(False), "TODAY MODE", mrp.TESTS_TODAY, args.max_labels)
+    run_suite(mrp.build_network_context(True), "FUTURE MODE", mrp.TESTS_FUTURE, args.max_labels)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+from __future__ import annotations
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from array import array
+from time import perf_counter
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+import mrt_route_planning as mrp
+from csr_graph import CSRGraph, compile_csr, csr_astar
+
+# Binary network snapshot for cold starts.
+#
+# A worker normally runs the graph builders, parses both coordinate JSON files,
+# projects them with build_xy_coords, computes compute_safe_minutes_per_km, builds the
+# state graph and compiles it to CSR. A snapshot stores the end product of all of
+# that - the CSRGraph - in one file:
+#
+#   header   magic, format version, byte order, mode flag, heuristic scale,
+#            source fingerprint, number of sections
+#   table    one (name, typecode, offset, count) entry per section
+#   sections station / line name tables (UTF-8, newline separated) and every CSR
+#            array (adjacency, station -> nodes, crowding, projected XY), each
+#            8-byte aligned
+#
+# load_snapshot maps the file with mmap and hands out memoryview casts of the array
+# sections, so nothing is parsed or copied except the two name tables (decoded, plus
+# their name -> id dicts); the arrays are paged in on first touch. The only per-node
+# work left is lazy: the (station, line) -> id map on first access (not used by the
+# csr_* searches) and a node_station list on the first csr_astar / csr_gbfs call,
+# which slice targets / costs instead of building compile_csr's per-node edge tuples.
+# The source fingerprint hashes the Python builders and the coordinate / spec files,
+# so `python snapshot.py build` regenerates exactly when the source data changed.
+
+MAGIC = b"MRTSNAP\0"
+FORMAT_VERSION = 1
+BASE_DIR = os.path.dirname(__file__)
+DEFAULT_SNAPSHOT_DIR = os.path.join(BASE_DIR, ".snapshots")
+
+_HEADER = struct.Struct("<8sHBBd16sI")          # magic, version, little_endian, is_future, scale, source, n_sections
+_ENTRY = struct.Struct("<8s1s7xQQ")             # name, typecode, offset, count
+
+# (section name, CSRGraph attribute, typecode)
+_ARRAYS: Tuple[Tuple[str, str, str], ...] = (
+    ("nstation", "node_station", "i"),
+    ("nline", "node_line", "i"),
+    ("offsets", "offsets", "i"),
+    ("targets", "targets", "i"),
+    ("costs", "costs", "d"),
+    ("stoffs", "station_offsets", "i"),
+    ("stnodes", "station_nodes", "i"),
+    ("crowd", "crowd", "d"),
+    ("xs", "xs", "d"),
+    ("ys", "ys", "d"),
+    ("hasxy", "has_xy", "b"),
+)
+
+SOURCES = ("hand", "data")      # hand-coded builders or network_loader's data-driven graph
+
+
+class SnapshotInfo(NamedTuple):
+    version: int
+    is_future: bool
+    scale: float
+    source: str
+    sections: Dict[str, Tuple[str, int, int]]      # name -> (typecode, offset, count)
+
+
+def source_files(source: str) -> List[str]:
+    names = ["mrt_route_planning.py", "csr_graph.py", "mrt_today_coordinates.json", "mrt_future_coordinates.json"]
+    if source == "data":
+        names += ["network_loader.py", "network_spec.json"]
+    return [os.path.join(BASE_DIR, n) for n in names]
+
+def source_fingerprint(source: str, future: bool) -> str:
+    h = hashlib.sha256()
+    h.update(f"v{FORMAT_VERSION}|{source}|{'future' if future else 'today'}".encode())
+    for path in source_files(source):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+def snapshot_path(future: bool, source: str = "hand", out_dir: str = DEFAULT_SNAPSHOT_DIR) -> str:
+    return os.path.join(out_dir, f"{'future' if future else 'today'}-{source}.snap")
+
+
+# Writing
+
+def _pad(n: int) -> int:
+    return (n + 7) & ~7
+
+def write_snapshot(g: CSRGraph, future: bool, path: str, source_fp: str) -> int:
+    """Write g to path (atomically via a temp file); returns the file size in bytes."""
+    for name in list(g.stations) + list(g.lines):
+        if "\n" in name:
+            raise ValueError(f"name {name!r} cannot be stored in a snapshot name table")
+
+    # count is in items of typecode, i.e. bytes for the name tables
+    names = ["\n".join(g.stations).encode("utf-8"), "\n".join(g.lines).encode("utf-8")]
+    blobs: List[Tuple[str, str, bytes, int]] = [
+        ("stations", "B", names[0], len(names[0])),
+        ("lines", "B", names[1], len(names[1])),
+    ]
+    for name, attr, typecode in _ARRAYS:
+        arr = array(typecode, getattr(g, attr))
+        blobs.append((name, typecode, arr.tobytes(), len(arr)))
+
+    offset = _pad(_HEADER.size + _ENTRY.size * len(blobs))
+    entries: List[bytes] = []
+    for name, typecode, data, count in blobs:
+        entries.append(_ENTRY.pack(name.encode(), typecode.encode(), offset, count))
+        offset = _pad(offset + len(data))
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder == "little", future,
+                          g.scale, source_fp.encode(), len(blobs))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(b"".join(entries))
+        for _, _, data, _ in blobs:
+            f.write(b"\0" * (_pad(f.tell()) - f.tell()))
+            f.write(data)
+        size = f.tell()
+    os.replace(tmp, path)
+    return size
+
+
+# Loading
+
+def read_info(view: memoryview) -> SnapshotInfo:
+    magic, version, little, future, scale, source, n = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError("not a network snapshot")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"snapshot format v{version}, expected v{FORMAT_VERSION}")
+    if bool(little) != (sys.byteorder == "little"):
+        raise ValueError("snapshot was written on a machine with the other byte order")
+    sections: Dict[str, Tuple[str, int, int]] = {}
+    for i in range(n):
+        name, typecode, offset, count = _ENTRY.unpack_from(view, _HEADER.size + i * _ENTRY.size)
+        sections[name.rstrip(b"\0").decode()] = (typecode.decode(), offset, count)
+    return SnapshotInfo(version, bool(future), scale, source.decode(), sections)
+
+def load_snapshot(path: str, expect_source: Optional[str] = None) -> CSRGraph:
+    """
+    Map a snapshot and return a CSRGraph whose arrays are read-only views into the file.
+    expect_source: a source_fingerprint the snapshot must match (stale snapshots raise).
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mm)
+    info = read_info(view)
+    if expect_source is not None and info.source != expect_source:
+        raise ValueError(f"{path}: snapshot is stale (source {info.source}, expected {expect_source})")
+
+    def section(name: str) -> memoryview:
+        typecode, offset, count = info.sections[name]
+        raw = view[offset:offset + count * array(typecode).itemsize]
+        return raw if typecode == "B" else raw.cast(typecode)
+
+    g = CSRGraph()
+    g.scale = info.scale
+    # the name tables are the only thing decoded
+    for attr in ("stations", "lines"):
+        text = bytes(section(attr)).decode("utf-8")
+        setattr(g, attr, text.split("\n") if text else [])
+    for name, attr, _ in _ARRAYS:
+        setattr(g, attr, section(name))
+
+    # name -> id lookups come with the name tables; the O(nodes) node_id map is only
+    # built if something asks for it (disruption_sweep, alt_heuristic), never by csr_* searches
+    g.station_id = {st: i for i, st in enumerate(g.stations)}
+    g.line_id = {ln: i for i, ln in enumerate(g.lines)}
+    g.node_id = None
+    return g
+
+def read_file_info(path: str) -> SnapshotInfo:
+    with open(path, "rb") as f:
+        return read_info(memoryview(f.read(_HEADER.size + 64 * _ENTRY.size)))
+
+
+def _context(source: str, future: bool) -> mrp.NetworkContext:
+    if source == "data":
+        import network_loader
+        return network_loader.build_loaded_context("future" if future else "today")
+    return mrp.build_network_context(future)
+
+def regenerate(source: str = "hand", out_dir: str = DEFAULT_SNAPSHOT_DIR) -> List[Tuple[str, int]]:
+    """Rebuild both mode snapshots from source data; returns (path, bytes) per snapshot."""
+    out: List[Tuple[str, int]] = []
+    for future in (False, True):
+        ctx = _context(source, future)
+        path = snapshot_path(future, source, out_dir)
+        size = write_snapshot(compile_csr(ctx), future, path, source_fingerprint(source, future))
+        out.append((path, size))
+    return out
+
+
+# Cold start comparison: builders + compile vs mmap load, checked on every OD pair
+
+def bench(source: str, out_dir: str) -> None:
+    for future in (False, True):
+        path = snapshot_path(future, source, out_dir)
+        fp = source_fingerprint(source, future)
+        if not os.path.exists(path) or read_file_info(path).source != fp:
+            regenerate(source, out_dir)
+
+        t0 = perf_counter()
+        built = compile_csr(_context(source, future))
+        t1 = perf_counter()
+        snap = load_snapshot(path, expect_source=fp)
+        t2 = perf_counter()
+
+        for s in built.stations:
+            for t in built.stations:
+                a = csr_astar(built, s, t)
+                b = csr_astar(snap, s, t)
+                if a[:2] != b[:2]:
+                    raise RuntimeError(f"snapshot route differs on {s} -> {t}")
+        print(f"{'FUTURE' if future else 'TODAY':<6} {source}: build+compile={(t1 - t0) * 1000:7.2f} ms"
+              f" | mmap load={(t2 - t1) * 1000:6.2f} ms | {os.path.getsize(path)} bytes"
+              f" | {len(built.stations) ** 2} OD pairs identical")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Write / inspect / benchmark binary network snapshots.")
+    ap.add_argument("command", choices=("build", "info", "bench"), nargs="?", default="bench")
+    ap.add_argument("--source", choices=SOURCES, default="hand")
+    ap.add_argument("--out-dir", default=DEFAULT_SNAPSHOT_DIR)
+    args = ap.parse_args()
+
+    if args.command == "build":
+        for path, size in regenerate(args.source, args.out_dir):
+            print(f"wrote {path} ({size} bytes)")
+    elif args.command == "info":
+        for future in (False, True):
+            path = snapshot_path(future, args.source, args.out_dir)
+            info = read_file_info(path)
+            fresh = info.source == source_fingerprint(args.source, future)
+            print(f"{path}: v{info.version} scale={info.scale:.4f} source={info.source}"
+                  f" ({'current' if fresh else 'STALE'})")
+            for name, (typecode, offset, count) in info.sections.items():
+                print(f"  {name:<9} {typecode} offset={offset:7d} count={count}")
+    else:
+        bench(args.source, args.out_dir)
+
+if __name__ == "__main__":
+    main()
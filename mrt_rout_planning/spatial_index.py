@@ -0,0 +1,312 @@
+from __future__ import annotations
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from time import perf_counter
+import argparse
+import heapq
+import math
+import random
+
+import numpy as np
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Node, Edge, NetworkContext, QueryGraph, SUPER_START, SUPER_GOAL
+
+# Snapping rider GPS positions to stations, and routing coordinate -> coordinate.
+#
+# KDTree is a static 2-d tree over the same equirectangular projection build_xy_coords
+# uses (latlon_to_xy_km with the mean station latitude as reference), so walking
+# distances and the heuristic's straight-line distances are in the same km. Nodes split
+# on the wider axis at the median; leaves hold up to LEAF_SIZE points. k-nearest and
+# radius queries descend the near side first and only visit a far side whose splitting
+# plane is closer than the current bound: O(log n) for the usual small k / radius.
+#
+# route_coordinates attaches up to k candidate stations on each end of the query graph:
+#   __START__ -> (station, line)   walk_minutes(origin, station) + boarding crowd
+#   (station, line) -> __GOAL__    alighting crowd + walk_minutes(station, destination)
+# and runs astar with an admissible multi-goal heuristic
+#   h(station) = min over destination candidates c of  h_station(station, c) + walk(c)
+# Walking the whole way is reported as well when it beats every transit route.
+
+LEAF_SIZE = 8
+WALK_KMH = 4.8
+WALK_DETOUR = 1.3           # street distance / straight-line distance
+DEFAULT_MAX_WALK_KM = 1.5
+
+
+def walk_minutes(km: float) -> float:
+    return km * WALK_DETOUR / WALK_KMH * 60.0
+
+
+class KDTree:
+    """Static 2-d tree: knn / radius queries over points (xs[i], ys[i]) returning indices."""
+
+    def __init__(self, xs: Sequence[float], ys: Sequence[float]) -> None:
+        pts = np.column_stack([np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)])
+        self.size = len(pts)
+        perm = np.arange(self.size)
+        # per node: axis (-1 = leaf), split value, left / right child, leaf range [lo, hi)
+        self.axis: List[int] = []
+        self.split: List[float] = []
+        self.left: List[int] = []
+        self.right: List[int] = []
+        self.lo: List[int] = []
+        self.hi: List[int] = []
+
+        def build(lo: int, hi: int) -> int:
+            node = len(self.axis)
+            self.axis.append(-1)
+            self.split.append(0.0)
+            self.left.append(-1)
+            self.right.append(-1)
+            self.lo.append(lo)
+            self.hi.append(hi)
+            if hi - lo <= LEAF_SIZE:
+                return node
+            sub = pts[perm[lo:hi]]
+            axis = int(np.argmax(sub.max(axis=0) - sub.min(axis=0)))
+            mid = (lo + hi) // 2
+            order = np.argpartition(sub[:, axis], mid - lo)
+            perm[lo:hi] = perm[lo:hi][order]
+            self.axis[node] = axis
+            self.split[node] = float(pts[perm[mid], axis])
+            self.left[node] = build(lo, mid)
+            self.right[node] = build(mid, hi)
+            return node
+
+        if self.size:
+            build(0, self.size)
+        # leaves are scanned in perm order, so keep the coordinates in that order too
+        self.perm: List[int] = perm.tolist()
+        self.px: List[float] = pts[perm, 0].tolist()
+        self.py: List[float] = pts[perm, 1].tolist()
+
+    def knn(self, x: float, y: float, k: int) -> List[Tuple[float, int]]:
+        """Up to k (distance, index) pairs, nearest first."""
+        if not self.size or k <= 0:
+            return []
+        best: List[Tuple[float, int]] = []     # max-heap of (-d2, index)
+        axis, split, left, right = self.axis, self.split, self.left, self.right
+        px, py, perm = self.px, self.py, self.perm
+        stack = [(0, 0.0)]                     # (node, squared distance to its region's plane)
+        while stack:
+            node, plane2 = stack.pop()
+            # the bound may have tightened since this far side was pushed
+            if len(best) == k and plane2 >= -best[0][0]:
+                continue
+            a = axis[node]
+            if a < 0:
+                for i in range(self.lo[node], self.hi[node]):
+                    dx, dy = px[i] - x, py[i] - y
+                    d2 = dx * dx + dy * dy
+                    if len(best) < k:
+                        heapq.heappush(best, (-d2, perm[i]))
+                    elif d2 < -best[0][0]:
+                        heapq.heapreplace(best, (-d2, perm[i]))
+                continue
+            diff = (x if a == 0 else y) - split[node]
+            near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+            # far side pushed first so the near side is searched (and tightens the bound) first
+            stack.append((far, diff * diff))
+            stack.append((near, plane2))
+        return sorted((math.sqrt(-d2), i) for d2, i in best)
+
+    def radius(self, x: float, y: float, r: float) -> List[Tuple[float, int]]:
+        """All (distance, index) pairs within r, nearest first."""
+        out: List[Tuple[float, int]] = []
+        if not self.size:
+            return out
+        r2 = r * r
+        axis, split, left, right = self.axis, self.split, self.left, self.right
+        px, py, perm = self.px, self.py, self.perm
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            a = axis[node]
+            if a < 0:
+                for i in range(self.lo[node], self.hi[node]):
+                    dx, dy = px[i] - x, py[i] - y
+                    d2 = dx * dx + dy * dy
+                    if d2 <= r2:
+                        out.append((math.sqrt(d2), perm[i]))
+                continue
+            diff = (x if a == 0 else y) - split[node]
+            near, far = (left[node], right[node]) if diff < 0 else (right[node], left[node])
+            stack.append(near)
+            if diff * diff <= r2:
+                stack.append(far)
+        out.sort()
+        return out
+
+
+class Snap(NamedTuple):
+    station: Station
+    km: float               # straight-line distance from the query point
+    walk_min: float
+
+
+class StationLocator:
+    """KD-tree over one context's stations, queried with lat / lon."""
+
+    def __init__(self, ctx: NetworkContext, coords: Optional[Dict[Station, Tuple[float, float]]] = None) -> None:
+        if coords is None:
+            coords = mrp.load_coords_from_json("mrt_today_coordinates.json")
+            if ctx.is_future:
+                coords.update(mrp.load_coords_from_json("mrt_future_coordinates.json"))
+        # same reference latitude as build_xy_coords, so xy matches ctx.coords_xy
+        self.ref_lat = sum(lat for lat, _ in coords.values()) / len(coords)
+        self.stations: List[Station] = sorted(st for st in ctx.state.lines if st in coords)
+        xy = [mrp.latlon_to_xy_km(*coords[st], self.ref_lat) for st in self.stations]
+        self.tree = KDTree([p[0] for p in xy], [p[1] for p in xy])
+
+    def project(self, lat: float, lon: float) -> Tuple[float, float]:
+        return mrp.latlon_to_xy_km(lat, lon, self.ref_lat)
+
+    def nearest(self, lat: float, lon: float, k: int = 3) -> List[Snap]:
+        x, y = self.project(lat, lon)
+        return [Snap(self.stations[i], d, walk_minutes(d)) for d, i in self.tree.knn(x, y, k)]
+
+    def within(self, lat: float, lon: float, km: float) -> List[Snap]:
+        x, y = self.project(lat, lon)
+        return [Snap(self.stations[i], d, walk_minutes(d)) for d, i in self.tree.radius(x, y, km)]
+
+    def candidates(self, lat: float, lon: float, k: int = 3,
+                   max_walk_km: float = DEFAULT_MAX_WALK_KM) -> List[Snap]:
+        """k nearest within max_walk_km; the nearest station is always kept so a route exists."""
+        near = self.nearest(lat, lon, k)
+        return [s for j, s in enumerate(near) if j == 0 or s.km <= max_walk_km]
+
+
+# Coordinate -> coordinate routing
+
+class CoordRoute(NamedTuple):
+    path: Optional[List[Node]]        # None: walking the whole way is best (or no transit route)
+    cost: float                       # minutes incl. both walks
+    origin: Optional[Snap]            # station boarded at
+    destination: Optional[Snap]       # station alighted at
+    walk_only_min: float
+    expanded: int
+
+def attach_coordinates(ctx: NetworkContext, origins: List[Snap], destinations: List[Snap]) -> QueryGraph:
+    """attach_query with several walk-costed stations on each end."""
+    lines = ctx.state.lines
+    start_edges: List[Edge] = []
+    for o in origins:
+        board = o.walk_min + mrp.crowd_value(ctx, o.station)
+        start_edges.extend(((o.station, ln), board) for ln in sorted(lines.get(o.station, ())))
+    goal_edges: Dict[Node, float] = {}
+    for d in destinations:
+        alight = mrp.crowd_value(ctx, d.station) + d.walk_min
+        for ln in lines.get(d.station, ()):
+            goal_edges[(d.station, ln)] = alight
+    return QueryGraph(ctx.state, start_edges, goal_edges)
+
+def route_coordinates(ctx: NetworkContext, locator: StationLocator,
+                      origin: Tuple[float, float], destination: Tuple[float, float],
+                      k: int = 3, max_walk_km: float = DEFAULT_MAX_WALK_KM) -> CoordRoute:
+    o_snaps = locator.candidates(*origin, k=k, max_walk_km=max_walk_km)
+    d_snaps = locator.candidates(*destination, k=k, max_walk_km=max_walk_km)
+    ox, oy = locator.project(*origin)
+    dx, dy = locator.project(*destination)
+    walk_only = walk_minutes(math.hypot(ox - dx, oy - dy))
+
+    qg = attach_coordinates(ctx, o_snaps, d_snaps)
+    goal_bias = [(d.station, mrp.crowd_value(ctx, d.station) + d.walk_min) for d in d_snaps]
+    h_cache: Dict[Station, float] = {}
+
+    def h(n: Node) -> float:
+        st = n[0]
+        if st == SUPER_START[0] or st == SUPER_GOAL[0]:
+            return 0.0
+        v = h_cache.get(st)
+        if v is None:
+            v = h_cache[st] = min(mrp.h_station(ctx, st, c) + extra for c, extra in goal_bias)
+        return v
+
+    path, cost, expanded = mrp.astar(ctx, qg, [SUPER_START], {SUPER_GOAL},
+                                     d_snaps[0].station, o_snaps[0].station, heuristic=h)
+    if path is None or walk_only <= cost:
+        return CoordRoute(None, walk_only, None, None, walk_only, expanded)
+
+    first, last = path[1][0], path[-2][0]
+    o = next(s for s in o_snaps if s.station == first)
+    d = next(s for s in d_snaps if s.station == last)
+    return CoordRoute(path, cost, o, d, walk_only, expanded)
+
+
+# Runner: KD-tree vs brute force, then coordinate routing on jittered test endpoints
+
+def _brute_knn(xs: List[float], ys: List[float], x: float, y: float, k: int) -> List[Tuple[float, int]]:
+    return sorted((math.hypot(px - x, py - y), i) for i, (px, py) in enumerate(zip(xs, ys)))[:k]
+
+def check_tree(n: int, queries: int, k: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    xs = [rnd.uniform(0, 50) for _ in range(n)]
+    ys = [rnd.uniform(0, 30) for _ in range(n)]
+    t0 = perf_counter()
+    tree = KDTree(xs, ys)
+    build = perf_counter() - t0
+
+    pts = [(rnd.uniform(0, 50), rnd.uniform(0, 30)) for _ in range(queries)]
+    t0 = perf_counter()
+    for x, y in pts:
+        tree.knn(x, y, k)
+    knn_us = (perf_counter() - t0) / queries * 1e6
+    t0 = perf_counter()
+    for x, y in pts:
+        tree.radius(x, y, 1.0)
+    rad_us = (perf_counter() - t0) / queries * 1e6
+
+    for x, y in pts[:50]:
+        if [i for _, i in tree.knn(x, y, k)] != [i for _, i in _brute_knn(xs, ys, x, y, k)]:
+            raise RuntimeError(f"KD-tree knn disagrees with brute force at ({x}, {y})")
+        expect = sorted(i for i, (px, py) in enumerate(zip(xs, ys)) if math.hypot(px - x, py - y) <= 1.0)
+        if sorted(i for _, i in tree.radius(x, y, 1.0)) != expect:
+            raise RuntimeError(f"KD-tree radius query disagrees with brute force at ({x}, {y})")
+    print(f"  {n:7d} points: build={build*1000:7.1f} ms | knn(k={k})={knn_us:6.1f} us"
+          f" | radius(1 km)={rad_us:6.1f} us | matches brute force")
+
+def run_suite(ctx: NetworkContext, title: str, tests: List[Tuple[Station, Station]],
+              k: int, max_walk_km: float, seed: int) -> None:
+    print(f"\n=== {title} ===")
+    locator = StationLocator(ctx)
+    coords = mrp.load_coords_from_json("mrt_today_coordinates.json")
+    if ctx.is_future:
+        coords.update(mrp.load_coords_from_json("mrt_future_coordinates.json"))
+    rnd = random.Random(seed)
+
+    for s, t in tests:
+        # exactly on the stations: must reproduce the station -> station cost
+        exact = route_coordinates(ctx, locator, coords[s], coords[t], k=1)
+        _, acost, _ = mrp.astar(ctx, mrp.attach_query(ctx, s, t), [SUPER_START], {SUPER_GOAL}, t, s)
+        if exact.path is not None and abs(exact.cost - acost) > 1e-6:
+            raise RuntimeError(f"coordinate route on {s} -> {t} costs {exact.cost}, station route {acost}")
+
+        # a few hundred metres off, as a phone would report
+        jit = lambda p: (p[0] + rnd.uniform(-0.004, 0.004), p[1] + rnd.uniform(-0.004, 0.004))
+        o, d = jit(coords[s]), jit(coords[t])
+        t0 = perf_counter()
+        r = route_coordinates(ctx, locator, o, d, k=k, max_walk_km=max_walk_km)
+        dt = perf_counter() - t0
+        if r.path is None:
+            print(f"  ({o[0]:.4f}, {o[1]:.4f}) -> ({d[0]:.4f}, {d[1]:.4f}): walk {r.cost:.1f} min")
+            continue
+        print(f"  near {s} -> near {t}: {dt*1000:6.2f} ms | expanded={r.expanded:4d} | cost={r.cost:6.1f}"
+              f" (station route {acost:.1f}) | walk {r.origin.walk_min:4.1f} min to {r.origin.station},"
+              f" {r.destination.walk_min:4.1f} min from {r.destination.station}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="KD-tree station snapping and coordinate routing.")
+    ap.add_argument("-k", type=int, default=3, help="candidate stations per end")
+    ap.add_argument("--max-walk-km", type=float, default=DEFAULT_MAX_WALK_KM)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    print("=== KD-TREE ===")
+    for n in (150, 10_000, 100_000):
+        check_tree(n, 2000, args.k, args.seed)
+    run_suite(mrp.build_network_context(False), "TODAY MODE", mrp.TESTS_TODAY, args.k, args.max_walk_km, args.seed)
+    run_suite(mrp.build_network_context(True), "FUTURE MODE", mrp.TESTS_FUTURE, args.k, args.max_walk_km, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+from __future__ import annotations
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+from array import array
+from bisect import bisect_left, bisect_right
+from time import perf_counter
+import argparse
+
+import mrt_route_planning as mrp
+from mrt_route_planning import Station, Line, BaseGraphView, NetworkContext
+
+# Timetable-aware routing (Connection Scan Algorithm).
+#
+# Routes come from the same line definitions as build_today_base_graph /
+# build_future_base_graph: each line's subgraph is split into chains at its
+# terminals and junctions, and at every junction the two longest chains are joined
+# into one through service (the shorter branch runs as a shuttle, e.g. Tanah Merah -
+# Changi Airport on today's EWL). Every route runs in both directions.
+#
+# Trips are generated from a per-line headway table (time-of-day bands) and every
+# trip segment becomes one connection. All connections live in flat int arrays
+# sorted by departure minute, so
+#   earliest_arrival  is one forward scan from the first connection at/after the
+#                     departure time, stopping once departures pass the best arrival;
+#   profile           is one backward scan over the departure window (profile CSA),
+#                     giving every Pareto-optimal (departure, arrival) pair.
+# Changing trains at a station takes transfer_penalty(ctx, station) minutes; staying
+# on the same trip is free. Times are minutes after midnight (values >= 1440 are
+# after midnight of the next day).
+
+NO_TIME = 2 ** 31 - 1
+
+Band = Tuple[int, int, int]                     # (from_minute, to_minute, headway_minutes)
+
+SERVICE_BANDS: Tuple[Band, ...] = (
+    (5 * 60 + 30, 7 * 60, 6),                   # first trains
+    (7 * 60, 9 * 60, 3),                        # AM peak
+    (9 * 60, 17 * 60, 5),
+    (17 * 60, 20 * 60, 3),                      # PM peak
+    (20 * 60, 23 * 60, 6),
+    (23 * 60, 24 * 60, 10),                     # late night, last departures before midnight
+)
+
+# Lines not listed run SERVICE_BANDS
+HEADWAYS: Dict[Line, Tuple[Band, ...]] = {
+    "CRL": ((5 * 60 + 30, 7 * 60, 8), (7 * 60, 9 * 60, 4), (9 * 60, 17 * 60, 7),
+            (17 * 60, 20 * 60, 4), (20 * 60, 24 * 60, 10)),
+}
+
+
+class RouteDef(NamedTuple):
+    line: Line
+    stations: Tuple[Station, ...]
+    minutes: Tuple[int, ...]                    # run time of each segment, len(stations) - 1
+
+
+class Leg(NamedTuple):
+    line: Line
+    board: Station
+    alight: Station
+    depart: int
+    arrive: int
+
+
+class Journey(NamedTuple):
+    depart: int
+    arrive: int
+    legs: List[Leg]
+
+    @property
+    def minutes(self) -> int:
+        return self.arrive - self.depart
+
+
+def fmt_time(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+def parse_time(text: str) -> int:
+    hh, mm = text.split(":")
+    return int(hh) * 60 + int(mm)
+
+
+# Routes from the line topology
+
+def line_routes(base: BaseGraphView) -> List[RouteDef]:
+    """One RouteDef per through service of every line (single direction, as built)."""
+    per_line: Dict[Line, Dict[Station, Dict[Station, int]]] = {}
+    for u, edges in base.items():
+        for v, minutes, line in edges:
+            per_line.setdefault(line, {}).setdefault(u, {})[v] = minutes
+
+    routes: List[RouteDef] = []
+    for line in sorted(per_line):
+        adj = per_line[line]
+        for chain in _through_services(adj):
+            minutes = tuple(adj[a][b] for a, b in zip(chain, chain[1:]))
+            routes.append(RouteDef(line, tuple(chain), minutes))
+    return routes
+
+def _chains(adj: Dict[Station, Dict[Station, int]]) -> List[List[Station]]:
+    """Split a line subgraph into maximal paths between terminals / junctions."""
+    used = set()
+    chains: List[List[Station]] = []
+
+    def walk(a: Station, b: Station) -> List[Station]:
+        chain = [a, b]
+        used.add(frozenset((a, b)))
+        while len(adj[chain[-1]]) == 2:
+            nxt = [w for w in sorted(adj[chain[-1]]) if frozenset((chain[-1], w)) not in used]
+            if not nxt:
+                break
+            used.add(frozenset((chain[-1], nxt[0])))
+            chain.append(nxt[0])
+        return chain
+
+    for u in sorted(adj):
+        if len(adj[u]) != 2:
+            for v in sorted(adj[u]):
+                if frozenset((u, v)) not in used:
+                    chains.append(walk(u, v))
+    # loops with no terminal or junction
+    for u in sorted(adj):
+        for v in sorted(adj[u]):
+            if frozenset((u, v)) not in used:
+                chains.append(walk(u, v))
+    return chains
+
+def _through_services(adj: Dict[Station, Dict[Station, int]]) -> List[List[Station]]:
+    chains = _chains(adj)
+
+    def length(chain: List[Station]) -> int:
+        return sum(adj[a][b] for a, b in zip(chain, chain[1:]))
+
+    junctions = sorted(u for u in adj if len(adj[u]) >= 3)
+    for j in junctions:
+        ends = [c for c in chains if (c[0] == j) != (c[-1] == j)]
+        if len(ends) < 2:
+            continue
+        ends.sort(key=lambda c: (-length(c), c))
+        a, b = ends[0], ends[1]
+        a = a[::-1] if a[0] == j else a             # ... -> j
+        b = b if b[0] == j else b[::-1]             # j -> ...
+        chains = [c for c in chains if c is not ends[0] and c is not ends[1]]
+        chains.append(a + b[1:])
+    return chains
+
+
+# Compiled timetable
+
+class Timetable:
+    """Flat connection arrays sorted by departure time, plus the routes / trips behind them."""
+    __slots__ = (
+        "mode", "stations", "station_id", "routes", "change",
+        "trip_route", "trip_start",
+        "dep_stop", "arr_stop", "dep_time", "arr_time", "trip",
+    )
+
+    def __init__(self) -> None:
+        self.mode = ""
+        self.stations: List[Station] = []
+        self.station_id: Dict[Station, int] = {}
+        self.routes: List[RouteDef] = []
+        self.change = array("i")        # minimum change time per station
+        self.trip_route = array("i")    # trip -> index into routes (directions are separate routes)
+        self.trip_start = array("i")    # trip -> departure minute from its first station
+        self.dep_stop = array("i")
+        self.arr_stop = array("i")
+        self.dep_time = array("i")
+        self.arr_time = array("i")
+        self.trip = array("i")
+
+    @property
+    def n_connections(self) -> int:
+        return len(self.dep_time)
+
+    def nbytes(self) -> int:
+        arrays = (self.dep_stop, self.arr_stop, self.dep_time, self.arr_time, self.trip)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+
+def departures(bands: Sequence[Band]) -> List[int]:
+    """Departure minutes from a route's first station under a headway table."""
+    out: List[int] = []
+    for lo, hi, headway in bands:
+        t = max(lo, out[-1] + headway) if out else lo
+        while t < hi:
+            out.append(t)
+            t += headway
+    return out
+
+def build_timetable(ctx: NetworkContext,
+                    headways: Optional[Mapping[Line, Sequence[Band]]] = None) -> Timetable:
+    """Generate trips for every route direction and compile them into sorted connections."""
+    if headways is None:
+        headways = HEADWAYS
+    tt = Timetable()
+    tt.mode = ctx.mode
+    tt.stations = sorted(ctx.state.lines)
+    tt.station_id = {st: i for i, st in enumerate(tt.stations)}
+    tt.change = array("i", (mrp.transfer_penalty(ctx, st) for st in tt.stations))
+
+    for r in line_routes(ctx.base):
+        tt.routes.append(r)
+        tt.routes.append(RouteDef(r.line, r.stations[::-1], r.minutes[::-1]))
+
+    conns: List[Tuple[int, int, int, int, int]] = []
+    for ri, r in enumerate(tt.routes):
+        stops = [tt.station_id[st] for st in r.stations]
+        for start in departures(headways.get(r.line, SERVICE_BANDS)):
+            trip = len(tt.trip_route)
+            tt.trip_route.append(ri)
+            tt.trip_start.append(start)
+            t = start
+            for a, b, m in zip(stops, stops[1:], r.minutes):
+                conns.append((t, t + m, a, b, trip))
+                t += m
+
+    conns.sort()
+    for dep, arr, a, b, trip in conns:
+        tt.dep_time.append(dep)
+        tt.arr_time.append(arr)
+        tt.dep_stop.append(a)
+        tt.arr_stop.append(b)
+        tt.trip.append(trip)
+    return tt
+
+
+# Queries
+
+def earliest_arrival(tt: Timetable, origin: Station, dest: Station,
+                     depart: int) -> Tuple[Optional[Journey], int]:
+    """Earliest arrival at dest leaving origin at/after `depart`; also returns connections scanned."""
+    o = tt.station_id.get(origin)
+    d = tt.station_id.get(dest)
+    if o is None or d is None or o == d:
+        return None, 0
+
+    n_st = len(tt.stations)
+    ready = [NO_TIME] * n_st            # earliest minute a new trip can be boarded here
+    ready[o] = depart
+    in_conn = [-1] * n_st               # connection that set ready[] (or the best arrival at d)
+    trip_enter: Dict[int, int] = {}     # trip -> first connection boarded on it
+    best = NO_TIME
+    change = tt.change
+
+    start = bisect_left(tt.dep_time, depart)
+    scanned = 0
+    for i, dep, a, b, arr, trip in zip(range(start, tt.n_connections), tt.dep_time[start:],
+                                      tt.dep_stop[start:], tt.arr_stop[start:],
+                                      tt.arr_time[start:], tt.trip[start:]):
+        if dep >= best:
+            break
+        scanned += 1
+        if trip not in trip_enter:
+            if ready[a] > dep:
+                continue
+            trip_enter[trip] = i
+        if b == d:
+            if arr < best:
+                best = arr
+                in_conn[d] = i
+        elif arr + change[b] < ready[b]:
+            ready[b] = arr + change[b]
+            in_conn[b] = i
+
+    if best == NO_TIME:
+        return None, scanned
+
+    legs: List[Leg] = []
+    c = in_conn[d]
+    while True:
+        e = trip_enter[tt.trip[c]]
+        line = tt.routes[tt.trip_route[tt.trip[c]]].line
+        legs.append(Leg(line, tt.stations[tt.dep_stop[e]], tt.stations[tt.arr_stop[c]],
+                        tt.dep_time[e], tt.arr_time[c]))
+        s = tt.dep_stop[e]
+        if s == o:
+            break
+        c = in_conn[s]
+    legs.reverse()
+    return Journey(legs[0].depart, best, legs), scanned
+
+
+def profile(tt: Timetable, origin: Station, dest: Station,
+            window_start: int, window_end: int) -> Tuple[List[Tuple[int, int]], int]:
+    """
+    Every Pareto-optimal (departure, arrival) pair origin -> dest with departure in
+    [window_start, window_end], earliest departure first; also returns connections scanned.
+    """
+    o = tt.station_id.get(origin)
+    d = tt.station_id.get(dest)
+    if o is None or d is None or o == d:
+        return [], 0
+
+    # nothing arriving after the last departure's earliest arrival can be Pareto-optimal
+    last, _ = earliest_arrival(tt, origin, dest, window_end)
+    horizon = last.arrive if last is not None else NO_TIME
+
+    n_st = len(tt.stations)
+    # per-station profile: departures strictly decreasing, arrivals strictly decreasing
+    prof_dep: List[List[int]] = [[] for _ in range(n_st)]
+    prof_arr: List[List[int]] = [[] for _ in range(n_st)]
+    on_trip: Dict[int, int] = {}        # trip -> earliest arrival at dest staying on it
+    change = tt.change
+
+    lo = bisect_left(tt.dep_time, window_start)
+    hi = bisect_right(tt.dep_time, horizon)
+    scanned = 0
+    for i in range(hi - 1, lo - 1, -1):
+        scanned += 1
+        a, b, arr, trip = tt.dep_stop[i], tt.arr_stop[i], tt.arr_time[i], tt.trip[i]
+        best = arr if b == d else on_trip.get(trip, NO_TIME)
+        if b != d:
+            # change trains at b: latest profile entry departing at/after arr + change
+            deps = prof_dep[b]
+            k = _first_departing_before(deps, arr + change[b])
+            if k > 0 and prof_arr[b][k - 1] < best:
+                best = prof_arr[b][k - 1]
+        if best == NO_TIME:
+            continue
+        if best < on_trip.get(trip, NO_TIME):
+            on_trip[trip] = best
+        arrs = prof_arr[a]
+        if not arrs or best < arrs[-1]:
+            dep = tt.dep_time[i]
+            if arrs and prof_dep[a][-1] == dep:
+                arrs[-1] = best
+            else:
+                prof_dep[a].append(dep)
+                arrs.append(best)
+
+    out = [(dep, arr) for dep, arr in zip(prof_dep[o], prof_arr[o]) if dep <= window_end]
+    out.reverse()
+    return out, scanned
+
+def _first_departing_before(deps: List[int], t: int) -> int:
+    """deps is strictly decreasing: index of the first entry < t (entries before it depart >= t)."""
+    lo, hi = 0, len(deps)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if deps[mid] >= t:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+# Report: timetable journeys vs static costs, profiles and scan throughput
+
+def run_suite(ctx: NetworkContext, title: str, tests: List[Tuple[Station, Station]],
+              times: List[int], window: Tuple[int, int]) -> None:
+    t0 = perf_counter()
+    tt = build_timetable(ctx)
+    build_ms = (perf_counter() - t0) * 1000
+    print(f"\n=== {title} === routes={len(tt.routes)} trips={len(tt.trip_route)}"
+          f" connections={tt.n_connections} ({tt.nbytes() / 1024:.0f} KiB) build={build_ms:.1f} ms")
+
+    for s, t in tests:
+        qg = mrp.attach_query(ctx, s, t)
+        _, static, _ = mrp.astar(ctx, qg, [mrp.SUPER_START], {mrp.SUPER_GOAL}, t, s)
+        print(f"\n{s} -> {t}: static cost={static:.1f}")
+        for dep in times:
+            j, scanned = earliest_arrival(tt, s, t, dep)
+            if j is None:
+                print(f"  leave {fmt_time(dep)}: no service")
+                continue
+            legs = " | ".join(f"{l.line} {l.board} {fmt_time(l.depart)} -> {l.alight} {fmt_time(l.arrive)}"
+                              for l in j.legs)
+            print(f"  leave {fmt_time(dep)}: arrive {fmt_time(j.arrive)} ({j.arrive - dep} min,"
+                  f" scanned={scanned}) | {legs}")
+
+        pairs, _ = profile(tt, s, t, *window)
+        # the profile must agree with one earliest-arrival query per departure minute
+        for dep in range(window[0], window[1] + 1):
+            j, _ = earliest_arrival(tt, s, t, dep)
+            k = bisect_left([p[0] for p in pairs], dep)
+            expect = pairs[k][1] if k < len(pairs) else None
+            got = j.arrive if j is not None else None
+            if expect is not None and got != expect:
+                raise RuntimeError(f"profile disagrees with earliest arrival on {s} -> {t} at {fmt_time(dep)}")
+        print(f"  profile {fmt_time(window[0])}-{fmt_time(window[1])}: "
+              + ", ".join(f"{fmt_time(a)}->{fmt_time(b)}" for a, b in pairs))
+
+    # scan throughput over every OD pair at every query time
+    scanned = 0
+    t0 = perf_counter()
+    for s in tt.stations:
+        for t in tt.stations:
+            if s != t:
+                for dep in times:
+                    scanned += earliest_arrival(tt, s, t, dep)[1]
+    dt = perf_counter() - t0
+    print(f"\n  all-pairs earliest arrival: {scanned} connections in {dt:.2f} s"
+          f" ({scanned / dt / 1e6:.2f} M connections/s)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Timetable (Connection Scan) routing over the line topology.")
+    ap.add_argument("--at", nargs="+", default=["08:00", "23:30"], help="departure times HH:MM")
+    ap.add_argument("--window", nargs=2, default=["07:30", "08:30"], help="profile window HH:MM HH:MM")
+    args = ap.parse_args()
+
+    times = [parse_time(t) for t in args.at]
+    window = (parse_time(args.window[0]), parse_time(args.window[1]))
+    run_suite(mrp.build_network_context(False), "TODAY MODE", mrp.TESTS_TODAY, times, window)
+    run_suite(mrp.build_network_context(True), "FUTURE MODE", mrp.TESTS_FUTURE, times, window)
+
+if __name__ == "__main__":
+    main()